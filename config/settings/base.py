@@ -1,3 +1,4 @@
+import json
 import os
 import socket
 import subprocess
@@ -52,11 +53,14 @@ def get_powershell_path():
     """
     Returns the path to the PowerShell executable on the system.
 
-    Uses the 'where' command to locate the PowerShell executable.
+    Uses the POWERSHELL_PATH environment variable if set, e.g. to run the account simulator,
+    or the 'where' command to locate the PowerShell executable.
 
     Returns:
         str: The path to the PowerShell executable.
     """
+    if os.environ.get('POWERSHELL_PATH'):
+        return os.environ['POWERSHELL_PATH']
     result = subprocess.run("where powershell", capture_output=True, text=True)
     powershell_path = result.stdout.strip()
     return powershell_path
@@ -66,6 +70,9 @@ def get_powershell_path():
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 
 MIDDLEWARE = [
+    'win_user_sync_local_server.diagnostics.middleware.TracingMiddleware',
+    'win_user_sync_local_server.traffic.middleware.TrafficRecordingMiddleware',
+    'win_user_sync_local_server.listings.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,6 +81,10 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_keycloak_auth.middleware.KeycloakMiddleware',
+    'win_user_sync_local_server.diagnostics.middleware.TracingViewMiddleware',
+    'win_user_sync_local_server.admission.middleware.AdmissionControlMiddleware',
+    'win_user_sync_local_server.idempotency.middleware.IdempotencyMiddleware',
+    'win_user_sync_local_server.diagnostics.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -161,3 +172,162 @@ REMOTE_SERVICE_OAUTH2_CLIENT_ID = get_env_var('REMOTE_SERVICE_OAUTH2_CLIENT_ID')
 REMOTE_SERVICE_OAUTH2_CLIENT_SECRET = get_env_var('REMOTE_SERVICE_OAUTH2_CLIENT_SECRET')
 REMOTE_SERVICE_OAUTH2_USERNAME = get_env_var('REMOTE_SERVICE_OAUTH2_USERNAME')
 REMOTE_SERVICE_OAUTH2_PASSWORD = get_env_var('REMOTE_SERVICE_OAUTH2_PASSWORD')
+
+# The number of most recent entries kept in the change log served by GET /changes/
+CHANGE_LOG_MAX_ENTRIES = int(get_env_var('CHANGE_LOG_MAX_ENTRIES', 10000))
+
+# The number of idle seconds after which GET /watch/ sends a heartbeat frame
+WATCH_HEARTBEAT_INTERVAL = float(get_env_var('WATCH_HEARTBEAT_INTERVAL', 15))
+
+# The number of seconds after which GET /watch/ ends the stream and lets the consumer reconnect
+WATCH_MAX_DURATION = float(get_env_var('WATCH_MAX_DURATION', 3600))
+
+# PUT /state/ applies up to STATE_APPLY_WORKERS steps at the same time
+# and adds at most STATE_APPLY_BATCH_SIZE members to a user group in a single step
+STATE_APPLY_WORKERS = int(get_env_var('STATE_APPLY_WORKERS', 8))
+STATE_APPLY_BATCH_SIZE = int(get_env_var('STATE_APPLY_BATCH_SIZE', 50))
+
+# Comma-separated names of built-in users and user groups that PUT /state/ never deletes
+STATE_PROTECTED_USERS = [
+    name.strip() for name in get_env_var(
+        'STATE_PROTECTED_USERS',
+        'Administrator,DefaultAccount,Guest,WDAGUtilityAccount'
+    ).split(',') if name.strip()
+]
+STATE_PROTECTED_USERGROUPS = [
+    name.strip() for name in get_env_var(
+        'STATE_PROTECTED_USERGROUPS',
+        'Access Control Assistance Operators,Administrators,Backup Operators,Cryptographic Operators,'
+        'Device Owners,Distributed COM Users,Event Log Readers,Guests,Hyper-V Administrators,IIS_IUSRS,'
+        'Network Configuration Operators,Performance Log Users,Performance Monitor Users,Power Users,'
+        'Remote Desktop Users,Remote Management Users,Replicator,System Managed Accounts Group,Users'
+    ).split(',') if name.strip()
+]
+
+# Admission control rejects excess requests with 429 Too Many Requests and a Retry-After header.
+# Limits are JSON objects: {"<endpoint class>": {"max_concurrent": 32, "max_concurrent_per_subject": 16}}
+# for ADMISSION_LIMITS and {"<token subject>": {"<endpoint class>": 16}} for ADMISSION_SUBJECT_LIMITS.
+# Endpoint classes are read, write, reconcile, stream and probe. ADMISSION_ENDPOINT_CLASSES maps URL names to classes.
+ADMISSION_CONTROL_ENABLED = get_env_var('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+ADMISSION_LIMITS = json.loads(get_env_var('ADMISSION_LIMITS', '{}'))
+ADMISSION_SUBJECT_LIMITS = json.loads(get_env_var('ADMISSION_SUBJECT_LIMITS', '{}'))
+ADMISSION_ENDPOINT_CLASSES = json.loads(get_env_var('ADMISSION_ENDPOINT_CLASSES', '{}'))
+# The number of running PowerShell commands at which requests running PowerShell are rejected
+ADMISSION_MAX_QUEUE_DEPTH = int(get_env_var('ADMISSION_MAX_QUEUE_DEPTH', 32))
+# The PowerShell command latency in seconds above which concurrency limits shrink proportionally
+ADMISSION_TARGET_LATENCY = float(get_env_var('ADMISSION_TARGET_LATENCY', 10))
+ADMISSION_MAX_RETRY_AFTER = int(get_env_var('ADMISSION_MAX_RETRY_AFTER', 60))
+
+# Tracing of requests, PowerShell commands and remote service calls.
+# TRACING_EXPORTERS is a comma-separated list of 'memory' (ring buffer of TRACING_BUFFER_SIZE spans
+# viewable at GET /debug/traces/) and 'jsonl' (appended to TRACING_FILE)
+TRACING_ENABLED = get_env_var('TRACING_ENABLED', 'true').lower() == 'true'
+TRACING_EXPORTERS = [name.strip() for name in get_env_var('TRACING_EXPORTERS', 'memory').split(',')]
+TRACING_BUFFER_SIZE = int(get_env_var('TRACING_BUFFER_SIZE', 4096))
+TRACING_FILE = get_env_var('TRACING_FILE', str(BASE_DIR / 'traces.jsonl'))
+
+# Mutation requests with an Idempotency-Key header are executed once. Their responses are kept for IDEMPOTENCY_TTL
+# seconds, at most IDEMPOTENCY_MAX_ENTRIES of them, in memory or in the database (IDEMPOTENCY_STORE 'memory' or
+# 'database', shared by workers). Retries arriving while the first request runs wait up to IDEMPOTENCY_WAIT seconds
+IDEMPOTENCY_ENABLED = get_env_var('IDEMPOTENCY_ENABLED', 'true').lower() == 'true'
+IDEMPOTENCY_STORE = get_env_var('IDEMPOTENCY_STORE', 'memory')
+IDEMPOTENCY_TTL = float(get_env_var('IDEMPOTENCY_TTL', 86400))
+IDEMPOTENCY_MAX_ENTRIES = int(get_env_var('IDEMPOTENCY_MAX_ENTRIES', 10000))
+IDEMPOTENCY_WAIT = float(get_env_var('IDEMPOTENCY_WAIT', 300))
+# The number of seconds the first request holds its key. A request running longer loses it to the next retry
+IDEMPOTENCY_CLAIM_SECONDS = float(get_env_var('IDEMPOTENCY_CLAIM_SECONDS', 3600))
+
+# PowerShell commands taking longer than SLOW_COMMAND_THRESHOLD seconds are kept by their fingerprint in a ring buffer
+# of SLOW_COMMAND_BUFFER_SIZE entries, viewable at GET /debug/slow-commands/, and appended to SLOW_COMMAND_FILE if set.
+# The file is rotated at SLOW_COMMAND_FILE_MAX_BYTES, keeping SLOW_COMMAND_FILE_BACKUPS old files
+SLOW_COMMAND_THRESHOLD = float(get_env_var('SLOW_COMMAND_THRESHOLD', 5))
+SLOW_COMMAND_BUFFER_SIZE = int(get_env_var('SLOW_COMMAND_BUFFER_SIZE', 1000))
+SLOW_COMMAND_STDERR_CHARS = int(get_env_var('SLOW_COMMAND_STDERR_CHARS', 500))
+SLOW_COMMAND_FILE = get_env_var('SLOW_COMMAND_FILE', '')
+SLOW_COMMAND_FILE_MAX_BYTES = int(get_env_var('SLOW_COMMAND_FILE_MAX_BYTES', 10485760))
+SLOW_COMMAND_FILE_BACKUPS = int(get_env_var('SLOW_COMMAND_FILE_BACKUPS', 5))
+
+# GET /readyz runs the READINESS_CHECKS (comma-separated: database, powershell, keycloak, eureka) at most once
+# in READINESS_CACHE_SECONDS. Network checks wait READINESS_TIMEOUT seconds for a response
+READINESS_CHECKS = [
+    name.strip() for name in get_env_var('READINESS_CHECKS', 'database,powershell,keycloak,eureka').split(',')
+    if name.strip()
+]
+READINESS_CACHE_SECONDS = float(get_env_var('READINESS_CACHE_SECONDS', 5))
+READINESS_TIMEOUT = float(get_env_var('READINESS_TIMEOUT', 2))
+
+# On-demand profiling of requests with ?profile=wall|cpu or the X-Profile header.
+# The last PROFILING_STORE_SIZE profiles are viewable at GET /debug/profiles/.
+# PROFILING_MONITOR accumulates profiles of monitor cycles, viewable at GET /debug/profiles/monitor/
+PROFILING_ENABLED = get_env_var('PROFILING_ENABLED', 'true').lower() == 'true'
+PROFILING_STORE_SIZE = int(get_env_var('PROFILING_STORE_SIZE', 20))
+PROFILING_MONITOR = get_env_var('PROFILING_MONITOR', 'false').lower() == 'true'
+PROFILING_MONITOR_CLOCK = get_env_var('PROFILING_MONITOR_CLOCK', 'cpu')
+
+# Recording of sanitized API traffic for replay, see the record_traffic and replay_traffic commands.
+# Set TRAFFIC_RECORD_FILE to record traffic without the record_traffic command
+TRAFFIC_RECORD_FILE = get_env_var('TRAFFIC_RECORD_FILE', '')
+
+# Responses of at least COMPRESSION_MIN_LENGTH bytes are compressed with brotli or gzip
+COMPRESSION_MIN_LENGTH = int(get_env_var('COMPRESSION_MIN_LENGTH', 512))
+
+# Delta uploads of the monitor. Changed entities are uploaded in chunks of at most SYNC_CHUNK_MAX_BYTES
+# of uncompressed JSON. Acknowledged chunks are remembered for SYNC_CHUNK_RETENTION seconds to resume failed uploads
+SYNC_CHUNK_MAX_BYTES = int(get_env_var('SYNC_CHUNK_MAX_BYTES', 262144))
+SYNC_COMPRESS_CHUNKS = get_env_var('SYNC_COMPRESS_CHUNKS', 'true').lower() == 'true'
+SYNC_CHUNK_RETENTION = int(get_env_var('SYNC_CHUNK_RETENTION', 86400))
+
+# GET responses of the remote service are cached in the database and revalidated with ETag/Last-Modified.
+# Blacklist entries containing '*' or '?' are wildcard patterns if BLACKLIST_WILDCARDS is true
+REMOTE_HTTP_CACHE_ENABLED = get_env_var('REMOTE_HTTP_CACHE_ENABLED', 'true').lower() == 'true'
+BLACKLIST_WILDCARDS = get_env_var('BLACKLIST_WILDCARDS', 'true').lower() == 'true'
+
+# Remote hosts managed through the 'host' URL parameter of the user and user group endpoints.
+# REMOTE_HOSTS is a comma-separated list of the allowed hosts. REMOTE_HOSTS_TRANSPORT is the dotted
+# path of the transport opening sessions to them
+REMOTE_HOSTS = [host.strip() for host in get_env_var('REMOTE_HOSTS', '').split(',') if host.strip()]
+REMOTE_HOSTS_TRANSPORT = get_env_var(
+    'REMOTE_HOSTS_TRANSPORT',
+    'win_user_sync_local_server.remoting.transports.PSRemotingTransport'
+)
+REMOTE_SESSIONS_PER_HOST = int(get_env_var('REMOTE_SESSIONS_PER_HOST', 2))
+REMOTE_SESSION_IDLE_TIMEOUT = float(get_env_var('REMOTE_SESSION_IDLE_TIMEOUT', 300))
+REMOTE_FAN_OUT_WORKERS = int(get_env_var('REMOTE_FAN_OUT_WORKERS', 16))
+
+# The number of seconds a PowerShell command, local, remote or simulated, may take before it's given up on
+POWERSHELL_COMMAND_TIMEOUT = float(get_env_var('POWERSHELL_COMMAND_TIMEOUT', 120))
+
+# The dotted path of the account store managing users and user groups: PowerShellAccountStore,
+# NetApiAccountStore (Win32 network management API, no process spawn) or MemoryAccountStore (tests)
+ACCOUNT_STORE_BACKEND = get_env_var(
+    'ACCOUNT_STORE_BACKEND',
+    'win_user_sync_local_server.accounts.powershell.PowerShellAccountStore'
+)
+
+# Enabling, disabling, member additions and renames that wouldn't change the accounts as last seen within
+# ACCOUNT_SNAPSHOT_MAX_AGE seconds are skipped. Set to 0 to always apply them
+ACCOUNT_SNAPSHOT_MAX_AGE = float(get_env_var('ACCOUNT_SNAPSHOT_MAX_AGE', 30))
+
+# Bulk endpoints of the PowerShell backend handle up to BULK_CHUNK_SIZE accounts per PowerShell invocation.
+# BULK_MAX_NAMES limits the number of accounts of a single bulk request
+BULK_CHUNK_SIZE = int(get_env_var('BULK_CHUNK_SIZE', 100))
+BULK_MAX_NAMES = int(get_env_var('BULK_MAX_NAMES', 5000))
+
+# Only the worker holding the monitor lease runs the monitor. The lease lasts MONITOR_LEASE_SECONDS and is
+# renewed every third of it, so another worker takes over within MONITOR_LEASE_SECONDS after the leader dies
+MONITOR_LEADER_ELECTION = get_env_var('MONITOR_LEADER_ELECTION', 'true').lower() == 'true'
+MONITOR_LEASE_SECONDS = float(get_env_var('MONITOR_LEASE_SECONDS', 30))
+# Whether this process takes part in the election when it starts: 'auto' if it's runserver or a known
+# WSGI/ASGI server, 'true' or 'false'. Processes that didn't still take part once they receive a monitor request
+MONITOR_COORDINATOR = get_env_var('MONITOR_COORDINATOR', 'auto').lower()
+
+# Workers of a host share snapshots of the local accounts through binary files in SHARED_SNAPSHOT_DIR, used by
+# the monitor and GET /state/digest/ for SHARED_SNAPSHOT_MAX_AGE seconds unless a change is recorded meanwhile.
+# A worker waits up to SHARED_SNAPSHOT_WAIT seconds for another one's refresh. Not shared if empty
+SHARED_SNAPSHOT_DIR = get_env_var('SHARED_SNAPSHOT_DIR', '')
+SHARED_SNAPSHOT_MAX_AGE = float(get_env_var('SHARED_SNAPSHOT_MAX_AGE', 10))
+SHARED_SNAPSHOT_WAIT = float(get_env_var('SHARED_SNAPSHOT_WAIT', 30))
+
+# Filtered and paginated listings are answered from indexes over a snapshot of the accounts, taken again once older
+# than LISTING_INDEX_MAX_AGE seconds or when a change to the local accounts is recorded
+LISTING_INDEX_MAX_AGE = float(get_env_var('LISTING_INDEX_MAX_AGE', 30))
@@ -22,6 +22,12 @@ INSTALLED_APPS = [
     'win_user_sync_local_server.users.apps.UsersConfig',
     'win_user_sync_local_server.change_monitor.apps.ChangeMonitorConfig',
     'win_user_sync_local_server.registry.apps.RegistryConfig',
+    'win_user_sync_local_server.change_log.apps.ChangeLogConfig',
+    'win_user_sync_local_server.state.apps.StateConfig',
+    'win_user_sync_local_server.admission.apps.AdmissionConfig',
+    'win_user_sync_local_server.diagnostics.apps.DiagnosticsConfig',
+    'win_user_sync_local_server.traffic.apps.TrafficConfig',
+    'win_user_sync_local_server.idempotency.apps.IdempotencyConfig',
 
     # Third-party
     'rest_framework',
@@ -22,4 +22,8 @@ urlpatterns = [
     path('groups/', include('win_user_sync_local_server.user_groups.urls')),
     path('users/', include('win_user_sync_local_server.users.urls')),
     path('monitor/', include('win_user_sync_local_server.change_monitor.urls')),
+    path('', include('win_user_sync_local_server.change_log.urls')),
+    path('state/', include('win_user_sync_local_server.state.urls')),
+    path('debug/', include('win_user_sync_local_server.diagnostics.urls')),
+    path('', include('win_user_sync_local_server.diagnostics.health_urls')),
 ]
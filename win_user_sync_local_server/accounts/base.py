@@ -0,0 +1,264 @@
+"""
+This module contains the AccountStore interface implemented by account-store backends.
+
+An account store manages the local users and user groups of a machine. Backends are
+selected with the ACCOUNT_STORE_BACKEND setting, see the store module.
+"""
+
+from abc import ABC, abstractmethod
+
+from ..users.user_scripts import User
+
+
+class AccountStoreError(Exception):
+    """
+    Raised when an account store operation fails, e.g. because an account doesn't exist.
+    """
+
+
+# Actions of AccountStore.bulk_update_users()
+BULK_USER_ACTIONS = ('enable', 'disable', 'delete')
+
+
+class BulkResult:
+    """
+    The outcome of a bulk operation for a single account.
+
+    Attributes:
+        name (str): The name of the account.
+        changed (bool): False if nothing was changed because the operation was found to be a no-op.
+        error (str): Why the operation failed or None if it succeeded.
+    """
+    def __init__(self, name, changed=True, error=None):
+        self.name = name
+        self.changed = changed
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def serialize(self):
+        if self.error is not None:
+            return {'name': self.name, 'status': 'failed', 'error': self.error}
+        return {'name': self.name, 'status': 'changed' if self.changed else 'unchanged'}
+
+
+class AccountStore(ABC):
+    """
+    Manages users, user groups and their members.
+
+    Users are returned as User objects and user groups as Usergroup objects. Names are
+    compared case-insensitively, like Windows does.
+    """
+    @classmethod
+    def from_settings(cls):
+        """
+        Creates the store configured by the settings.
+
+        Returns:
+            AccountStore: The store.
+        """
+        return cls()
+
+    @abstractmethod
+    def for_host(self, host):
+        """
+        Returns a store of the same backend managing the accounts of a remote host.
+
+        Args:
+            host (str): The remote host.
+
+        Returns:
+            AccountStore: The store of the host.
+        """
+
+    @abstractmethod
+    def get_users(self):
+        """
+        Returns:
+            list: User objects of all users.
+        """
+
+    @abstractmethod
+    def get_user(self, username):
+        """
+        Args:
+            username (str): The username of the user.
+
+        Returns:
+            User: The user.
+        """
+
+    @abstractmethod
+    def add_user(self, username, password):
+        """
+        Args:
+            username (str): The username of the new user.
+            password (str): The password of the new user or None.
+        """
+
+    @abstractmethod
+    def edit_user_password(self, username, password):
+        """
+        Args:
+            username (str): The username of the user.
+            password (str): The new password.
+        """
+
+    @abstractmethod
+    def enable_user(self, username):
+        """
+        Args:
+            username (str): The username of the user to enable.
+
+        Returns:
+            bool: False if nothing was changed because the operation was found to be a no-op.
+        """
+
+    @abstractmethod
+    def disable_user(self, username):
+        """
+        Args:
+            username (str): The username of the user to disable.
+
+        Returns:
+            bool: False if nothing was changed because the operation was found to be a no-op.
+        """
+
+    @abstractmethod
+    def delete_user(self, username):
+        """
+        Args:
+            username (str): The username of the user to delete.
+        """
+
+    @abstractmethod
+    def get_usergroups(self):
+        """
+        Returns:
+            list: Usergroup objects of all user groups, with their members.
+        """
+
+    @abstractmethod
+    def get_usergroup(self, name):
+        """
+        Args:
+            name (str): The name of the user group.
+
+        Returns:
+            Usergroup: The user group with its members.
+        """
+
+    @abstractmethod
+    def get_usergroup_users(self, name):
+        """
+        Args:
+            name (str): The name of the user group.
+
+        Returns:
+            list: User objects of the members of the user group.
+        """
+
+    @abstractmethod
+    def add_usergroup(self, name, description=None, usernames=None):
+        """
+        Args:
+            name (str): The name of the new user group.
+            description (str, optional): The description of the new user group.
+            usernames (list, optional): Usernames of the initial members.
+        """
+
+    @abstractmethod
+    def rename_usergroup(self, name, new_name):
+        """
+        Args:
+            name (str): The current name of the user group.
+            new_name (str): The new name of the user group.
+
+        Returns:
+            bool: False if nothing was changed because the operation was found to be a no-op.
+        """
+
+    @abstractmethod
+    def set_usergroup_description(self, name, description):
+        """
+        Args:
+            name (str): The name of the user group.
+            description (str): The new description of the user group.
+        """
+
+    @abstractmethod
+    def add_usergroup_users(self, name, usernames):
+        """
+        Args:
+            name (str): The name of the user group.
+            usernames (list): Usernames of the users to add.
+
+        Returns:
+            bool: False if nothing was changed because the operation was found to be a no-op.
+        """
+
+    @abstractmethod
+    def remove_usergroup_user(self, name, username):
+        """
+        Args:
+            name (str): The name of the user group.
+            username (str): The username of the member to remove.
+        """
+
+    @abstractmethod
+    def delete_usergroup(self, name):
+        """
+        Args:
+            name (str): The name of the user group to delete.
+        """
+
+    def bulk_update_users(self, action, usernames):
+        """
+        Enables, disables or deletes many users, going on after failures.
+
+        Backends running a process per operation override it to handle many users per process.
+
+        Args:
+            action (str): One of BULK_USER_ACTIONS.
+            usernames (list): Usernames of the users.
+
+        Returns:
+            list: A BulkResult for every username, in the given order.
+        """
+        operation = {'enable': self.enable_user, 'disable': self.disable_user, 'delete': self.delete_user}[action]
+        return [self._bulk_result(username, operation) for username in usernames]
+
+    def delete_usergroups(self, names):
+        """
+        Deletes many user groups, going on after failures.
+
+        Args:
+            names (list): The names of the user groups.
+
+        Returns:
+            list: A BulkResult for every name, in the given order.
+        """
+        return [self._bulk_result(name, self.delete_usergroup) for name in names]
+
+    @staticmethod
+    def _bulk_result(name, operation):
+        try:
+            return BulkResult(name, changed=operation(name) is not False)
+        except Exception as exc:
+            return BulkResult(name, error=str(exc))
+
+    def get_included_users(self, name, usernames):
+        """
+        Retrieves users from a list that are members of a user group.
+
+        Args:
+            name (str): The name of the user group.
+            usernames (list): Usernames of the users to check.
+
+        Returns:
+            list: User objects of the users that are members of the user group.
+        """
+        members = {user.username.lower() for user in self.get_usergroup_users(name)}
+        return [User(username) for username in usernames if username.lower() in members]
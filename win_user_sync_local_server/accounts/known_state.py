@@ -0,0 +1,250 @@
+"""
+This module contains the KnownStateAccountStore class skipping mutations that would change nothing.
+
+The store keeps a snapshot of the users and user groups of the wrapped store. Listings
+through the store refresh it and mutations through the store are written through to it.
+Once it's older than the freshness bound, member additions and renames are applied without
+being checked, rather than listing the user groups again. A failed mutation discards the
+snapshot, since the state of the accounts is uncertain then. Changes made to the accounts by other means go unnoticed until
+the snapshot expires.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from .base import AccountStore, BulkResult
+from ..user_groups.usergroups_scripts import Usergroup
+from ..users.user_scripts import User
+
+
+class KnownStateAccountStore(AccountStore):
+    """
+    Wraps an account store, skipping enabling, disabling, member additions and renames that
+    wouldn't change its cached snapshot.
+
+    Attributes:
+        store (AccountStore): The wrapped store.
+        max_age (float): The number of seconds after which the snapshot is listed again.
+    """
+    def __init__(self, store, max_age):
+        self.store = store
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._users = None
+        self._users_at = 0.0
+        self._usergroups = None
+        self._usergroups_at = 0.0
+        self._enabled = {}
+
+    def for_host(self, host):
+        return self.store.for_host(host)
+
+    def invalidate(self):
+        """
+        Discards the snapshot.
+        """
+        with self._lock:
+            self._users, self._usergroups, self._enabled = None, None, {}
+
+    def get_users(self):
+        users = self.store.get_users()
+        self._set_users(users)
+        return users
+
+    def get_user(self, username):
+        return self.store.get_user(username)
+
+    def add_user(self, username, password):
+        with self._writing_through():
+            self.store.add_user(username, password)
+        with self._lock:
+            if self._users is not None:
+                self._users[username.lower()] = User(username)
+            self._enabled[username.lower()] = (True, time.monotonic())
+
+    def edit_user_password(self, username, password):
+        with self._writing_through():
+            self.store.edit_user_password(username, password)
+
+    def enable_user(self, username):
+        if self._known_enabled(username) is True:
+            return False
+        with self._writing_through():
+            self.store.enable_user(username)
+        with self._lock:
+            self._enabled[username.lower()] = (True, time.monotonic())
+        return True
+
+    def disable_user(self, username):
+        if self._known_enabled(username) is False:
+            return False
+        with self._writing_through():
+            self.store.disable_user(username)
+        with self._lock:
+            self._enabled[username.lower()] = (False, time.monotonic())
+        return True
+
+    def delete_user(self, username):
+        with self._writing_through():
+            self.store.delete_user(username)
+        with self._lock:
+            self._forget_user(username)
+
+    def bulk_update_users(self, action, usernames):
+        skipped = set()
+        if action in ('enable', 'disable'):
+            enabled = action == 'enable'
+            skipped = {username.lower() for username in usernames if self._known_enabled(username) is enabled}
+        pending = [username for username in usernames if username.lower() not in skipped]
+        results = {result.name.lower(): result for result in self.store.bulk_update_users(action, pending)} if pending else {}
+
+        if not all(result.ok for result in results.values()):
+            self.invalidate()
+        with self._lock:
+            for result in results.values():
+                if not result.ok:
+                    continue
+                if action == 'delete':
+                    self._forget_user(result.name)
+                else:
+                    self._enabled[result.name.lower()] = (action == 'enable', time.monotonic())
+        return [
+            BulkResult(username, changed=False) if username.lower() in skipped else results[username.lower()]
+            for username in usernames
+        ]
+
+    def get_usergroups(self):
+        usergroups = self.store.get_usergroups()
+        self._set_usergroups(usergroups)
+        return usergroups
+
+    def get_usergroup(self, name):
+        return self.store.get_usergroup(name)
+
+    def get_usergroup_users(self, name):
+        return self.store.get_usergroup_users(name)
+
+    def add_usergroup(self, name, description=None, usernames=None):
+        with self._writing_through():
+            self.store.add_usergroup(name, description, usernames)
+        with self._lock:
+            if self._usergroups is not None:
+                self._usergroups[name.lower()] = Usergroup(name, description, [User(username) for username in usernames or []])
+
+    def rename_usergroup(self, name, new_name):
+        usergroups = self._known_usergroups()
+        if usergroups is not None:
+            usergroup = usergroups.get(name.lower())
+            if usergroup is not None and usergroup.name == new_name:
+                return False
+            # Already renamed
+            if usergroup is None and name.lower() != new_name.lower() and new_name.lower() in usergroups:
+                return False
+        with self._writing_through():
+            self.store.rename_usergroup(name, new_name)
+        with self._lock:
+            usergroup = (self._usergroups or {}).pop(name.lower(), None)
+            if usergroup is not None:
+                usergroup.name = new_name
+                self._usergroups[new_name.lower()] = usergroup
+        return True
+
+    def set_usergroup_description(self, name, description):
+        with self._writing_through():
+            self.store.set_usergroup_description(name, description)
+        with self._lock:
+            usergroup = (self._usergroups or {}).get(name.lower())
+            if usergroup is not None:
+                usergroup.description = description
+
+    def add_usergroup_users(self, name, usernames):
+        usergroup = (self._known_usergroups() or {}).get(name.lower())
+        if usergroup is not None:
+            members = {user.username.lower() for user in usergroup.users}
+            usernames = [username for username in usernames if username.lower() not in members]
+        if not usernames:
+            return False
+        with self._writing_through():
+            self.store.add_usergroup_users(name, usernames)
+        with self._lock:
+            usergroup = (self._usergroups or {}).get(name.lower())
+            if usergroup is not None:
+                usergroup.users += [User(username) for username in usernames]
+        return True
+
+    def remove_usergroup_user(self, name, username):
+        with self._writing_through():
+            self.store.remove_usergroup_user(name, username)
+        with self._lock:
+            usergroup = (self._usergroups or {}).get(name.lower())
+            if usergroup is not None:
+                usergroup.users = [user for user in usergroup.users if user.username.lower() != username.lower()]
+
+    def delete_usergroup(self, name):
+        with self._writing_through():
+            self.store.delete_usergroup(name)
+        with self._lock:
+            (self._usergroups or {}).pop(name.lower(), None)
+
+    def delete_usergroups(self, names):
+        results = self.store.delete_usergroups(names)
+        if not all(result.ok for result in results):
+            self.invalidate()
+        with self._lock:
+            for result in results:
+                if result.ok:
+                    (self._usergroups or {}).pop(result.name.lower(), None)
+        return results
+
+    def _forget_user(self, username):
+        self._enabled.pop(username.lower(), None)
+        if self._users is not None:
+            self._users.pop(username.lower(), None)
+        for usergroup in (self._usergroups or {}).values():
+            usergroup.users = [user for user in usergroup.users if user.username.lower() != username.lower()]
+
+    def _known_enabled(self, username):
+        """
+        Returns whether the user is enabled as last seen within the freshness bound, or None if unknown.
+        """
+        with self._lock:
+            enabled, seen_at = self._enabled.get(username.lower(), (None, 0.0))
+        return enabled if time.monotonic() - seen_at <= self.max_age else None
+
+    def _known_usergroups(self):
+        """
+        Returns the user groups keyed by lowercase name as last seen within the freshness bound,
+        or None if the snapshot is missing or stale.
+        """
+        with self._lock:
+            if self._usergroups is not None and time.monotonic() - self._usergroups_at <= self.max_age:
+                return self._usergroups
+        return None
+
+    def _set_users(self, users):
+        with self._lock:
+            self._users = {user.username.lower(): user for user in users}
+            self._users_at = time.monotonic()
+            self._enabled = {
+                name: enabled for name, enabled in self._enabled.items() if name in self._users
+            }
+            for name, user in self._users.items():
+                if user.enabled is not None:
+                    self._enabled[name] = (user.enabled, self._users_at)
+
+    def _set_usergroups(self, usergroups):
+        with self._lock:
+            self._usergroups = {
+                usergroup.name.lower(): Usergroup(usergroup.name, usergroup.description, list(usergroup.users))
+                for usergroup in usergroups
+            }
+            self._usergroups_at = time.monotonic()
+
+    @contextmanager
+    def _writing_through(self):
+        try:
+            yield
+        except Exception:
+            self.invalidate()
+            raise
@@ -0,0 +1,160 @@
+"""
+This module contains the MemoryAccountStore class keeping accounts in memory.
+
+It is meant for tests and benchmarks: nothing is persisted and no process is spawned.
+"""
+
+import threading
+
+from .base import AccountStore, AccountStoreError
+from ..user_groups.usergroups_scripts import Usergroup
+from ..users.user_scripts import User
+
+
+class MemoryAccountStore(AccountStore):
+    """
+    Keeps users and user groups in dictionaries keyed by lowercase name.
+
+    Attributes:
+        users (dict): Stored users as {'name': str, 'password': str, 'enabled': bool, 'sid': str}.
+        usergroups (dict): Stored user groups as {'name': str, 'description': str, 'members': list}.
+    """
+    def __init__(self, usernames=None, usergroups=None):
+        self.users = {}
+        self.usergroups = {}
+        self._hosts = {}
+        self._next_rid = 1000
+        self._lock = threading.RLock()
+        for username in usernames or []:
+            self.add_user(username, None)
+        for name, members in (usergroups or {}).items():
+            self.add_usergroup(name, usernames=members)
+
+    def for_host(self, host):
+        """
+        Returns a separate, initially empty store for every host.
+        """
+        with self._lock:
+            return self._hosts.setdefault(host.lower(), MemoryAccountStore())
+
+    def get_users(self):
+        with self._lock:
+            return [self._serialize_user(user) for user in self.users.values()]
+
+    def get_user(self, username):
+        with self._lock:
+            return self._serialize_user(self._user(username))
+
+    def add_user(self, username, password):
+        with self._lock:
+            if username.lower() in self.users:
+                raise AccountStoreError(f'User {username} already exists.')
+            self._next_rid += 1
+            self.users[username.lower()] = {
+                'name': username,
+                'password': password,
+                'enabled': True,
+                'sid': f'S-1-5-21-0-0-0-{self._next_rid}',
+            }
+
+    def edit_user_password(self, username, password):
+        with self._lock:
+            self._user(username)['password'] = password
+
+    def enable_user(self, username):
+        with self._lock:
+            self._user(username)['enabled'] = True
+        return True
+
+    def disable_user(self, username):
+        with self._lock:
+            self._user(username)['enabled'] = False
+        return True
+
+    def delete_user(self, username):
+        with self._lock:
+            user = self._user(username)
+            del self.users[username.lower()]
+            for usergroup in self.usergroups.values():
+                if user['name'] in usergroup['members']:
+                    usergroup['members'].remove(user['name'])
+
+    def get_usergroups(self):
+        with self._lock:
+            return [self._serialize_usergroup(usergroup) for usergroup in self.usergroups.values()]
+
+    def get_usergroup(self, name):
+        with self._lock:
+            return self._serialize_usergroup(self._usergroup(name))
+
+    def get_usergroup_users(self, name):
+        with self._lock:
+            return [User(member) for member in self._usergroup(name)['members']]
+
+    def add_usergroup(self, name, description=None, usernames=None):
+        with self._lock:
+            if name.lower() in self.usergroups:
+                raise AccountStoreError(f'Group {name} already exists.')
+            self.usergroups[name.lower()] = {'name': name, 'description': description, 'members': []}
+            self.add_usergroup_users(name, usernames or [])
+
+    def rename_usergroup(self, name, new_name):
+        with self._lock:
+            usergroup = self._usergroup(name)
+            if new_name.lower() != name.lower() and new_name.lower() in self.usergroups:
+                raise AccountStoreError(f'Group {new_name} already exists.')
+            del self.usergroups[name.lower()]
+            usergroup['name'] = new_name
+            self.usergroups[new_name.lower()] = usergroup
+        return True
+
+    def set_usergroup_description(self, name, description):
+        with self._lock:
+            self._usergroup(name)['description'] = description
+
+    def add_usergroup_users(self, name, usernames):
+        with self._lock:
+            usergroup = self._usergroup(name)
+            for username in usernames:
+                member = self._user(username)['name']
+                if member in usergroup['members']:
+                    raise AccountStoreError(f'{member} is already a member of group {usergroup["name"]}.')
+                usergroup['members'].append(member)
+        return True
+
+    def remove_usergroup_user(self, name, username):
+        with self._lock:
+            usergroup = self._usergroup(name)
+            member = self._user(username)['name']
+            if member not in usergroup['members']:
+                raise AccountStoreError(f'{member} is not a member of group {usergroup["name"]}.')
+            usergroup['members'].remove(member)
+
+    def delete_usergroup(self, name):
+        with self._lock:
+            self._usergroup(name)
+            del self.usergroups[name.lower()]
+
+    def _user(self, username):
+        user = self.users.get(username.lower())
+        if user is None:
+            raise AccountStoreError(f'User {username} was not found.')
+        return user
+
+    def _usergroup(self, name):
+        usergroup = self.usergroups.get(name.lower())
+        if usergroup is None:
+            raise AccountStoreError(f'Group {name} was not found.')
+        return usergroup
+
+    @staticmethod
+    def _serialize_user(user):
+        return User(user['name'], sid=user['sid'], enabled=user['enabled'], description='')
+
+    @staticmethod
+    def _serialize_usergroup(usergroup):
+        return Usergroup(
+            usergroup['name'],
+            usergroup['description'],
+            [User(member) for member in usergroup['members']]
+        )
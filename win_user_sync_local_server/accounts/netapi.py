@@ -0,0 +1,331 @@
+"""
+This module contains the NetApiAccountStore class managing accounts with the Win32 network management API.
+
+The functions of netapi32.dll are called in-process with ctypes, so no PowerShell process
+is spawned. Remote hosts are managed by passing their name as the server of the calls.
+"""
+
+import ctypes
+import time
+from ctypes import wintypes
+from datetime import datetime, timezone
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .base import AccountStore, AccountStoreError
+from ..diagnostics.tracing import tracer
+from ..user_groups.usergroups_scripts import Usergroup
+from ..users.user_scripts import User
+
+NERR_SUCCESS = 0
+ERROR_MORE_DATA = 234
+MAX_PREFERRED_LENGTH = 0xFFFFFFFF
+FILTER_NORMAL_ACCOUNT = 0x0002
+USER_PRIV_USER = 1
+UF_SCRIPT = 0x0001
+UF_ACCOUNTDISABLE = 0x0002
+UF_PASSWD_NOTREQD = 0x0020
+SECURITY_MAX_SID_SIZE = 68
+
+ERROR_MESSAGES = {
+    5: 'Access is denied.',
+    1376: 'The specified local group does not exist.',
+    1377: 'The specified account name is not a member of the group.',
+    1378: 'The specified account name is already a member of the group.',
+    1379: 'The specified local group already exists.',
+    1387: 'A member could not be added to or removed from the local group because the member does not exist.',
+    2220: 'The group name could not be found.',
+    2221: 'The user name could not be found.',
+    2223: 'The group already exists.',
+    2224: 'The account already exists.',
+    2245: 'The password does not meet the password policy requirements.',
+}
+
+
+class NetApiError(AccountStoreError):
+    """
+    Raised when a network management function returns an error status.
+
+    Attributes:
+        status (int): The status returned by the function.
+    """
+    def __init__(self, function, status):
+        self.status = status
+        message = ERROR_MESSAGES.get(status) or ctypes.FormatError(status)
+        super().__init__(f'{function} failed with status {status}: {message}')
+
+
+class USER_INFO_1(ctypes.Structure):
+    _fields_ = [
+        ('usri1_name', wintypes.LPWSTR),
+        ('usri1_password', wintypes.LPWSTR),
+        ('usri1_password_age', wintypes.DWORD),
+        ('usri1_priv', wintypes.DWORD),
+        ('usri1_home_dir', wintypes.LPWSTR),
+        ('usri1_comment', wintypes.LPWSTR),
+        ('usri1_flags', wintypes.DWORD),
+        ('usri1_script_path', wintypes.LPWSTR),
+    ]
+
+
+class USER_INFO_3(ctypes.Structure):
+    _fields_ = [
+        ('usri3_name', wintypes.LPWSTR),
+        ('usri3_password', wintypes.LPWSTR),
+        ('usri3_password_age', wintypes.DWORD),
+        ('usri3_priv', wintypes.DWORD),
+        ('usri3_home_dir', wintypes.LPWSTR),
+        ('usri3_comment', wintypes.LPWSTR),
+        ('usri3_flags', wintypes.DWORD),
+        ('usri3_script_path', wintypes.LPWSTR),
+        ('usri3_auth_flags', wintypes.DWORD),
+        ('usri3_full_name', wintypes.LPWSTR),
+        ('usri3_usr_comment', wintypes.LPWSTR),
+        ('usri3_parms', wintypes.LPWSTR),
+        ('usri3_workstations', wintypes.LPWSTR),
+        ('usri3_last_logon', wintypes.DWORD),
+        ('usri3_last_logoff', wintypes.DWORD),
+        ('usri3_acct_expires', wintypes.DWORD),
+        ('usri3_max_storage', wintypes.DWORD),
+        ('usri3_units_per_week', wintypes.DWORD),
+        ('usri3_logon_hours', ctypes.c_void_p),
+        ('usri3_bad_pw_count', wintypes.DWORD),
+        ('usri3_num_logons', wintypes.DWORD),
+        ('usri3_logon_server', wintypes.LPWSTR),
+        ('usri3_country_code', wintypes.DWORD),
+        ('usri3_code_page', wintypes.DWORD),
+        ('usri3_user_id', wintypes.DWORD),
+        ('usri3_primary_group_id', wintypes.DWORD),
+        ('usri3_profile', wintypes.LPWSTR),
+        ('usri3_home_dir_drive', wintypes.LPWSTR),
+        ('usri3_password_expired', wintypes.DWORD),
+    ]
+
+
+class USER_INFO_1003(ctypes.Structure):
+    _fields_ = [('usri1003_password', wintypes.LPWSTR)]
+
+
+class USER_INFO_1008(ctypes.Structure):
+    _fields_ = [('usri1008_flags', wintypes.DWORD)]
+
+
+class LOCALGROUP_INFO_0(ctypes.Structure):
+    _fields_ = [('lgrpi0_name', wintypes.LPWSTR)]
+
+
+class LOCALGROUP_INFO_1(ctypes.Structure):
+    _fields_ = [('lgrpi1_name', wintypes.LPWSTR), ('lgrpi1_comment', wintypes.LPWSTR)]
+
+
+class LOCALGROUP_INFO_1002(ctypes.Structure):
+    _fields_ = [('lgrpi1002_comment', wintypes.LPWSTR)]
+
+
+class LOCALGROUP_MEMBERS_INFO_3(ctypes.Structure):
+    _fields_ = [('lgrmi3_domainandname', wintypes.LPWSTR)]
+
+
+def copy_structure(structure):
+    """
+    Copies a structure read from an API buffer, including its strings, so it outlives the buffer.
+    """
+    return type(structure)(*(getattr(structure, field) for field, _ in structure._fields_))
+
+
+def format_timestamp(seconds):
+    """
+    Formats seconds since the epoch in ISO 8601, or returns None for 0.
+    """
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat() if seconds else None
+
+
+def load_netapi():
+    """
+    Loads netapi32.dll.
+
+    Raises:
+        ImproperlyConfigured: If the library isn't available, e.g. on other systems than Windows.
+    """
+    try:
+        netapi = ctypes.WinDLL('netapi32')
+    except (AttributeError, OSError) as exc:
+        raise ImproperlyConfigured(f'The NetAPI account store requires netapi32.dll: {exc}')
+    for function in (
+            'NetUserEnum', 'NetUserGetInfo', 'NetUserAdd', 'NetUserSetInfo', 'NetUserDel',
+            'NetLocalGroupEnum', 'NetLocalGroupGetInfo', 'NetLocalGroupGetMembers', 'NetLocalGroupAdd',
+            'NetLocalGroupSetInfo', 'NetLocalGroupDel', 'NetLocalGroupAddMembers', 'NetLocalGroupDelMembers',
+            'NetApiBufferFree'
+    ):
+        getattr(netapi, function).restype = wintypes.DWORD
+    return netapi
+
+
+class NetApiAccountStore(AccountStore):
+    """
+    Manages accounts with the Win32 network management API.
+
+    Attributes:
+        server (str): The name of the managed server or None for this machine.
+    """
+    def __init__(self, server=None, netapi=None):
+        self.server = server
+        self.netapi = netapi or load_netapi()
+        self._domain_sid = None
+
+    def for_host(self, host):
+        return NetApiAccountStore(f'\\\\{host}', self.netapi)
+
+    def get_users(self):
+        entries = self._enumerate('NetUserEnum', USER_INFO_3, (3, FILTER_NORMAL_ACCOUNT), wintypes.DWORD)
+        return [self._user(entry) for entry in entries]
+
+    def get_user(self, username):
+        return self._user(self._get_info('NetUserGetInfo', USER_INFO_3, username, 3))
+
+    def add_user(self, username, password):
+        flags = UF_SCRIPT if password else UF_SCRIPT | UF_PASSWD_NOTREQD
+        info = USER_INFO_1(username, password or None, 0, USER_PRIV_USER, None, None, flags, None)
+        self._call('NetUserAdd', self.server, 1, ctypes.byref(info), None)
+
+    def edit_user_password(self, username, password):
+        info = USER_INFO_1003(password)
+        self._call('NetUserSetInfo', self.server, username, 1003, ctypes.byref(info), None)
+
+    def enable_user(self, username):
+        self._set_user_flags(username, lambda flags: flags & ~UF_ACCOUNTDISABLE)
+        return True
+
+    def disable_user(self, username):
+        self._set_user_flags(username, lambda flags: flags | UF_ACCOUNTDISABLE)
+        return True
+
+    def delete_user(self, username):
+        self._call('NetUserDel', self.server, username)
+
+    def get_usergroups(self):
+        entries = self._enumerate('NetLocalGroupEnum', LOCALGROUP_INFO_1, (1,), ctypes.c_size_t)
+        return [
+            Usergroup(entry.lgrpi1_name, entry.lgrpi1_comment or None, self.get_usergroup_users(entry.lgrpi1_name))
+            for entry in entries
+        ]
+
+    def get_usergroup(self, name):
+        info = self._get_info('NetLocalGroupGetInfo', LOCALGROUP_INFO_1, name, 1)
+        return Usergroup(info.lgrpi1_name, info.lgrpi1_comment or None, self.get_usergroup_users(info.lgrpi1_name))
+
+    def get_usergroup_users(self, name):
+        entries = self._enumerate('NetLocalGroupGetMembers', LOCALGROUP_MEMBERS_INFO_3, (name, 3), ctypes.c_size_t)
+        return [User(entry.lgrmi3_domainandname.split('\\')[-1]) for entry in entries]
+
+    def add_usergroup(self, name, description=None, usernames=None):
+        info = LOCALGROUP_INFO_1(name, description)
+        self._call('NetLocalGroupAdd', self.server, 1, ctypes.byref(info), None)
+        if usernames:
+            self.add_usergroup_users(name, usernames)
+
+    def rename_usergroup(self, name, new_name):
+        info = LOCALGROUP_INFO_0(new_name)
+        self._call('NetLocalGroupSetInfo', self.server, name, 0, ctypes.byref(info), None)
+        return True
+
+    def set_usergroup_description(self, name, description):
+        info = LOCALGROUP_INFO_1002(description or '')
+        self._call('NetLocalGroupSetInfo', self.server, name, 1002, ctypes.byref(info), None)
+
+    def add_usergroup_users(self, name, usernames):
+        if usernames:
+            self._change_members('NetLocalGroupAddMembers', name, usernames)
+        return True
+
+    def remove_usergroup_user(self, name, username):
+        self._change_members('NetLocalGroupDelMembers', name, [username])
+
+    def delete_usergroup(self, name):
+        self._call('NetLocalGroupDel', self.server, name)
+
+    def _user(self, info):
+        """
+        Creates a User from a USER_INFO_3 structure. Local accounts share the SID of the machine
+        and differ by their relative identifier, so the SID is only looked up once per store.
+        """
+        if self._domain_sid is None:
+            self._domain_sid = self._lookup_sid(info.usri3_name).rsplit('-', 1)[0]
+        return User(
+            info.usri3_name,
+            sid=f'{self._domain_sid}-{info.usri3_user_id}',
+            enabled=not info.usri3_flags & UF_ACCOUNTDISABLE,
+            description=info.usri3_comment or '',
+            last_logon=format_timestamp(info.usri3_last_logon),
+            password_last_set=format_timestamp(int(time.time()) - info.usri3_password_age)
+        )
+
+    def _lookup_sid(self, username):
+        advapi = ctypes.WinDLL('advapi32')
+        sid = ctypes.create_string_buffer(SECURITY_MAX_SID_SIZE)
+        sid_size = wintypes.DWORD(SECURITY_MAX_SID_SIZE)
+        domain = ctypes.create_unicode_buffer(256)
+        domain_size = wintypes.DWORD(256)
+        use = wintypes.DWORD()
+        if not advapi.LookupAccountNameW(
+                self.server, username, sid, ctypes.byref(sid_size), domain, ctypes.byref(domain_size), ctypes.byref(use)
+        ):
+            raise NetApiError('LookupAccountNameW', ctypes.GetLastError())
+        string_sid = wintypes.LPWSTR()
+        if not advapi.ConvertSidToStringSidW(sid, ctypes.byref(string_sid)):
+            raise NetApiError('ConvertSidToStringSidW', ctypes.GetLastError())
+        try:
+            return string_sid.value
+        finally:
+            ctypes.windll.kernel32.LocalFree(string_sid)
+
+    def _call(self, function, *args):
+        with tracer.span('netapi', function=function):
+            status = getattr(self.netapi, function)(*args)
+        if status != NERR_SUCCESS:
+            raise NetApiError(function, status)
+
+    def _get_info(self, function, structure, name, level):
+        buffer = ctypes.c_void_p()
+        self._call(function, self.server, name, level, ctypes.byref(buffer))
+        try:
+            return copy_structure(ctypes.cast(buffer, ctypes.POINTER(structure)).contents)
+        finally:
+            self.netapi.NetApiBufferFree(buffer)
+
+    def _enumerate(self, function, structure, args, resume_handle_type):
+        """
+        Calls an enumeration function until all entries are read.
+        """
+        entries = []
+        resume_handle = resume_handle_type(0)
+        with tracer.span('netapi', function=function):
+            while True:
+                buffer = ctypes.c_void_p()
+                read, total = wintypes.DWORD(), wintypes.DWORD()
+                status = getattr(self.netapi, function)(
+                    self.server, *args, ctypes.byref(buffer), wintypes.DWORD(MAX_PREFERRED_LENGTH),
+                    ctypes.byref(read), ctypes.byref(total), ctypes.byref(resume_handle)
+                )
+                if status not in (NERR_SUCCESS, ERROR_MORE_DATA):
+                    raise NetApiError(function, status)
+                try:
+                    if buffer:
+                        array = ctypes.cast(buffer, ctypes.POINTER(structure * read.value)).contents
+                        entries += [copy_structure(entry) for entry in array]
+                finally:
+                    if buffer:
+                        self.netapi.NetApiBufferFree(buffer)
+                if status == NERR_SUCCESS:
+                    return entries
+
+    def _set_user_flags(self, username, change):
+        flags = self._get_info('NetUserGetInfo', USER_INFO_1, username, 1).usri1_flags
+        info = USER_INFO_1008(change(flags))
+        self._call('NetUserSetInfo', self.server, username, 1008, ctypes.byref(info), None)
+
+    def _change_members(self, function, name, usernames):
+        members = (LOCALGROUP_MEMBERS_INFO_3 * len(usernames))(
+            *(LOCALGROUP_MEMBERS_INFO_3(username) for username in usernames)
+        )
+        self._call(function, self.server, name, 3, members, len(usernames))
@@ -0,0 +1,129 @@
+"""
+This module contains the PowerShellAccountStore class managing accounts with the local-accounts cmdlets.
+"""
+
+from config.settings.base import BULK_CHUNK_SIZE, get_powershell_path
+from .base import AccountStore, BulkResult
+from ..remoting.hosts import RemoteShell
+from ..user_groups.usergroups_scripts import UsergroupEditor, UsergroupRetriever
+from ..users.user_scripts import LocalShell, UserEditor, UserRetriever
+
+
+def serialize_usernames(usernames):
+    return [{'username': username} for username in usernames]
+
+
+def run_in_chunks(operation, names, chunk_size):
+    """
+    Runs a bulk operation on chunks of names, so that a failing chunk doesn't abort the others.
+
+    Args:
+        operation: Takes a chunk of names and returns the error of every name or None, keyed by lowercase name.
+        names (list): The names of the accounts.
+        chunk_size (int): The maximum number of names handled by a single invocation.
+
+    Returns:
+        list: A BulkResult for every name, in the given order.
+    """
+    results = {}
+    # Names with commas can't exist on Windows and would be split by the script
+    invalid = [name for name in names if ',' in name]
+    for name in invalid:
+        results[name] = BulkResult(name, error=f'Invalid name {name}')
+    valid = list(dict.fromkeys(name for name in names if ',' not in name))
+    for start in range(0, len(valid), chunk_size):
+        chunk = valid[start:start + chunk_size]
+        try:
+            errors = operation(chunk)
+        except Exception as exc:
+            errors = {name.lower(): str(exc) for name in chunk}
+        for name in chunk:
+            if name.lower() not in errors:
+                results[name] = BulkResult(name, error='No status was reported')
+            else:
+                results[name] = BulkResult(name, error=errors[name.lower()])
+    return [results[name] for name in names]
+
+
+class PowerShellAccountStore(AccountStore):
+    """
+    Manages accounts by running PowerShell commands, on this machine or through remote sessions.
+
+    Attributes:
+        powershell_path (str): The path to the PowerShell executable.
+        shell: Runs the commands. Defaults to a LocalShell.
+    """
+    def __init__(self, powershell_path, shell=None):
+        self.powershell_path = powershell_path
+        self.shell = shell or LocalShell(powershell_path)
+        self.user_editor = UserEditor(powershell_path, self.shell)
+        self.user_retriever = UserRetriever(powershell_path, self.shell)
+        self.usergroup_editor = UsergroupEditor(powershell_path, self.shell)
+        self.usergroup_retriever = UsergroupRetriever(powershell_path, self.shell)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(get_powershell_path())
+
+    def for_host(self, host):
+        return PowerShellAccountStore(self.powershell_path, RemoteShell(host))
+
+    def get_users(self):
+        return self.user_retriever.get_all()
+
+    def get_user(self, username):
+        return self.user_retriever.get(username)
+
+    def add_user(self, username, password):
+        self.user_editor.add(username, password)
+
+    def edit_user_password(self, username, password):
+        self.user_editor.edit_password(username, password)
+
+    def enable_user(self, username):
+        self.user_editor.enable(username)
+        return True
+
+    def disable_user(self, username):
+        self.user_editor.disable(username)
+        return True
+
+    def delete_user(self, username):
+        self.user_editor.delete(username)
+
+    def get_usergroups(self):
+        return self.usergroup_retriever.get_all()
+
+    def get_usergroup(self, name):
+        return self.usergroup_retriever.get(name)
+
+    def get_usergroup_users(self, name):
+        return self.usergroup_retriever.get_users(name)
+
+    def add_usergroup(self, name, description=None, usernames=None):
+        self.usergroup_editor.add(name, description=description, users=serialize_usernames(usernames or []))
+
+    def rename_usergroup(self, name, new_name):
+        self.usergroup_editor.rename(name, new_name)
+        return True
+
+    def set_usergroup_description(self, name, description):
+        self.usergroup_editor.set_description(name, description)
+
+    def add_usergroup_users(self, name, usernames):
+        self.usergroup_editor.add_users(name, serialize_usernames(usernames))
+        return True
+
+    def remove_usergroup_user(self, name, username):
+        self.usergroup_editor.remove_user(name, username)
+
+    def delete_usergroup(self, name):
+        self.usergroup_editor.delete(name)
+
+    def bulk_update_users(self, action, usernames):
+        return run_in_chunks(
+            lambda chunk: self.user_editor.bulk(action, chunk), usernames, BULK_CHUNK_SIZE
+        )
+
+    def delete_usergroups(self, names):
+        return run_in_chunks(self.usergroup_editor.delete_many, names, BULK_CHUNK_SIZE)
@@ -0,0 +1,22 @@
+"""
+This module contains the account store configured by the ACCOUNT_STORE_BACKEND setting.
+
+Unless ACCOUNT_SNAPSHOT_MAX_AGE is 0, the store of this machine skips no-op mutations, see
+the known_state module. Stores of remote hosts always apply them.
+"""
+
+from django.utils.module_loading import import_string
+
+from config.settings.base import ACCOUNT_SNAPSHOT_MAX_AGE, ACCOUNT_STORE_BACKEND
+from .known_state import KnownStateAccountStore
+
+account_store = import_string(ACCOUNT_STORE_BACKEND).from_settings()
+if ACCOUNT_SNAPSHOT_MAX_AGE > 0:
+    account_store = KnownStateAccountStore(account_store, ACCOUNT_SNAPSHOT_MAX_AGE)
+
+
+def account_store_for(host):
+    """
+    Returns the account store of the given remote host or of this machine if host is None.
+    """
+    return account_store if host is None else account_store.for_host(host)
@@ -0,0 +1,192 @@
+"""
+This module contains the AdmissionController class for rejecting excess requests early.
+"""
+
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+
+# Endpoint classes of views whose class doesn't follow from the request method
+DEFAULT_ENDPOINT_CLASSES = {
+    'watch_changes': 'stream',
+    'put_state': 'reconcile',
+    'healthz': 'probe',
+    'readyz': 'probe',
+}
+
+DEFAULT_LIMITS = {
+    'read': {'max_concurrent': 32, 'max_concurrent_per_subject': 16},
+    'write': {'max_concurrent': 16, 'max_concurrent_per_subject': 8},
+    'reconcile': {'max_concurrent': 1, 'max_concurrent_per_subject': 1},
+    'stream': {'max_concurrent': 64, 'max_concurrent_per_subject': 8},
+}
+
+# Endpoint classes that don't run PowerShell commands and ignore the PowerShell load
+UNBOUND_CLASSES = ('stream', 'probe')
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is rejected.
+
+    Attributes:
+        reason (str): Why the request was rejected.
+        retry_after (int): The number of seconds after which the request may be retried.
+    """
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """
+    Represents an admitted request that should be released when it finishes.
+    """
+    def __init__(self, endpoint_class, subject):
+        self.endpoint_class = endpoint_class
+        self.subject = subject
+        self.started_at = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Limits concurrent requests per endpoint class and per token subject.
+
+    Requests that would run PowerShell commands are rejected when too many commands are
+    running already, and their concurrency limits shrink proportionally while the recent
+    command latency is above the target one.
+
+    Attributes:
+        limits (dict): Limits keyed by endpoint class: 'max_concurrent' and 'max_concurrent_per_subject'.
+        subject_limits (dict): Per-subject limit overrides keyed by subject, then by endpoint class.
+        endpoint_classes (dict): Endpoint classes keyed by URL name, for views not classified by method.
+        load (PowerShellLoad): The tracker of running PowerShell commands.
+        max_queue_depth (int): The number of running PowerShell commands at which requests are rejected.
+        target_latency (float): The PowerShell command latency in seconds above which limits shrink.
+        max_retry_after (int): The upper bound of the suggested Retry-After in seconds.
+    """
+    def __init__(
+            self,
+            limits,
+            subject_limits,
+            endpoint_classes,
+            load,
+            max_queue_depth,
+            target_latency,
+            max_retry_after
+    ):
+        self.limits = {
+            endpoint_class: {**DEFAULT_LIMITS.get(endpoint_class, {}), **limits.get(endpoint_class, {})}
+            for endpoint_class in DEFAULT_LIMITS.keys() | limits.keys()
+        }
+        self.subject_limits = subject_limits
+        self.endpoint_classes = {**DEFAULT_ENDPOINT_CLASSES, **endpoint_classes}
+        self.load = load
+        self.max_queue_depth = max_queue_depth
+        self.target_latency = target_latency
+        self.max_retry_after = max_retry_after
+        self._lock = threading.Lock()
+        self._in_flight = defaultdict(int)
+        self._subject_in_flight = defaultdict(int)
+        self._latency = defaultdict(float)
+
+    def classify(self, url_name, method):
+        """
+        Returns the endpoint class of a request.
+
+        Args:
+            url_name (str): The name of the resolved URL pattern.
+            method (str): The HTTP method.
+
+        Returns:
+            str: The endpoint class.
+        """
+        if url_name in self.endpoint_classes:
+            return self.endpoint_classes[url_name]
+        return 'read' if method in ('GET', 'HEAD', 'OPTIONS') else 'write'
+
+    def admit(self, endpoint_class, subject):
+        """
+        Admits a request or rejects it.
+
+        Args:
+            endpoint_class (str): The endpoint class of the request.
+            subject (str): The subject of the request's token or None.
+
+        Returns:
+            AdmissionTicket: The ticket to release when the request finishes.
+
+        Raises:
+            AdmissionRejected: If the request should be retried later.
+        """
+        limits = self.limits.get(endpoint_class, {})
+        max_concurrent = limits.get('max_concurrent')
+        max_concurrent_per_subject = self.subject_limits.get(subject, {}).get(
+            endpoint_class, limits.get('max_concurrent_per_subject')
+        )
+        bound = endpoint_class not in UNBOUND_CLASSES
+
+        with self._lock:
+            if bound and self.load.in_flight >= self.max_queue_depth:
+                raise AdmissionRejected(
+                    f'{self.load.in_flight} PowerShell commands are running already',
+                    self._retry_after(self.load.latency * self.load.in_flight / self.max_queue_depth)
+                )
+            if max_concurrent is not None and bound:
+                max_concurrent = self._shrink(max_concurrent)
+            if max_concurrent is not None and self._in_flight[endpoint_class] >= max_concurrent:
+                raise AdmissionRejected(
+                    f'Too many concurrent {endpoint_class} requests',
+                    self._retry_after(self._latency[endpoint_class])
+                )
+            if (max_concurrent_per_subject is not None
+                    and self._subject_in_flight[(endpoint_class, subject)] >= max_concurrent_per_subject):
+                raise AdmissionRejected(
+                    f'Too many concurrent {endpoint_class} requests from {subject}',
+                    self._retry_after(self._latency[endpoint_class])
+                )
+            self._in_flight[endpoint_class] += 1
+            self._subject_in_flight[(endpoint_class, subject)] += 1
+
+        return AdmissionTicket(endpoint_class, subject)
+
+    def release(self, ticket):
+        """
+        Releases an admitted request and accounts its latency.
+
+        Args:
+            ticket (AdmissionTicket): The ticket returned by admit().
+        """
+        elapsed = time.monotonic() - ticket.started_at
+        with self._lock:
+            self._in_flight[ticket.endpoint_class] -= 1
+            self._subject_in_flight[(ticket.endpoint_class, ticket.subject)] -= 1
+            if not self._subject_in_flight[(ticket.endpoint_class, ticket.subject)]:
+                del self._subject_in_flight[(ticket.endpoint_class, ticket.subject)]
+            previous = self._latency[ticket.endpoint_class]
+            self._latency[ticket.endpoint_class] = elapsed if not previous else 0.2 * elapsed + 0.8 * previous
+
+    def status(self):
+        """
+        Returns the current load and the number of admitted requests per endpoint class.
+        """
+        with self._lock:
+            return {
+                'powershell_in_flight': self.load.in_flight,
+                'powershell_latency': round(self.load.latency, 3),
+                'in_flight': dict(self._in_flight),
+                'latency': {endpoint_class: round(latency, 3) for endpoint_class, latency in self._latency.items()},
+            }
+
+    def _shrink(self, max_concurrent):
+        latency = self.load.latency
+        if not self.target_latency or latency <= self.target_latency:
+            return max_concurrent
+        return max(1, int(max_concurrent * self.target_latency / latency))
+
+    def _retry_after(self, expected_wait):
+        # Jitter spreads retries of clients rejected at the same time
+        return min(self.max_retry_after, max(1, math.ceil(expected_wait * random.uniform(1, 1.5))))
@@ -0,0 +1,56 @@
+"""
+This module contains the PowerShellLoad class for tracking PowerShell command load.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PowerShellLoad:
+    """
+    Tracks the number of running PowerShell commands and their recent latency.
+
+    Attributes:
+        smoothing (float): The weight of the latest command in the moving average latency.
+    """
+    def __init__(self, smoothing=0.2):
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._latency = 0.0
+
+    @contextmanager
+    def track(self):
+        """
+        Counts the wrapped command as running and measures its latency.
+        """
+        with self._lock:
+            self._in_flight += 1
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started_at
+            with self._lock:
+                self._in_flight -= 1
+                self._latency = elapsed if not self._latency else (
+                    self.smoothing * elapsed + (1 - self.smoothing) * self._latency
+                )
+
+    @property
+    def in_flight(self):
+        """
+        The number of PowerShell commands running right now.
+        """
+        return self._in_flight
+
+    @property
+    def latency(self):
+        """
+        The exponentially weighted moving average of command latency in seconds.
+        """
+        return self._latency
+
+
+powershell_load = PowerShellLoad()
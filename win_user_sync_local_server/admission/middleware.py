@@ -0,0 +1,89 @@
+"""
+This module contains the middleware applying admission control to views.
+"""
+
+from django.http import JsonResponse
+
+from config.settings.base import (
+    ADMISSION_CONTROL_ENABLED,
+    ADMISSION_ENDPOINT_CLASSES,
+    ADMISSION_LIMITS,
+    ADMISSION_MAX_QUEUE_DEPTH,
+    ADMISSION_MAX_RETRY_AFTER,
+    ADMISSION_SUBJECT_LIMITS,
+    ADMISSION_TARGET_LATENCY
+)
+from .controller import AdmissionController, AdmissionRejected
+from .load import powershell_load
+
+admission_controller = AdmissionController(
+    ADMISSION_LIMITS,
+    ADMISSION_SUBJECT_LIMITS,
+    ADMISSION_ENDPOINT_CLASSES,
+    powershell_load,
+    ADMISSION_MAX_QUEUE_DEPTH,
+    ADMISSION_TARGET_LATENCY,
+    ADMISSION_MAX_RETRY_AFTER
+)
+
+
+def token_subject(request):
+    """
+    Returns the subject of the request's token from the user info set by the Keycloak middleware.
+    """
+    userinfo = getattr(request, 'userinfo', None)
+    return userinfo.get('sub') if isinstance(userinfo, dict) else None
+
+
+class AdmissionControlMiddleware:
+    """
+    Rejects requests with 429 Too Many Requests and a Retry-After header when the server is overloaded.
+
+    Should be placed after the Keycloak middleware, so that requests are classified
+    by the subject of an already validated token.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self._release(request)
+            raise
+
+        if getattr(response, 'streaming', False) and getattr(request, 'admission_ticket', None):
+            response.streaming_content = self._release_when_streamed(request, response.streaming_content)
+        else:
+            self._release(request)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not ADMISSION_CONTROL_ENABLED:
+            return None
+
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        endpoint_class = admission_controller.classify(url_name, request.method)
+        try:
+            request.admission_ticket = admission_controller.admit(endpoint_class, token_subject(request))
+        except AdmissionRejected as exc:
+            response = JsonResponse(
+                {"error": f"Too many requests: {exc.reason}", "retry_after": exc.retry_after},
+                status=429,
+                content_type='application/json'
+            )
+            response['Retry-After'] = str(exc.retry_after)
+            return response
+        return None
+
+    def _release_when_streamed(self, request, streaming_content):
+        try:
+            yield from streaming_content
+        finally:
+            self._release(request)
+
+    def _release(self, request):
+        ticket = getattr(request, 'admission_ticket', None)
+        if ticket is not None:
+            request.admission_ticket = None
+            admission_controller.release(ticket)
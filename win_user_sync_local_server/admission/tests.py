@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from . import middleware
+from .controller import AdmissionController, AdmissionRejected
+
+
+def make_controller(limits=None, in_flight=0, latency=0.0):
+    load = SimpleNamespace(in_flight=in_flight, latency=latency)
+    return AdmissionController(limits or {}, {}, {}, load, 4, 1.0, 60)
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    """
+    Admission decisions of the controller.
+    """
+    def test_requests_over_the_limit_are_rejected_until_released(self):
+        controller = make_controller({'write': {'max_concurrent': 1}})
+        ticket = controller.admit('write', 'alice')
+
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.admit('write', 'bob')
+        self.assertTrue(1 <= rejected.exception.retry_after <= 60)
+
+        controller.release(ticket)
+        controller.admit('write', 'bob')
+
+    def test_per_subject_limit_leaves_other_subjects_admitted(self):
+        controller = make_controller({'read': {'max_concurrent_per_subject': 1}})
+        controller.admit('read', 'alice')
+
+        with self.assertRaises(AdmissionRejected):
+            controller.admit('read', 'alice')
+        controller.admit('read', 'bob')
+
+    def test_powershell_queue_rejects_bound_classes_only(self):
+        controller = make_controller(in_flight=4, latency=2.0)
+
+        with self.assertRaises(AdmissionRejected):
+            controller.admit('read', 'alice')
+        controller.admit('stream', 'alice')
+
+    def test_slow_commands_shrink_the_limit(self):
+        controller = make_controller({'write': {'max_concurrent': 4, 'max_concurrent_per_subject': None}}, latency=2.0)
+        controller.admit('write', 'alice')
+        controller.admit('write', 'alice')
+
+        with self.assertRaises(AdmissionRejected):
+            controller.admit('write', 'alice')
+
+
+class AdmissionMiddlewareTests(SimpleTestCase):
+    """
+    Releasing admitted requests once their responses are done.
+    """
+    def setUp(self):
+        self.controller = make_controller()
+        patcher = mock.patch.object(middleware, 'admission_controller', self.controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def handle(self, view):
+        def get_response(request):
+            rejected = admission.process_view(request, view, (), {})
+            return rejected if rejected is not None else view(request)
+
+        admission = middleware.AdmissionControlMiddleware(get_response)
+        request = RequestFactory().get('/changes/')
+        request.resolver_match = None
+        return admission(request)
+
+    def in_flight(self):
+        return self.controller.status()['in_flight'].get('read', 0)
+
+    def test_plain_response_is_released_right_away(self):
+        self.handle(lambda request: HttpResponse('done'))
+
+        self.assertEqual(self.in_flight(), 0)
+
+    def test_streaming_response_is_released_once_streamed(self):
+        response = self.handle(lambda request: StreamingHttpResponse(iter([b'a', b'b'])))
+
+        self.assertEqual(self.in_flight(), 1)
+        self.assertEqual(b''.join(response.streaming_content), b'ab')
+        self.assertEqual(self.in_flight(), 0)
+
+    def test_closed_streaming_response_is_released(self):
+        response = self.handle(lambda request: StreamingHttpResponse(iter([b'a', b'b'])))
+
+        next(iter(response.streaming_content))
+        response.close()
+
+        self.assertEqual(self.in_flight(), 0)
+
+    def test_failed_view_is_released(self):
+        def failing(request):
+            raise RuntimeError('failed')
+
+        with self.assertRaises(RuntimeError):
+            self.handle(failing)
+        self.assertEqual(self.in_flight(), 0)
@@ -0,0 +1,6 @@
+from django.apps import AppConfig
+
+
+class ChangeLogConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'win_user_sync_local_server.change_log'
@@ -0,0 +1,94 @@
+"""
+This module contains functions for streaming change log entries as Server-Sent Events.
+"""
+
+import json
+import time
+
+from .recorder import change_recorder
+
+MEMBERSHIP_ACTIONS = ('member_added', 'member_removed')
+STREAM_BATCH_SIZE = 500
+RECONNECT_DELAY_MS = 3000
+
+
+def event_name(entry):
+    """
+    Returns the SSE event name of a change log entry.
+
+    Membership changes share the 'membership_changed' event, the exact action is kept in the data.
+
+    Args:
+        entry (ChangeLogEntry): The change log entry.
+
+    Returns:
+        str: The event name.
+    """
+    return 'membership_changed' if entry.action in MEMBERSHIP_ACTIONS else entry.action
+
+
+def format_event(entry):
+    """
+    Formats a change log entry as an SSE frame with the revision as the event ID.
+
+    Args:
+        entry (ChangeLogEntry): The change log entry.
+
+    Returns:
+        str: The SSE frame.
+    """
+    return f'id: {entry.revision}\nevent: {event_name(entry)}\ndata: {json.dumps(entry.serialize())}\n\n'
+
+
+def format_reset(revision):
+    """
+    Formats the frame telling the consumer that entries it asked for were compacted.
+
+    Args:
+        revision (int): The revision the stream continues from.
+
+    Returns:
+        str: The SSE frame.
+    """
+    return f'id: {revision}\nevent: reset\ndata: {json.dumps({"revision": revision})}\n\n'
+
+
+def format_heartbeat():
+    """
+    Returns an SSE comment frame that keeps idle connections open.
+    """
+    return f': heartbeat {int(time.time())}\n\n'
+
+
+def stream_changes(last_revision, heartbeat_interval, max_duration):
+    """
+    Yields SSE frames for the entries recorded after the given revision as they are recorded.
+
+    Args:
+        last_revision (int): The last revision known to the consumer or None to stream new entries only.
+        heartbeat_interval (float): The number of idle seconds after which a heartbeat is sent.
+        max_duration (float): The number of seconds after which the stream ends and the consumer reconnects.
+
+    Yields:
+        str: SSE frames.
+    """
+    deadline = time.monotonic() + max_duration
+    yield f'retry: {RECONNECT_DELAY_MS}\n\n'
+
+    if last_revision is None:
+        last_revision = change_recorder.current_revision()
+    elif last_revision < change_recorder.compacted_through():
+        last_revision = change_recorder.current_revision()
+        yield format_reset(last_revision)
+
+    while time.monotonic() < deadline:
+        signal = change_recorder.change_signal()
+        entries, has_more = change_recorder.changes_since(last_revision, STREAM_BATCH_SIZE)
+        for entry in entries:
+            last_revision = entry.revision
+            yield format_event(entry)
+        if has_more:
+            continue
+        timeout = min(heartbeat_interval, max(deadline - time.monotonic(), 0))
+        if not change_recorder.wait_for_changes(signal, timeout):
+            yield format_heartbeat()
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('user', 'User'), ('usergroup', 'User group')], max_length=16)),
+                ('entity_name', models.CharField(max_length=256)),
+                ('action', models.CharField(max_length=32)),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('source', models.CharField(choices=[('performed', 'Performed through the API'), ('observed', 'Observed in the local state')], default='performed', max_length=16)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ChangeLogState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('value', models.JSONField(default=None, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import models
+
+
+class ChangeLogEntry(models.Model):
+    """
+    A single change to a local user or user group.
+
+    The primary key is auto-incremented and never reused, so it doubles as
+    the monotonic revision number of the change log.
+    """
+    USER = 'user'
+    USERGROUP = 'usergroup'
+    ENTITY_TYPES = [
+        (USER, 'User'),
+        (USERGROUP, 'User group'),
+    ]
+
+    PERFORMED = 'performed'
+    OBSERVED = 'observed'
+    SOURCES = [
+        (PERFORMED, 'Performed through the API'),
+        (OBSERVED, 'Observed in the local state'),
+    ]
+
+    entity_type = models.CharField(max_length=16, choices=ENTITY_TYPES)
+    entity_name = models.CharField(max_length=256)
+    action = models.CharField(max_length=32)
+    details = models.JSONField(default=dict, blank=True)
+    source = models.CharField(max_length=16, choices=SOURCES, default=PERFORMED)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def revision(self):
+        return self.pk
+
+    def serialize(self):
+        return {
+            'revision': self.revision,
+            'entity_type': self.entity_type,
+            'name': self.entity_name,
+            'action': self.action,
+            'details': self.details,
+            'source': self.source,
+            'created_at': self.created_at.isoformat(),
+        }
+
+    def __str__(self):
+        return f'{self.revision}: {self.entity_type} {self.entity_name} {self.action}'
+
+
+class ChangeLogState(models.Model):
+    """
+    Key-value bookkeeping of the change log.
+
+    Holds the last observed users and user groups, which new observations are
+    compared against, and the revision the log has been compacted through.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    value = models.JSONField(default=None, null=True)
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,406 @@
+"""
+This module contains the ChangeRecorder class for keeping the revisioned change log.
+"""
+
+import threading
+from datetime import datetime
+
+from django.db import DatabaseError, transaction
+from django.db.models import Max
+
+from config.settings.base import CHANGE_LOG_MAX_ENTRIES
+from .models import ChangeLogEntry, ChangeLogState
+
+USERS_BASELINE_KEY = 'users'
+USERGROUPS_BASELINE_KEY = 'usergroups'
+COMPACTED_THROUGH_KEY = 'compacted_through'
+
+
+# Seconds two password_last_set values may differ by and still be the same, since some
+# backends derive them from the password age
+PASSWORD_LAST_SET_TOLERANCE = 2
+
+
+def users_baseline(users):
+    """
+    Builds the JSON-serializable baseline of the given users.
+
+    Args:
+        users (list): A list of User objects.
+
+    Returns:
+        dict: The users keyed by name with their SID, enabled flag, description and password_last_set.
+    """
+    return {
+        user.username: {
+            'sid': user.sid,
+            'enabled': user.enabled,
+            'description': user.description,
+            'password_last_set': user.password_last_set,
+        }
+        for user in users
+    }
+
+
+def upgrade_users_baseline(baseline):
+    """
+    Converts a baseline of the sorted usernames kept by older versions to the current format.
+    """
+    if isinstance(baseline, list):
+        return {name: {} for name in baseline}
+    return baseline
+
+
+def password_changed(old, new):
+    """
+    Returns whether two password_last_set values differ, ignoring unknown ones.
+    """
+    if old is None or new is None:
+        return False
+    try:
+        difference = datetime.fromisoformat(new) - datetime.fromisoformat(old)
+    except (TypeError, ValueError):
+        return old != new
+    return abs(difference.total_seconds()) > PASSWORD_LAST_SET_TOLERANCE
+
+
+def diff_users(old_users, new_users):
+    """
+    Computes the changes between two user baselines.
+
+    Users are identified by their SID where known, so a renamed user is reported as
+    renamed, and a user deleted and created again with the same name as deleted and
+    created. Unknown attributes are never reported as changed.
+
+    Args:
+        old_users (dict): The previously known users, keyed by name.
+        new_users (dict): The currently known users, keyed by name.
+
+    Returns:
+        list: A list of (entity_name, action, details) tuples.
+    """
+    old_users = upgrade_users_baseline(old_users)
+    matches = {}
+    for name in sorted(new_users.keys() & old_users.keys()):
+        old_sid, new_sid = old_users[name].get('sid'), new_users[name].get('sid')
+        if old_sid is None or new_sid is None or old_sid == new_sid:
+            matches[name] = name
+
+    old_names_by_sid = {
+        attributes['sid']: name for name, attributes in old_users.items()
+        if attributes.get('sid') and name not in matches.values()
+    }
+    changes, created = [], []
+    for name in sorted(new_users.keys() - matches.keys()):
+        old_name = old_names_by_sid.pop(new_users[name].get('sid'), None)
+        if old_name is not None:
+            matches[name] = old_name
+            changes.append((old_name, 'renamed', {'new_name': name}))
+        else:
+            created.append((name, 'created', {}))
+    changes += [(name, 'deleted', {}) for name in sorted(old_users.keys() - set(matches.values()))]
+    changes += created
+
+    for name in sorted(matches):
+        old, new = old_users[matches[name]], new_users[name]
+        if None not in (old.get('enabled'), new.get('enabled')) and old['enabled'] != new['enabled']:
+            changes.append((name, 'enabled' if new['enabled'] else 'disabled', {}))
+        if None not in (old.get('description'), new.get('description')) and old['description'] != new['description']:
+            changes.append((name, 'updated', {'description': new['description']}))
+        if password_changed(old.get('password_last_set'), new.get('password_last_set')):
+            changes.append((name, 'password_changed', {}))
+    return changes
+
+
+def diff_usergroups(old_usergroups, new_usergroups):
+    """
+    Computes the changes between two user group baselines.
+
+    Args:
+        old_usergroups (dict): The previously known user groups, keyed by name.
+        new_usergroups (dict): The currently known user groups, keyed by name.
+
+    Returns:
+        list: A list of (entity_name, action, details) tuples.
+    """
+    changes = []
+    for name in sorted(new_usergroups.keys() - old_usergroups.keys()):
+        changes.append((name, 'created', new_usergroups[name]))
+    for name in sorted(old_usergroups.keys() - new_usergroups.keys()):
+        changes.append((name, 'deleted', {}))
+    for name in sorted(old_usergroups.keys() & new_usergroups.keys()):
+        old, new = old_usergroups[name], new_usergroups[name]
+        if old['description'] != new['description']:
+            changes.append((name, 'updated', {'description': new['description']}))
+        old_members, new_members = set(old['users']), set(new['users'])
+        changes += [(name, 'member_added', {'member': member}) for member in sorted(new_members - old_members)]
+        changes += [(name, 'member_removed', {'member': member}) for member in sorted(old_members - new_members)]
+    return changes
+
+
+def usergroups_baseline(usergroups):
+    """
+    Builds the JSON-serializable baseline of the given user groups.
+
+    Args:
+        usergroups (list): A list of Usergroup objects.
+
+    Returns:
+        dict: The user groups keyed by name with their description and sorted member names.
+    """
+    return {
+        usergroup.name: {
+            'description': usergroup.description,
+            'users': sorted(user.username for user in usergroup.users),
+        }
+        for usergroup in usergroups
+    }
+
+
+class ChangeRecorder:
+    """
+    Records performed and observed changes to local users and user groups.
+
+    Performed changes are the ones made through this server's API. Observed
+    changes are found by comparing listings of the local state with the last
+    observed baseline, which performed changes are applied to as well, so that
+    the same change is never recorded twice.
+
+    Attributes:
+        max_entries (int): The number of most recent entries kept by compaction.
+        compact_every (int): The number of recorded entries between compactions.
+    """
+    def __init__(self, max_entries, compact_every=100):
+        self.max_entries = max_entries
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._new_entries = threading.Condition()
+        self._signal = 0
+        self._recorded_since_compaction = 0
+
+    def record(self, entity_type, action, entity_name, **details):
+        """
+        Records a change performed through the API.
+
+        Errors are printed instead of raised, so a broken change log never fails
+        the operation that has already been performed.
+
+        Args:
+            entity_type (str): Either ChangeLogEntry.USER or ChangeLogEntry.USERGROUP.
+            action (str): The performed action, e.g. 'created' or 'member_added'.
+            entity_name (str): The name of the changed user or user group.
+            **details: Action specific details, e.g. new_name or member.
+
+        Returns:
+            ChangeLogEntry: The recorded entry or None if recording failed.
+        """
+        try:
+            with self._lock, transaction.atomic():
+                entry = ChangeLogEntry.objects.create(
+                    entity_type=entity_type,
+                    entity_name=entity_name,
+                    action=action,
+                    details=details,
+                    source=ChangeLogEntry.PERFORMED
+                )
+                self._apply_to_baseline(entry)
+        except DatabaseError as exc:
+            print(f"Error recording a change: {str(exc)}")
+            return None
+
+        self._entries_recorded(1)
+        return entry
+
+    def observe_users(self, users):
+        """
+        Records the differences between the given users and the last observed ones.
+
+        The first observation only seeds the baseline.
+
+        Args:
+            users (list): A list of User objects representing all local users.
+
+        Returns:
+            list: The recorded ChangeLogEntry objects.
+        """
+        return self._observe(
+            ChangeLogEntry.USER,
+            USERS_BASELINE_KEY,
+            users_baseline(users),
+            diff_users
+        )
+
+    def observe_usergroups(self, usergroups):
+        """
+        Records the differences between the given user groups and the last observed ones.
+
+        The first observation only seeds the baseline.
+
+        Args:
+            usergroups (list): A list of Usergroup objects representing all local user groups.
+
+        Returns:
+            list: The recorded ChangeLogEntry objects.
+        """
+        return self._observe(
+            ChangeLogEntry.USERGROUP,
+            USERGROUPS_BASELINE_KEY,
+            usergroups_baseline(usergroups),
+            diff_usergroups
+        )
+
+    def change_signal(self):
+        """
+        Returns a counter incremented every time this process records new entries.
+        """
+        with self._new_entries:
+            return self._signal
+
+    def wait_for_changes(self, signal, timeout):
+        """
+        Blocks until this process records new entries after the given signal or the timeout expires.
+
+        Entries recorded by other processes are not signalled, so callers should
+        check for new entries after a timeout as well.
+
+        Args:
+            signal (int): The value of change_signal() taken before the last check for new entries.
+            timeout (float): The maximum number of seconds to wait.
+
+        Returns:
+            bool: True if new entries were recorded, False if the timeout expired.
+        """
+        with self._new_entries:
+            return self._new_entries.wait_for(lambda: self._signal != signal, timeout)
+
+    def changes_since(self, revision, limit):
+        """
+        Retrieves the entries recorded after the given revision.
+
+        Args:
+            revision (int): The last revision known to the caller.
+            limit (int): The maximum number of entries to return.
+
+        Returns:
+            tuple: A list of ChangeLogEntry objects and whether more entries are available.
+        """
+        entries = list(ChangeLogEntry.objects.filter(pk__gt=revision).order_by('pk')[:limit + 1])
+        return entries[:limit], len(entries) > limit
+
+    def current_revision(self):
+        """
+        Returns the revision of the latest recorded change or 0 if nothing was recorded yet.
+        """
+        latest = ChangeLogEntry.objects.aggregate(latest=Max('pk'))['latest']
+        return max(latest or 0, self.compacted_through())
+
+    def compacted_through(self):
+        """
+        Returns the revision up to which entries were removed by compaction.
+        """
+        return self._get_state(COMPACTED_THROUGH_KEY) or 0
+
+    def compact(self):
+        """
+        Removes all but the most recent max_entries entries.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        with self._lock, transaction.atomic():
+            latest = ChangeLogEntry.objects.aggregate(latest=Max('pk'))['latest'] or 0
+            threshold = latest - self.max_entries
+            if threshold <= self.compacted_through():
+                return 0
+            removed, _ = ChangeLogEntry.objects.filter(pk__lte=threshold).delete()
+            self._set_state(COMPACTED_THROUGH_KEY, threshold)
+        return removed
+
+    def _observe(self, entity_type, baseline_key, current, diff):
+        try:
+            with self._lock, transaction.atomic():
+                baseline = self._get_state(baseline_key)
+                self._set_state(baseline_key, current)
+                if baseline is None:
+                    return []
+                entries = [
+                    ChangeLogEntry.objects.create(
+                        entity_type=entity_type,
+                        entity_name=name,
+                        action=action,
+                        details=details,
+                        source=ChangeLogEntry.OBSERVED
+                    )
+                    for name, action, details in diff(baseline, current)
+                ]
+        except DatabaseError as exc:
+            print(f"Error observing changes: {str(exc)}")
+            return []
+
+        self._entries_recorded(len(entries))
+        return entries
+
+    def _apply_to_baseline(self, entry):
+        if entry.entity_type == ChangeLogEntry.USER:
+            users = self._get_state(USERS_BASELINE_KEY)
+            if users is None:
+                return
+            users = upgrade_users_baseline(users)
+            name = entry.entity_name
+            if entry.action == 'created':
+                users.setdefault(name, {})
+            elif entry.action == 'deleted':
+                users.pop(name, None)
+            elif entry.action == 'renamed' and name in users:
+                users[entry.details['new_name']] = users.pop(name)
+            elif entry.action in ('enabled', 'disabled') and name in users:
+                users[name]['enabled'] = entry.action == 'enabled'
+            elif entry.action == 'password_changed' and name in users:
+                users[name]['password_last_set'] = None
+            self._set_state(USERS_BASELINE_KEY, users)
+            return
+
+        usergroups = self._get_state(USERGROUPS_BASELINE_KEY)
+        if usergroups is None:
+            return
+        name = entry.entity_name
+        if entry.action == 'created':
+            usergroups[name] = {
+                'description': entry.details.get('description'),
+                'users': sorted(entry.details.get('users') or []),
+            }
+        elif entry.action == 'deleted':
+            usergroups.pop(name, None)
+        elif entry.action == 'renamed' and name in usergroups:
+            usergroups[entry.details['new_name']] = usergroups.pop(name)
+        elif entry.action == 'member_added' and name in usergroups:
+            usergroups[name]['users'] = sorted(set(usergroups[name]['users']) | {entry.details['member']})
+        elif entry.action == 'member_removed' and name in usergroups:
+            usergroups[name]['users'] = [
+                member for member in usergroups[name]['users'] if member != entry.details['member']
+            ]
+        self._set_state(USERGROUPS_BASELINE_KEY, usergroups)
+
+    def _entries_recorded(self, count):
+        if count:
+            with self._new_entries:
+                self._signal += 1
+                self._new_entries.notify_all()
+        self._recorded_since_compaction += count
+        if self._recorded_since_compaction < self.compact_every:
+            return
+        self._recorded_since_compaction = 0
+        try:
+            self.compact()
+        except DatabaseError as exc:
+            print(f"Error compacting the change log: {str(exc)}")
+
+    def _get_state(self, key):
+        state = ChangeLogState.objects.filter(key=key).first()
+        return state.value if state else None
+
+    def _set_state(self, key, value):
+        ChangeLogState.objects.update_or_create(key=key, defaults={'value': value})
+
+
+change_recorder = ChangeRecorder(CHANGE_LOG_MAX_ENTRIES)
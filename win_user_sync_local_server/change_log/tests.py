@@ -0,0 +1,83 @@
+import json
+from unittest import mock
+
+from django.test import RequestFactory, TestCase
+
+from config.settings.base import PRINCIPAL_ROLE_NAME
+from . import views
+from .models import ChangeLogEntry
+from .recorder import ChangeRecorder
+
+
+class ChangesViewTests(TestCase):
+    """
+    Pages through the change log the way a client following the revisions does.
+    """
+    def setUp(self):
+        self.recorder = ChangeRecorder(max_entries=3)
+        patcher = mock.patch.object(views, 'change_recorder', self.recorder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_changes(self, since, limit=2):
+        request = RequestFactory().get('/changes/', {'since': since, 'limit': limit})
+        request.roles = [PRINCIPAL_ROLE_NAME]
+        response = views.get_changes(request)
+        return response.status_code, json.loads(response.content)
+
+    def record(self, *names):
+        for name in names:
+            self.recorder.record(ChangeLogEntry.USER, 'created', name)
+
+    def follow(self, since):
+        names = []
+        while True:
+            status, body = self.get_changes(since)
+            self.assertEqual(status, 200)
+            names += [change['name'] for change in body['changes']]
+            since = body['revision']
+            if not body['has_more']:
+                return names, since
+
+    def test_pages_continue_from_the_last_returned_entry(self):
+        self.record('alice', 'bob', 'carol')
+
+        names, revision = self.follow(0)
+
+        self.assertEqual(names, ['alice', 'bob', 'carol'])
+        self.assertEqual(revision, self.recorder.current_revision())
+
+    def test_change_recorded_during_the_query_is_not_skipped(self):
+        self.record('alice')
+        changes_since = self.recorder.changes_since
+
+        def record_meanwhile(revision, limit):
+            result = changes_since(revision, limit)
+            self.record('bob')
+            return result
+
+        with mock.patch.object(self.recorder, 'changes_since', record_meanwhile):
+            names, revision = self.follow(0)
+
+        self.assertEqual(names, ['alice'])
+        self.assertEqual(self.follow(revision)[0], ['bob'])
+
+    def test_empty_page_keeps_the_revision(self):
+        self.record('alice')
+        revision = self.recorder.current_revision()
+
+        status, body = self.get_changes(revision)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['changes'], [])
+        self.assertEqual(body['revision'], revision)
+
+    def test_compacted_revision_requires_a_resync(self):
+        self.record('alice', 'bob', 'carol', 'dave', 'erin')
+        self.assertEqual(self.recorder.compact(), 2)
+
+        status, body = self.get_changes(1)
+
+        self.assertEqual(status, 410)
+        self.assertEqual(body['revision'], self.recorder.current_revision())
+        self.assertEqual(self.follow(self.recorder.compacted_through())[0], ['carol', 'dave', 'erin'])
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('changes/', views.get_changes, name='get_changes'),
+    path('watch/', views.watch_changes, name='watch_changes'),
+]
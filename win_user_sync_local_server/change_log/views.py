@@ -0,0 +1,128 @@
+"""
+This module contains views for reading the change log.
+"""
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django_keycloak_auth.decorators import keycloak_roles
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from config.settings.base import (
+    PRINCIPAL_ROLE_NAME,
+    WATCH_HEARTBEAT_INTERVAL,
+    WATCH_MAX_DURATION
+)
+from .events import stream_changes
+from .recorder import change_recorder
+
+DEFAULT_CHANGES_LIMIT = 1000
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Lets content negotiation accept 'text/event-stream', the stream itself is produced by the view.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET'])
+def get_changes(request):
+    """
+    API endpoint to retrieve the changes recorded after a given revision.
+
+    URL parameters: 'since' (defaults to 0) and 'limit' (defaults to 1000).
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: A JSON response containing the changes and the revision to continue from,
+        or 410 if the requested revision was already compacted and a full resync is required.
+    """
+    try:
+        since = int(request.GET.get('since', 0))
+        limit = int(request.GET.get('limit', DEFAULT_CHANGES_LIMIT))
+    except ValueError:
+        return JsonResponse(
+            {"error": "Invalid since or limit parameter"},
+            status=400,
+            content_type='application/json'
+        )
+
+    if since < 0 or limit <= 0:
+        return JsonResponse(
+            {"error": "Parameters since and limit should be positive"},
+            status=400,
+            content_type='application/json'
+        )
+
+    try:
+        if since < change_recorder.compacted_through():
+            return JsonResponse(
+                {
+                    "error": f"Changes since revision {since} were compacted, a full resync is required",
+                    "revision": change_recorder.current_revision()
+                },
+                status=410,
+                content_type='application/json'
+            )
+        # Read before the query, so that a change recorded in between isn't skipped by the returned revision
+        current_revision = change_recorder.current_revision()
+        entries, has_more = change_recorder.changes_since(since, limit)
+        revision = entries[-1].revision if entries else max(since, current_revision)
+    except Exception as exc:
+        return JsonResponse(
+            {"error": f"Error retrieving changes: {str(exc)}"},
+            status=500,
+            content_type='application/json'
+        )
+
+    return JsonResponse(
+        {
+            'since': since,
+            'revision': revision,
+            'has_more': has_more,
+            'changes': [entry.serialize() for entry in entries]
+        },
+        content_type='application/json'
+    )
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET'])
+@renderer_classes([EventStreamRenderer, JSONRenderer])
+def watch_changes(request):
+    """
+    API endpoint to stream changes as Server-Sent Events.
+
+    Resumes after the revision in the 'Last-Event-ID' header or the 'since' URL parameter,
+    otherwise streams changes recorded from now on.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        StreamingHttpResponse: A 'text/event-stream' response.
+    """
+    last_event_id = request.headers.get('Last-Event-ID', request.GET.get('since'))
+    try:
+        last_revision = int(last_event_id) if last_event_id is not None else None
+    except ValueError:
+        return JsonResponse(
+            {"error": "Invalid Last-Event-ID header or since parameter"},
+            status=400,
+            content_type='application/json'
+        )
+
+    response = StreamingHttpResponse(
+        stream_changes(last_revision, WATCH_HEARTBEAT_INTERVAL, WATCH_MAX_DURATION),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ChangeMonitorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'win_user_sync_local_server.change_monitor'
+
+    def ready(self):
+        from config.settings.base import MONITOR_COORDINATOR, MONITOR_LEADER_ELECTION
+        from .leader import is_serving
+
+        # Every serving worker takes part in the election of the worker running the monitor
+        serving = is_serving() if MONITOR_COORDINATOR == 'auto' else MONITOR_COORDINATOR == 'true'
+        if MONITOR_LEADER_ELECTION and serving:
+            from .views import monitor_coordinator
+            monitor_coordinator.ensure_started()
@@ -0,0 +1,58 @@
+"""
+This module contains the Blacklist class matching names against a client blacklist.
+"""
+
+import fnmatch
+import re
+from functools import lru_cache
+
+
+class Blacklist:
+    """
+    A blacklist compiled for constant-time lookups.
+
+    Names are compared case-insensitively, like Windows does. Entries containing '*' or '?'
+    are wildcard patterns if enabled, which Windows account names can't contain otherwise.
+    All patterns are combined into a single regular expression.
+
+    Attributes:
+        names (frozenset): The casefolded names without wildcards.
+        pattern (re.Pattern): The combined wildcard patterns or None if there are none.
+    """
+    def __init__(self, entries, wildcards=True):
+        names, patterns = set(), []
+        for entry in entries:
+            entry = str(entry).casefold()
+            if wildcards and ('*' in entry or '?' in entry):
+                patterns.append(fnmatch.translate(entry))
+            else:
+                names.add(entry)
+        self.names = frozenset(names)
+        self.pattern = re.compile('|'.join(patterns)) if patterns else None
+
+    def __contains__(self, name):
+        if name is None:
+            return False
+        name = name.casefold()
+        return name in self.names or (self.pattern is not None and self.pattern.match(name) is not None)
+
+
+@lru_cache(maxsize=16)
+def _compiled(entries, wildcards):
+    return Blacklist(entries, wildcards)
+
+
+def compile_blacklist(entries, wildcards=True):
+    """
+    Compiles the entries of a blacklist, reusing the compiled blacklist while the entries don't change.
+
+    Args:
+        entries (iterable): Names and, if wildcards is True, wildcard patterns.
+        wildcards (bool): Whether entries containing '*' or '?' are patterns.
+
+    Returns:
+        Blacklist: The compiled blacklist.
+    """
+    if isinstance(entries, Blacklist):
+        return entries
+    return _compiled(tuple(entries), wildcards)
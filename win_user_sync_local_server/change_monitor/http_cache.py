@@ -0,0 +1,127 @@
+"""
+This module contains the HttpCache class caching GET responses of the remote service.
+
+Responses are kept in the database, so they survive restarts. A response is reused without
+a request while fresh according to its Cache-Control max-age, and revalidated with
+If-None-Match and If-Modified-Since afterwards, so an unchanged payload costs a 304 response
+instead of a download. Responses with no-store are never kept, and ones with no-cache or
+without max-age are revalidated every time.
+"""
+
+import re
+from datetime import timedelta
+
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .models import HttpCacheEntry
+from ..diagnostics.tracing import traced_request
+
+MAX_AGE_PATTERN = re.compile(r'(?:^|,)\s*(?:s-maxage|max-age)\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+
+def cache_directives(header):
+    """
+    Parses a Cache-Control header.
+
+    Args:
+        header (str): The header value or None.
+
+    Returns:
+        tuple: Whether the response may be stored and the number of seconds it stays fresh for.
+    """
+    header = (header or '').lower()
+    directives = {directive.split('=')[0].strip() for directive in header.split(',')}
+    if 'no-store' in directives:
+        return False, 0
+    if 'no-cache' in directives:
+        return True, 0
+    match = MAX_AGE_PATTERN.search(header)
+    return True, int(match.group(1)) if match else 0
+
+
+class HttpCache:
+    """
+    Sends GET requests through a cache of validated responses.
+
+    Attributes:
+        enabled (bool): Whether responses are cached at all.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+
+    def get(self, url, headers=None):
+        """
+        Sends a GET request, answering it from the cache when possible.
+
+        Args:
+            url (str): The URL.
+            headers (dict, optional): The request headers.
+
+        Returns:
+            str: The response body.
+
+        Raises:
+            requests.exceptions.RequestException: If the request fails.
+        """
+        if not self.enabled:
+            response = traced_request('GET', url, headers=headers)
+            response.raise_for_status()
+            return response.text
+
+        entry = self._lookup(url)
+        now = timezone.now()
+        if entry is not None and entry.fresh_until > now:
+            return entry.body
+
+        headers = dict(headers or {})
+        if entry is not None and entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry is not None and entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        response = traced_request('GET', url, headers=headers)
+
+        if response.status_code == 304 and entry is not None:
+            storable, max_age = cache_directives(response.headers.get('Cache-Control'))
+            if storable:
+                self._store(url, entry.body, entry.etag, entry.last_modified, max_age)
+            return entry.body
+
+        response.raise_for_status()
+        storable, max_age = cache_directives(response.headers.get('Cache-Control'))
+        etag, last_modified = response.headers.get('ETag', ''), response.headers.get('Last-Modified', '')
+        if storable and (etag or last_modified or max_age):
+            self._store(url, response.text, etag, last_modified, max_age)
+        elif entry is not None:
+            self._delete(url)
+        return response.text
+
+    def clear(self):
+        """
+        Removes all cached responses.
+        """
+        HttpCacheEntry.objects.all().delete()
+
+    def _lookup(self, url):
+        try:
+            return HttpCacheEntry.objects.filter(url=url).first()
+        except DatabaseError as exc:
+            print(f"Error reading the HTTP cache: {str(exc)}")
+            return None
+
+    def _store(self, url, body, etag, last_modified, max_age):
+        try:
+            HttpCacheEntry.objects.update_or_create(url=url, defaults={
+                'body': body,
+                'etag': etag,
+                'last_modified': last_modified,
+                'fresh_until': timezone.now() + timedelta(seconds=max_age),
+            })
+        except DatabaseError as exc:
+            print(f"Error writing the HTTP cache: {str(exc)}")
+
+    def _delete(self, url):
+        try:
+            HttpCacheEntry.objects.filter(url=url).delete()
+        except DatabaseError as exc:
+            print(f"Error writing the HTTP cache: {str(exc)}")
@@ -0,0 +1,231 @@
+"""
+This module contains classes letting exactly one worker process run the monitor.
+
+Every worker runs a MonitorCoordinator thread. The start and stop endpoints only record the
+desired state of the monitor in the database, whichever worker receives them. Coordinators
+of all workers compete for a lease row while the monitor should run: the one holding it
+runs the monitor and renews the lease on every heartbeat, the others keep their monitors
+stopped. If the leader dies, its lease expires and the next heartbeat of another worker
+takes it over. A leader that can't reach the database stops its monitor once its lease
+would have expired. Pokes are recorded the same way and run by the leader on its next heartbeat,
+which also reports the state of its monitor to the database for the status endpoint.
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+from django.db import DatabaseError, IntegrityError, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import MonitorControl, MonitorLease
+
+MONITOR_NAME = 'monitor'
+# WSGI and ASGI servers whose processes serve requests
+SERVER_PROGRAMS = ('gunicorn', 'uvicorn', 'daphne', 'hypercorn', 'waitress-serve', 'uwsgi')
+
+
+def worker_id():
+    """
+    Returns an identifier unique to this process.
+    """
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def is_serving():
+    """
+    Returns whether this process serves requests: runserver, except for its autoreloader parent,
+    or one of SERVER_PROGRAMS. Tests, scripts and other management commands don't.
+    """
+    if not sys.argv or not sys.argv[0]:
+        return False
+    path, program = os.path.split(sys.argv[0])
+    # Started with python -m
+    if program == '__main__.py':
+        program = os.path.basename(path)
+    program = os.path.splitext(program)[0].lower()
+    if program in SERVER_PROGRAMS:
+        return True
+    if program not in ('manage', 'django-admin') or len(sys.argv) < 2 or sys.argv[1] != 'runserver':
+        return False
+    return '--noreload' in sys.argv or os.environ.get('RUN_MAIN') == 'true'
+
+
+class LeaseElection:
+    """
+    Elects a leader by holding a lease row, taken over by others once it expires.
+
+    Attributes:
+        name (str): The name of the lease.
+        holder (str): The identifier of this worker.
+        lease_seconds (float): The number of seconds a lease lasts without renewal.
+        renewed_at (float): The time.monotonic() before the last successful renewal.
+    """
+    def __init__(self, name, holder, lease_seconds):
+        self.name = name
+        self.holder = holder
+        self.lease_seconds = lease_seconds
+        self.held = False
+        self.renewed_at = 0.0
+
+    def expired(self):
+        """
+        Returns whether the lease may have been taken over, since it wasn't renewed for its whole duration.
+        """
+        return time.monotonic() - self.renewed_at > self.lease_seconds
+
+    def try_acquire(self):
+        """
+        Takes the lease if it is free or expired, or renews it if this worker holds it.
+
+        Returns:
+            bool: Whether this worker holds the lease.
+        """
+        attempted_at = time.monotonic()
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        # Single statements only: SQLite fails transactions upgrading from reading to writing when contended
+        acquired = MonitorLease.objects.filter(name=self.name).filter(
+            Q(holder=self.holder) | Q(expires_at__lt=now)
+        ).update(holder=self.holder, expires_at=expires_at)
+        if not acquired:
+            try:
+                MonitorLease.objects.create(name=self.name, holder=self.holder, expires_at=expires_at)
+                acquired = True
+            except IntegrityError:
+                acquired = False
+        self.held = bool(acquired)
+        if self.held:
+            self.renewed_at = attempted_at
+        return self.held
+
+    def release(self):
+        """
+        Gives the lease up if this worker holds it.
+        """
+        if self.held:
+            MonitorLease.objects.filter(name=self.name, holder=self.holder).update(holder='', expires_at=timezone.now())
+            self.held = False
+
+    def leader(self):
+        """
+        Returns the holder of the unexpired lease or None.
+        """
+        lease = MonitorLease.objects.filter(name=self.name, expires_at__gte=timezone.now()).first()
+        return lease.holder if lease is not None and lease.holder else None
+
+
+class MonitorCoordinator:
+    """
+    Runs the monitor of this worker while it holds the monitor lease and the monitor should run.
+
+    Attributes:
+        monitor (Monitor): The monitor of this worker.
+        election (LeaseElection): The election of the worker running the monitor.
+        heartbeat (float): The number of seconds between lease renewals.
+    """
+    def __init__(self, monitor, election, heartbeat):
+        self.monitor = monitor
+        self.election = election
+        self.heartbeat = heartbeat
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._poked_at = None
+
+    def ensure_started(self):
+        """
+        Starts the heartbeat thread unless it's running already.
+        """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='monitor-coordinator', daemon=True)
+                self._thread.start()
+
+    def request_start(self, interval, min_interval=None, max_interval=None):
+        """
+        Records that the monitor should run once in interval seconds, on whichever worker leads.
+        The interval adapts between min_interval and max_interval if both are given.
+        """
+        self._set_control(running=True, interval=interval, min_interval=min_interval, max_interval=max_interval)
+
+    def request_stop(self):
+        """
+        Records that the monitor should be stopped. The leader stops it on its next heartbeat.
+        """
+        self._set_control(running=False)
+
+    def request_poke(self):
+        """
+        Records that the monitor should run a cycle right away. The leader runs it on its next heartbeat.
+
+        Returns:
+            bool: False if the monitor shouldn't be running.
+        """
+        poked = MonitorControl.objects.filter(name=MONITOR_NAME, running=True).update(poked_at=timezone.now())
+        self._wake.set()
+        return bool(poked)
+
+    def status(self):
+        """
+        Returns the state of the monitor as last reported by the leader, and the leader.
+        """
+        control = MonitorControl.objects.filter(name=MONITOR_NAME).first()
+        status = {'running': False} if control is None else {**control.status, 'running': control.running}
+        status['leader'] = self.election.leader()
+        return status
+
+    def tick(self):
+        """
+        Renews or takes the lease if the monitor should run and starts or stops the local monitor accordingly.
+        The leader also runs requested pokes and reports the state of its monitor.
+        """
+        control = MonitorControl.objects.filter(name=MONITOR_NAME).first()
+        if control is not None and control.running and self.election.try_acquire():
+            configured = (control.interval, control.min_interval, control.max_interval)
+            if not self.monitor.is_running or self.monitor.configured != configured:
+                self.monitor.stop_interval_monitor()
+                self.monitor.start_interval_monitor(*configured)
+                self._poked_at = control.poked_at
+            elif control.poked_at != self._poked_at:
+                self._poked_at = control.poked_at
+                self.monitor.poke()
+            self._report_status()
+            return
+
+        if self.monitor.is_running:
+            self.monitor.stop_interval_monitor()
+        if control is None or not control.running:
+            if self.election.held:
+                self._report_status()
+            self.election.release()
+
+    def _report_status(self):
+        MonitorControl.objects.filter(name=MONITOR_NAME).update(status=self.monitor.status())
+
+    def _set_control(self, **fields):
+        if not MonitorControl.objects.filter(name=MONITOR_NAME).update(updated_at=timezone.now(), **fields):
+            try:
+                MonitorControl.objects.create(name=MONITOR_NAME, **fields)
+            except IntegrityError:
+                MonitorControl.objects.filter(name=MONITOR_NAME).update(updated_at=timezone.now(), **fields)
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            close_old_connections()
+            try:
+                self.tick()
+            except DatabaseError as exc:
+                print(f"Error coordinating the monitor: {str(exc)}")
+                # Another worker may have taken the lease over by now, so stop rather than run the monitor twice
+                if self.monitor.is_running and self.election.expired():
+                    self.monitor.stop_interval_monitor()
+                    self.election.held = False
+            self._wake.wait(self.heartbeat)
+            self._wake.clear()
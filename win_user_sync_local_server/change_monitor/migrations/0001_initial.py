@@ -0,0 +1,35 @@
+# Generated by Django 5.0.7 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefreshToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=2560)),
+                ('expires_in', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sync_id', models.CharField(max_length=64)),
+                ('index', models.IntegerField()),
+                ('acked_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('sync_id', 'index')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.7 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('change_monitor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HttpCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.CharField(max_length=2048, unique=True)),
+                ('body', models.TextField()),
+                ('etag', models.CharField(blank=True, max_length=512)),
+                ('last_modified', models.CharField(blank=True, max_length=64)),
+                ('fresh_until', models.DateTimeField()),
+            ],
+        ),
+    ]
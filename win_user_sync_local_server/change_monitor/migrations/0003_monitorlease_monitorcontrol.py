@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('change_monitor', '0002_httpcacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonitorControl',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('running', models.BooleanField(default=False)),
+                ('interval', models.IntegerField(default=3600)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MonitorLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('holder', models.CharField(blank=True, max_length=256)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.7 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('change_monitor', '0003_monitorlease_monitorcontrol'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='monitorcontrol',
+            name='max_interval',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='monitorcontrol',
+            name='min_interval',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='monitorcontrol',
+            name='poked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='monitorcontrol',
+            name='status',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
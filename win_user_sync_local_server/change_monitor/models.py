@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class RefreshToken(models.Model):
@@ -6,13 +7,61 @@ class RefreshToken(models.Model):
     expires_in = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def get_valid():
-        refresh_token = RefreshToken.objects.latest('created_at')
-        # Check if token is expired
-        if refresh_token.created_at + timezone.timedelta(seconds=refresh_token.expires_in) < timezone.now():
-            refresh_token = token_obtainer.get_refresh_token()
+    @staticmethod
+    def get_valid(token_obtainer):
+        refresh_token = RefreshToken.objects.order_by('-created_at').first()
+        # Obtain a new token if there is none or it is expired
+        if refresh_token is None or refresh_token.created_at + timezone.timedelta(seconds=refresh_token.expires_in) < timezone.now():
+            return token_obtainer.get_refresh_token()
+        return refresh_token.token
 
     def __str__(self):
         return self.token
 
 
+
+
+class SyncChunk(models.Model):
+    sync_id = models.CharField(max_length=64)
+    index = models.IntegerField()
+    acked_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('sync_id', 'index')
+
+    def __str__(self):
+        return f'{self.sync_id}-{self.index}'
+
+
+class HttpCacheEntry(models.Model):
+    url = models.CharField(max_length=2048, unique=True)
+    body = models.TextField()
+    etag = models.CharField(max_length=512, blank=True)
+    last_modified = models.CharField(max_length=64, blank=True)
+    fresh_until = models.DateTimeField()
+
+    def __str__(self):
+        return self.url
+
+
+class MonitorLease(models.Model):
+    name = models.CharField(max_length=64, unique=True)
+    holder = models.CharField(max_length=256, blank=True)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.name} held by {self.holder or "nobody"}'
+
+
+class MonitorControl(models.Model):
+    name = models.CharField(max_length=64, unique=True)
+    running = models.BooleanField(default=False)
+    interval = models.IntegerField(default=3600)
+    min_interval = models.IntegerField(null=True, blank=True)
+    max_interval = models.IntegerField(null=True, blank=True)
+    poked_at = models.DateTimeField(null=True, blank=True)
+    status = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} {"running" if self.running else "stopped"} every {self.interval}s'
@@ -3,23 +3,36 @@ This module contains the Monitor class for monitoring user and group changes.
 """
 
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 from config.settings.base import (
-    get_powershell_path,
     SERVER_NAME,
     REMOTE_SERVICE_OAUTH2_TOKEN_URL,
     REMOTE_SERVICE_OAUTH2_CLIENT_ID,
     REMOTE_SERVICE_OAUTH2_CLIENT_SECRET,
     REMOTE_SERVICE_OAUTH2_USERNAME,
-    REMOTE_SERVICE_OAUTH2_PASSWORD
+    REMOTE_SERVICE_OAUTH2_PASSWORD,
+    SYNC_CHUNK_MAX_BYTES,
+    SYNC_CHUNK_RETENTION,
+    SYNC_COMPRESS_CHUNKS,
+    REMOTE_HTTP_CACHE_ENABLED
 )
+from .blacklist import compile_blacklist
+from .http_cache import HttpCache
 from .models import RefreshToken
 from .service_requests import RemoteServiceClient
+from .sync import DeltaUploader, SyncDelta
 from .tokens import TokenObtainer
-from ..user_groups.usergroups_scripts import UsergroupRetriever
-from ..users.views import user_retriever
+from ..change_log.models import ChangeLogEntry
+from ..change_log.recorder import change_recorder
+from ..diagnostics.context import bind_context
+from ..diagnostics.profiling import monitor_profiler
+from ..diagnostics.tracing import tracer
+from ..state.digest import usergroups_digest, users_digest
+from ..state.shared import local_snapshot
 
-usergroup_retriever = UsergroupRetriever(get_powershell_path())
 token_obtainer = TokenObtainer(
     REMOTE_SERVICE_OAUTH2_TOKEN_URL,
     REMOTE_SERVICE_OAUTH2_CLIENT_ID,
@@ -27,11 +40,32 @@ token_obtainer = TokenObtainer(
     REMOTE_SERVICE_OAUTH2_USERNAME,
     REMOTE_SERVICE_OAUTH2_PASSWORD
 )
+delta_uploader = DeltaUploader(SYNC_CHUNK_MAX_BYTES, SYNC_COMPRESS_CHUNKS, SYNC_CHUNK_RETENTION)
+http_cache = HttpCache(REMOTE_HTTP_CACHE_ENABLED)
+
+
+def entry_name(entry):
+    """Return the name of a user or a user group."""
+    return getattr(entry, 'username', None) or getattr(entry, 'name', None)
 
 
 def filter_by_blacklist(original, blacklist):
-    """Filter out blacklisted entries from the original list."""
-    return [entry for entry in original if entry not in blacklist]
+    """Filter out blacklisted entries from the original list, looking every name up in the compiled blacklist."""
+    blacklist = compile_blacklist(blacklist)
+    return [entry for entry in original if entry_name(entry) not in blacklist]
+
+
+# User changes the username digests don't cover
+USER_UPDATE_ACTIONS = ('enabled', 'disabled', 'updated', 'password_changed')
+
+# An adaptive interval is divided by this factor after a cycle finding differences and multiplied by it otherwise
+INTERVAL_SHRINK_FACTOR = 2
+INTERVAL_GROWTH_FACTOR = 1.5
+
+
+def isoformat(timestamp):
+    """Return a Unix timestamp as an ISO 8601 UTC string or None."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp is not None else None
 
 
 class Monitor:
@@ -39,70 +73,259 @@ class Monitor:
 
     def __init__(self):
         self.interval = None
+        self.min_interval = None
+        self.max_interval = None
+        self.configured = None
+        self.interval_reason = None
         self.timer = None
         self.is_running = False
+        self.quiet_cycles = 0
+        self.last_cycle_at = None
+        self.last_cycle_found_differences = None
+        self.next_cycle_at = None
+        self._lock = threading.RLock()
+        self._in_cycle = False
+        self._poked = False
+        # Incremented by start, stop and every scheduled run, so that a timer firing after it was replaced does nothing
+        self._generation = 0
+        self.pending_user_renames = {}
+        self.pending_user_updates = set()
+        self.user_changes_revision = None
 
-    def monitor_usergroup_change(self):
-        """Monitor and sync user group changes."""
+    def track_user_changes(self):
+        """
+        Remembers renames and updates of users, performed or observed since the last call, until they are uploaded.
+        """
+        if self.user_changes_revision is None:
+            self.user_changes_revision = change_recorder.current_revision()
+            return
+        more = True
+        while more:
+            entries, more = change_recorder.changes_since(self.user_changes_revision, 500)
+            if entries:
+                self.user_changes_revision = entries[-1].pk
+            self._track_user_entries(entry for entry in entries if entry.entity_type == ChangeLogEntry.USER)
+
+    def _track_user_entries(self, entries):
+        for entry in entries:
+            name = entry.entity_name
+            if entry.action == 'renamed':
+                new_name = entry.details['new_name']
+                old_name = next(
+                    (old for old, new in self.pending_user_renames.items() if new == name), name
+                )
+                self.pending_user_renames.pop(old_name, None)
+                if old_name != new_name:
+                    self.pending_user_renames[old_name] = new_name
+                if name in self.pending_user_updates:
+                    self.pending_user_updates.discard(name)
+                    self.pending_user_updates.add(new_name)
+            elif entry.action == 'deleted':
+                self.pending_user_updates.discard(name)
+            elif entry.action in USER_UPDATE_ACTIONS:
+                self.pending_user_updates.add(name)
+
+    @property
+    def adaptive(self):
+        return self.min_interval is not None and self.max_interval is not None
+
+    def monitor_change(self, generation=None):
+        """Run a cycle, then schedule the next one, adapting the interval to the differences found if adaptive."""
+        with self._lock:
+            # Replaced by a later start, stop or poke, or a cycle is already running
+            if (generation is not None and generation != self._generation) or self._in_cycle:
+                return
+            self._in_cycle = True
+            self.next_cycle_at = None
+            generation = self._generation
+        found_differences = self.run_cycle()
+
+        with self._lock:
+            self._in_cycle = False
+            self.last_cycle_at = time.time()
+            self.last_cycle_found_differences = found_differences
+            # A cycle that was restarted or stopped meanwhile doesn't adapt the interval of the new configuration
+            if self.adaptive and found_differences is not None and generation == self._generation:
+                self.adapt_interval(found_differences)
+            # No timer is scheduled during a cycle, so this is the only chain of runs.
+            # Schedule the next run if still running, right away if poked or restarted meanwhile
+            if self.is_running:
+                self._schedule(0 if self._poked else self.interval)
+            self._poked = False
+
+    def adapt_interval(self, found_differences):
+        """Shrink the interval after a cycle finding differences and grow it after a quiet one, within the bounds."""
+        if found_differences:
+            self.quiet_cycles = 0
+            self.interval = max(self.min_interval, round(self.interval / INTERVAL_SHRINK_FACTOR))
+            self.interval_reason = 'differences found in the last cycle'
+        else:
+            self.quiet_cycles += 1
+            self.interval = min(self.max_interval, round(self.interval * INTERVAL_GROWTH_FACTOR))
+            self.interval_reason = f'no differences found in the last {self.quiet_cycles} cycle(s)'
+
+    @monitor_profiler.profile('monitor_cycle')
+    def run_cycle(self):
+        """
+        Fetch the remote and local state concurrently, then sync user group and user changes.
+
+        Returns:
+            bool: Whether differences were found, or None if the cycle failed before comparing.
+        """
         try:
-            refresh_token = RefreshToken.get_valid()
-            remote = RemoteServiceClient(
-                '192.168.122.7:8000',
-                token_obtainer.get_access_token(refresh_token)
-            )
-            remote_usergroups = remote.get_usergroups('/secured/group')
-            local_usergroups = usergroup_retriever.get_all()
-            filtered_local_usergroups = filter_by_blacklist(
-                local_usergroups,
-                remote.get_blacklist('/secured/client/Win/usergroup-blacklist', SERVER_NAME)
-            )
+            with tracer.span('monitor.cycle'):
+                refresh_token = RefreshToken.get_valid(token_obtainer)
+                remote = RemoteServiceClient(
+                    '192.168.122.7:8000',
+                    token_obtainer.get_access_token(refresh_token),
+                    http_cache
+                )
+                with tracer.span('monitor.fetch'), ThreadPoolExecutor(max_workers=5) as executor:
+                    remote_usergroups = executor.submit(bind_context(remote.get_usergroups), '/secured/group')
+                    remote_users = executor.submit(bind_context(remote.get_users), '/secured/user')
+                    usergroup_blacklist = executor.submit(
+                        bind_context(remote.get_blacklist), '/secured/client/Win/usergroup-blacklist', SERVER_NAME
+                    )
+                    user_blacklist = executor.submit(
+                        bind_context(remote.get_blacklist), '/secured/client/Win/user-blacklist', SERVER_NAME
+                    )
+                    local = executor.submit(bind_context(local_snapshot))
 
-            if len(remote_usergroups) != len(filtered_local_usergroups):
-                remote.trigger_sync('/secured/sync/groups', local_usergroups)
+                # The fetches are awaited by each sync, so a failed one only fails the sync it's needed by
+                usergroups_differ = self.sync_usergroups(remote, remote_usergroups, usergroup_blacklist, local)
+                users_differ = self.sync_users(remote, remote_users, user_blacklist, local)
+                if usergroups_differ is None and users_differ is None:
+                    return None
+                return bool(usergroups_differ or users_differ)
         except Exception as exc:
-            print(f"Error in monitoring user group changes: {str(exc)}")
+            print(f"Error in monitoring changes: {str(exc)}")
+            return None
+
+    def sync_usergroups(self, remote, remote_usergroups, blacklist, local):
+        """Sync user group changes from the futures of the fetches, returning whether they differed or None on errors."""
+        try:
+            remote_usergroups, blacklist = remote_usergroups.result(), blacklist.result()
+            local_usergroups = local.result().usergroups
+            change_recorder.observe_usergroups(local_usergroups)
+            filtered_local_usergroups = filter_by_blacklist(local_usergroups, blacklist)
 
-        # Schedule the next run if still running
-        if self.is_running:
-            self.timer = threading.Timer(self.interval, self.monitor_usergroup_change)
-            self.timer.start()
+            remote_digest = usergroups_digest(remote_usergroups)
+            local_digest = usergroups_digest(filtered_local_usergroups)
+            if remote_digest.root != local_digest.root:
+                delta = SyncDelta.between(
+                    remote_digest,
+                    local_digest,
+                    {usergroup.name: usergroup for usergroup in filtered_local_usergroups}
+                )
+                delta_uploader.upload(remote, '/secured/sync/groups', delta)
+                return bool(delta)
+            return False
+        except Exception as exc:
+            print(f"Error in monitoring user group changes: {str(exc)}")
+            return None
 
-    def monitor_user_change(self):
-        """Monitor and sync user changes."""
+    def sync_users(self, remote, remote_users, blacklist, local):
+        """Sync user changes from the futures of the fetches, returning whether they differed or None on errors."""
         try:
-            refresh_token = RefreshToken.get_valid()
-            remote = RemoteServiceClient(
-                '192.168.122.7:8000',
-                token_obtainer.get_access_token(refresh_token)
-            )
-            remote_users = remote.get_usergroups('/secured/user')
-            local_users = user_retriever.get_all()
-            filtered_local_users = filter_by_blacklist(
-                local_users,
-                remote.get_blacklist('/secured/client/Win/user-blacklist', SERVER_NAME)
-            )
+            remote_users, blacklist = remote_users.result(), blacklist.result()
+            local_users = local.result().users
+            change_recorder.observe_users(local_users)
+            self.track_user_changes()
+            filtered_local_users = filter_by_blacklist(local_users, blacklist)
 
-            if len(remote_users) != len(filtered_local_users):
-                remote.trigger_sync('/secured/sync/users', local_users)
+            # Digests cover usernames only, so observed renames and updates are added to the delta
+            delta = SyncDelta.between(
+                users_digest(remote_users),
+                users_digest(filtered_local_users),
+                {user.username: user for user in filtered_local_users},
+                renames=self.pending_user_renames,
+                updated=self.pending_user_updates
+            )
+            if delta_uploader.upload(remote, '/secured/sync/users', delta):
+                self.pending_user_renames = {}
+                self.pending_user_updates = set()
+            return bool(delta)
         except Exception as exc:
             print(f"Error in monitoring user changes: {str(exc)}")
+            return None
 
-        # Schedule the next run if still running
-        if self.is_running:
-            self.timer = threading.Timer(self.interval, self.monitor_user_change)
-            self.timer.start()
-
-    def start_interval_monitor(self, interval_in_sec):
-        """Start the interval monitor."""
-        self.interval = interval_in_sec
-        self.is_running = True
-        # Start the first run immediately
-        self.monitor_usergroup_change()
-        self.monitor_user_change()
+    def start_interval_monitor(self, interval_in_sec, min_interval=None, max_interval=None):
+        """
+        Start the interval monitor, adapting the interval between min_interval and max_interval if both are given.
+        """
+        with self._lock:
+            self.configured = (interval_in_sec, min_interval, max_interval)
+            self.min_interval = min_interval
+            self.max_interval = max_interval
+            if self.adaptive:
+                self.interval = min(max(interval_in_sec, min_interval), max_interval)
+                self.interval_reason = 'initial interval'
+            else:
+                self.interval = interval_in_sec
+                self.interval_reason = 'fixed interval'
+            self.quiet_cycles = 0
+            self.is_running = True
+            self._generation += 1
+            if self._in_cycle:
+                # The running cycle schedules the next run right after it
+                self._poked = True
+            else:
+                # Start the first run immediately, in the background
+                self._cancel_timer()
+                self._schedule(0)
 
     def stop_interval_monitor(self):
         """Stop the interval monitor."""
-        self.is_running = False
+        with self._lock:
+            self.is_running = False
+            self.next_cycle_at = None
+            self._poked = False
+            self._cancel_timer()
+
+    def poke(self):
+        """
+        Run a cycle right away, or right after the current one.
+
+        Returns:
+            bool: False if the monitor isn't running.
+        """
+        with self._lock:
+            if not self.is_running:
+                return False
+            if self._in_cycle:
+                self._poked = True
+            else:
+                self._cancel_timer()
+                self._schedule(0)
+            return True
+
+    def status(self):
+        """
+        Returns the state of the monitor, including the current interval and why it was chosen.
+        """
+        with self._lock:
+            return {
+                'running': self.is_running,
+                'adaptive': self.adaptive,
+                'interval': self.interval,
+                'min_interval': self.min_interval,
+                'max_interval': self.max_interval,
+                'interval_reason': self.interval_reason,
+                'in_cycle': self._in_cycle,
+                'last_cycle_at': isoformat(self.last_cycle_at),
+                'last_cycle_found_differences': self.last_cycle_found_differences,
+                'next_cycle_at': isoformat(self.next_cycle_at),
+            }
+
+    def _schedule(self, delay):
+        self._generation += 1
+        self.next_cycle_at = time.time() + delay
+        self.timer = threading.Timer(delay, self.monitor_change, args=(self._generation,))
+        self.timer.start()
+
+    def _cancel_timer(self):
+        # A timer that has already fired and waits for the lock sees the generation has changed
+        self._generation += 1
         if self.timer:
             self.timer.cancel()
             self.timer = None
@@ -2,8 +2,14 @@
 This module contains the RemoteServiceClient class for making remote service requests.
 """
 
+import gzip
+import json
+
 import requests
 
+from config.settings.base import BLACKLIST_WILDCARDS
+from win_user_sync_local_server.change_monitor.blacklist import compile_blacklist
+from win_user_sync_local_server.diagnostics.tracing import traced_request
 from win_user_sync_local_server.user_groups.usergroups_scripts import Usergroup
 from win_user_sync_local_server.users.user_scripts import User
 
@@ -11,50 +17,61 @@ from win_user_sync_local_server.users.user_scripts import User
 class RemoteServiceClient:
     """Client for making requests to the remote service."""
 
-    def __init__(self, host, token):
+    def __init__(self, host, token, http_cache=None):
         self.base_url = f'http://{host}'
         self.auth_headers = {'Authorization': f'token {token}'}
+        self.http_cache = http_cache
+
+    def _get_json(self, url):
+        """Fetch a JSON payload, through the HTTP cache if there is one."""
+        if self.http_cache is not None:
+            return json.loads(self.http_cache.get(url, headers=self.auth_headers))
+        response = traced_request('GET', url, headers=self.auth_headers)
+        response.raise_for_status()
+        return response.json()
 
     def get_usergroups(self, endpoint):
-        """Fetch user groups from the remote service."""
+        """
+        Fetch user groups from the remote service.
+
+        Raises requests.exceptions.RequestException if the request fails and ValueError
+        if the response isn't valid JSON, so that a failed fetch is never taken for an empty listing.
+        """
         url = f'{self.base_url}/{endpoint}'
-        try:
-            response = requests.get(url, headers=self.auth_headers)
-            response.raise_for_status()
-            data = response.json()
-            usergroups = []
-
-            for usergroup_data in data:
-                name = usergroup_data.get('name', '')
-                description = usergroup_data.get('description', '')
-                users_data = usergroup_data.get('users', [])
-                users = [User(user.get('username')) for user in users_data]
-                usergroup = Usergroup(name, description, users)
-                usergroups.append(usergroup)
-
-            return usergroups
-        except requests.exceptions.RequestException as exc:
-            print(f"Error fetching user groups: {exc}")
-            return []
+        usergroups = []
+
+        for usergroup_data in self._get_json(url):
+            name = usergroup_data.get('name', '')
+            description = usergroup_data.get('description', '')
+            users_data = usergroup_data.get('users', [])
+            users = [User(user.get('username')) for user in users_data]
+            usergroup = Usergroup(name, description, users)
+            usergroups.append(usergroup)
+
+        return usergroups
+
+    def get_users(self, endpoint):
+        """Fetch users from the remote service, raising like get_usergroups() on errors."""
+        url = f'{self.base_url}/{endpoint}'
+        return [User(user_data.get('username')) for user_data in self._get_json(url)]
 
     def get_blacklist(self, endpoint, client_id):
-        """Fetch blacklist from the remote service."""
+        """Fetch blacklist from the remote service, compiled for fast lookups, raising like get_usergroups() on errors."""
         url = f'{self.base_url}/{endpoint}/{client_id}'
-        try:
-            response = requests.get(url, headers=self.auth_headers)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as exc:
-            print(f"Error fetching blacklist: {exc}")
-            return []
+        return compile_blacklist(self._get_json(url), BLACKLIST_WILDCARDS)
 
-    def trigger_sync(self, endpoint, data=None):
-        """Trigger a sync operation on the remote service."""
+    def upload_sync_chunk(self, endpoint, chunk, idempotency_key, compress=True):
+        """Upload a chunk of changed entities to the remote service."""
         url = f'{self.base_url}/{endpoint}'
+        body = json.dumps(chunk, separators=(',', ':')).encode('utf-8')
+        headers = {**self.auth_headers, 'Content-Type': 'application/json', 'Idempotency-Key': idempotency_key}
+        if compress:
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
         try:
-            response = requests.post(url, json=data, headers=self.auth_headers)
+            response = traced_request('POST', url, data=body, headers=headers)
             response.raise_for_status()
-            return response.json()
+            return True
         except requests.exceptions.RequestException as exc:
-            print(f"Error triggering sync: {exc}")
-            return None
+            print(f"Error uploading sync chunk {idempotency_key}: {exc}")
+            return False
@@ -0,0 +1,159 @@
+"""
+This module contains classes for uploading local changes to the remote service.
+
+Only entities whose digest entries differ from the remote's are uploaded: local entities
+as upserts and names known to the remote only as deletes. Renames observed locally are sent
+as renames instead of a delete of the old name, and entities changed in ways the digests
+don't cover are upserted as well. The delta is split into bounded chunks, each sent with an
+idempotency key derived from the endpoint, both digest roots, the changed names and the
+chunk index. While neither side changes, a failed upload resumes on the next monitor
+cycle with the first chunk the remote hasn't acknowledged.
+"""
+
+import json
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import SyncChunk
+from ..state.digest import sha256
+
+
+class SyncDelta:
+    """
+    Represents the changes turning the remote state into the local one.
+
+    Attributes:
+        remote_root (str): The digest root of the remote state.
+        local_root (str): The digest root of the local state.
+        upserts (list): Serialized local entities that are missing or different on the remote.
+        deletes (list): Names of entities that exist on the remote only.
+        renames (list): Renamed entities as {'from': old name, 'to': new name}, applied before upserts.
+    """
+    def __init__(self, remote_root, local_root, upserts, deletes, renames=None):
+        self.remote_root = remote_root
+        self.local_root = local_root
+        self.upserts = upserts
+        self.deletes = deletes
+        self.renames = renames or []
+
+    @classmethod
+    def between(cls, remote_digest, local_digest, local_entities, renames=None, updated=()):
+        """
+        Builds the delta from the digests of both states.
+
+        Args:
+            remote_digest (Digest): The digest of the remote state.
+            local_digest (Digest): The digest of the local state.
+            local_entities (dict): Local User or Usergroup objects keyed by name.
+            renames (dict, optional): New names keyed by old names of locally renamed entities.
+            updated (iterable, optional): Names of local entities to upsert even if their digest entries match.
+
+        Returns:
+            SyncDelta: The delta.
+        """
+        names = local_digest.diverged_entries(remote_digest)
+        diverged = set(names)
+        renamed = [
+            {'from': old_name, 'to': new_name} for old_name, new_name in sorted((renames or {}).items())
+            if old_name in diverged and old_name not in local_entities
+            and new_name in diverged and new_name in local_entities
+        ]
+        deletes = {rename['from'] for rename in renamed}
+        names += sorted(set(updated) - diverged)
+        return cls(
+            remote_digest.root,
+            local_digest.root,
+            [local_entities[name].serialize() for name in names if name in local_entities],
+            [name for name in names if name not in local_entities and name not in deletes],
+            renamed
+        )
+
+    def changed_names(self):
+        """
+        Returns the names of the changed entities, identifying the delta along with the digest roots.
+        """
+        return (
+            [f"{rename['from']}>{rename['to']}" for rename in self.renames]
+            + [entity.get('username') or entity.get('name') for entity in self.upserts]
+            + [f'-{name}' for name in self.deletes]
+        )
+
+    def __bool__(self):
+        return bool(self.upserts or self.deletes or self.renames)
+
+
+def split_into_chunks(delta, max_bytes):
+    """
+    Splits the delta into chunks of at most max_bytes of JSON, keeping the order of entities.
+
+    An entity larger than max_bytes makes up a chunk on its own.
+
+    Args:
+        delta (SyncDelta): The delta.
+        max_bytes (int): The maximum size of the entities of a chunk in bytes.
+
+    Returns:
+        list: Chunks as dictionaries with 'renames', 'upserts' and 'deletes'.
+    """
+    chunks = []
+    current, size = {'renames': [], 'upserts': [], 'deletes': []}, 0
+    items = (
+        [('renames', rename) for rename in delta.renames]
+        + [('upserts', entity) for entity in delta.upserts]
+        + [('deletes', name) for name in delta.deletes]
+    )
+    for key, item in items:
+        item_size = len(json.dumps(item, separators=(',', ':')).encode('utf-8')) + 1
+        if size and size + item_size > max_bytes:
+            chunks.append(current)
+            current, size = {'renames': [], 'upserts': [], 'deletes': []}, 0
+        current[key].append(item)
+        size += item_size
+    if size:
+        chunks.append(current)
+    return chunks
+
+
+class DeltaUploader:
+    """
+    Uploads deltas chunk by chunk, remembering acknowledged chunks.
+
+    Attributes:
+        max_chunk_bytes (int): The maximum size of the entities of a chunk in bytes.
+        compress (bool): Whether chunks are sent gzip-compressed.
+        retention (int): The number of seconds acknowledged chunks are remembered for.
+    """
+    def __init__(self, max_chunk_bytes, compress, retention):
+        self.max_chunk_bytes = max_chunk_bytes
+        self.compress = compress
+        self.retention = retention
+
+    def upload(self, remote, endpoint, delta):
+        """
+        Uploads the chunks of the delta the remote hasn't acknowledged yet, stopping at the first failure.
+
+        Args:
+            remote (RemoteServiceClient): The client of the remote service.
+            endpoint (str): The sync endpoint of the remote service.
+            delta (SyncDelta): The delta to upload.
+
+        Returns:
+            bool: True if every chunk has been acknowledged.
+        """
+        SyncChunk.objects.filter(acked_at__lt=timezone.now() - timedelta(seconds=self.retention)).delete()
+        if not delta:
+            return True
+
+        sync_id = sha256(endpoint, delta.remote_root, delta.local_root, *delta.changed_names())[:32]
+        chunks = split_into_chunks(delta, self.max_chunk_bytes)
+        acked = set(SyncChunk.objects.filter(sync_id=sync_id).values_list('index', flat=True))
+
+        for index, chunk in enumerate(chunks):
+            if index in acked:
+                continue
+            body = {'sync_id': sync_id, 'chunk': index, 'chunks': len(chunks), **chunk}
+            if not remote.upload_sync_chunk(endpoint, body, f'{sync_id}-{index}', self.compress):
+                return False
+            SyncChunk.objects.get_or_create(sync_id=sync_id, index=index)
+        return True
@@ -1 +1,218 @@
-# Create your tests here.
+import json
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase, TestCase
+
+from . import http_cache
+from .blacklist import compile_blacklist
+from .http_cache import HttpCache, cache_directives
+from .models import SyncChunk
+from .sync import DeltaUploader, SyncDelta, split_into_chunks
+from ..state.digest import users_digest
+from ..users.user_scripts import User
+
+
+def users_delta(remote_names, local_users, **kwargs):
+    local_users = [User(user) if isinstance(user, str) else user for user in local_users]
+    return SyncDelta.between(
+        users_digest([User(name) for name in remote_names]),
+        users_digest(local_users),
+        {user.username: user for user in local_users},
+        **kwargs
+    )
+
+
+class SyncDeltaTests(SimpleTestCase):
+    """
+    Deltas between the remote and the local users.
+    """
+    def test_only_diverged_entities_are_included(self):
+        delta = users_delta(['alice', 'bob', 'carol'], ['alice', 'carol', 'dave'])
+
+        self.assertEqual(delta.upserts, [{'username': 'dave'}])
+        self.assertEqual(delta.deletes, ['bob'])
+        self.assertEqual(delta.renames, [])
+
+    def test_equal_states_make_an_empty_delta(self):
+        self.assertFalse(users_delta(['alice'], ['alice']))
+
+    def test_observed_rename_replaces_the_delete(self):
+        delta = users_delta(['alice', 'carol'], ['alice', 'caroline'], renames={'carol': 'caroline'})
+
+        self.assertEqual(delta.renames, [{'from': 'carol', 'to': 'caroline'}])
+        self.assertEqual(delta.upserts, [{'username': 'caroline'}])
+        self.assertEqual(delta.deletes, [])
+
+    def test_rename_the_remote_already_has_is_left_out(self):
+        delta = users_delta(['alice', 'caroline'], ['alice', 'caroline'], renames={'carol': 'caroline'})
+
+        self.assertFalse(delta)
+
+    def test_updated_entities_are_upserted_although_digests_match(self):
+        delta = users_delta(['alice', 'bob'], [User('alice', enabled=False), 'bob'], updated={'alice'})
+
+        self.assertEqual(delta.upserts, [{'username': 'alice', 'enabled': False}])
+        self.assertEqual(delta.deletes, [])
+
+
+class ChunkSplittingTests(SimpleTestCase):
+    """
+    Splitting deltas into chunks of bounded size.
+    """
+    def delta(self, count):
+        return SyncDelta('remote', 'local', [{'username': f'user{index:03}'} for index in range(count)], ['gone'])
+
+    def test_chunks_keep_the_order_and_the_bound(self):
+        delta = self.delta(10)
+        max_bytes = 3 * len(json.dumps({'username': 'user000'}, separators=(',', ':')).encode('utf-8')) + 3
+
+        chunks = split_into_chunks(delta, max_bytes)
+
+        self.assertEqual([len(chunk['upserts']) for chunk in chunks], [3, 3, 3, 1])
+        self.assertEqual(chunks[-1]['deletes'], ['gone'])
+        self.assertEqual([entity for chunk in chunks for entity in chunk['upserts']], delta.upserts)
+        for chunk in chunks:
+            items = chunk['renames'] + chunk['upserts'] + chunk['deletes']
+            self.assertLessEqual(sum(len(json.dumps(item, separators=(',', ':'))) + 1 for item in items), max_bytes)
+
+    def test_oversized_entity_makes_up_a_chunk(self):
+        chunks = split_into_chunks(self.delta(2), 1)
+
+        self.assertEqual([chunk['upserts'] + chunk['deletes'] for chunk in chunks], [
+            [{'username': 'user000'}], [{'username': 'user001'}], ['gone']
+        ])
+
+    def test_empty_delta_has_no_chunks(self):
+        self.assertEqual(split_into_chunks(SyncDelta('remote', 'local', [], []), 100), [])
+
+
+class FakeRemote:
+    def __init__(self, fail_at=None):
+        self.fail_at = fail_at
+        self.uploads = []
+
+    def upload_sync_chunk(self, endpoint, chunk, idempotency_key, compress=True):
+        if chunk['chunk'] == self.fail_at:
+            return False
+        self.uploads.append((chunk['chunk'], idempotency_key))
+        return True
+
+
+class DeltaUploaderTests(TestCase):
+    """
+    Uploading deltas chunk by chunk.
+    """
+    def setUp(self):
+        self.uploader = DeltaUploader(max_chunk_bytes=1, compress=False, retention=3600)
+        self.delta = users_delta([], ['alice', 'bob', 'carol'])
+
+    def test_failed_upload_resumes_with_the_first_unacknowledged_chunk(self):
+        remote = FakeRemote(fail_at=1)
+        self.assertFalse(self.uploader.upload(remote, '/sync', self.delta))
+
+        remote.fail_at = None
+        self.assertTrue(self.uploader.upload(remote, '/sync', self.delta))
+
+        self.assertEqual([index for index, _ in remote.uploads], [0, 1, 2])
+        self.assertEqual(len({key for _, key in remote.uploads}), 3)
+        self.assertEqual(SyncChunk.objects.count(), 3)
+
+    def test_changed_delta_is_uploaded_under_another_sync_id(self):
+        remote = FakeRemote()
+        self.uploader.upload(remote, '/sync', self.delta)
+        self.uploader.upload(remote, '/sync', users_delta([], ['alice', 'bob']))
+
+        sync_ids = {key.rsplit('-', 1)[0] for _, key in remote.uploads}
+        self.assertEqual(len(sync_ids), 2)
+        self.assertEqual(len(remote.uploads), 5)
+
+
+class BlacklistTests(SimpleTestCase):
+    """
+    Matching names against compiled blacklists.
+    """
+    def test_names_match_case_insensitively(self):
+        blacklist = compile_blacklist(['Administrator', 'Guest'])
+
+        self.assertIn('administrator', blacklist)
+        self.assertIn('GUEST', blacklist)
+        self.assertNotIn('alice', blacklist)
+        self.assertNotIn(None, blacklist)
+
+    def test_wildcards_match_whole_names(self):
+        blacklist = compile_blacklist(['svc-*', 'temp?'])
+
+        self.assertIn('SVC-backup', blacklist)
+        self.assertIn('temp1', blacklist)
+        self.assertNotIn('temp12', blacklist)
+        self.assertNotIn('my-svc-backup', blacklist)
+
+    def test_wildcards_can_be_disabled(self):
+        blacklist = compile_blacklist(['svc-*'], wildcards=False)
+
+        self.assertIn('svc-*', blacklist)
+        self.assertNotIn('svc-backup', blacklist)
+
+    def test_unchanged_entries_reuse_the_compiled_blacklist(self):
+        blacklist = compile_blacklist(['alice', 'bob'])
+
+        self.assertIs(compile_blacklist(['alice', 'bob']), blacklist)
+        self.assertIs(compile_blacklist(blacklist), blacklist)
+
+
+def remote_response(status_code, text='', **headers):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = text.encode('utf-8')
+    response.headers.update(headers)
+    return response
+
+
+class HttpCacheTests(TestCase):
+    """
+    Answering GET requests from cached and revalidated responses.
+    """
+    def get(self, *responses):
+        with mock.patch.object(http_cache, 'traced_request', side_effect=responses) as request:
+            body = HttpCache().get('http://remote/blacklist', headers={'Authorization': 'token'})
+        return body, request
+
+    def test_cache_control_directives(self):
+        self.assertEqual(cache_directives('no-store, max-age=60'), (False, 0))
+        self.assertEqual(cache_directives('no-cache'), (True, 0))
+        self.assertEqual(cache_directives('public, max-age=60'), (True, 60))
+        self.assertEqual(cache_directives(None), (True, 0))
+
+    def test_fresh_response_is_reused_without_a_request(self):
+        self.get(remote_response(200, '["alice"]', **{'Cache-Control': 'max-age=60'}))
+
+        body, request = self.get()
+
+        self.assertEqual(body, '["alice"]')
+        request.assert_not_called()
+
+    def test_stale_response_is_revalidated(self):
+        self.get(remote_response(200, '["alice"]', ETag='"v1"'))
+
+        body, request = self.get(remote_response(304))
+
+        self.assertEqual(body, '["alice"]')
+        self.assertEqual(request.call_args.kwargs['headers']['If-None-Match'], '"v1"')
+
+    def test_changed_response_replaces_the_cached_one(self):
+        self.get(remote_response(200, '["alice"]', ETag='"v1"'))
+        self.get(remote_response(200, '["bob"]', ETag='"v2"'))
+
+        body, request = self.get(remote_response(304))
+
+        self.assertEqual(body, '["bob"]')
+        self.assertEqual(request.call_args.kwargs['headers']['If-None-Match'], '"v2"')
+
+    def test_errors_are_raised_and_not_cached(self):
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.get(remote_response(503))
+
+        body, request = self.get(remote_response(200, '[]'))
+        self.assertEqual(body, '[]')
+        self.assertNotIn('If-None-Match', request.call_args.kwargs['headers'])
@@ -1,5 +1,4 @@
-import requests
-
+from ..diagnostics.tracing import traced_request
 from .models import RefreshToken
 
 
@@ -29,14 +28,14 @@ class TokenObtainer:
             'password': self.password
         }
 
-        response = requests.post(url, data=data)
+        response = traced_request('POST', url, data=data)
         response.raise_for_status()
         token_data = response.json()
         token = token_data.get('refresh_token')
         token_expires_in = token_data.get('refresh_expires_in')
 
         # Save or update refresh token in the database
-        refresh_token = RefreshToken(token=token, token_expires_in=token_expires_in)
+        refresh_token = RefreshToken(token=token, expires_in=token_expires_in)
         refresh_token.save()
 
         return token
@@ -53,7 +52,7 @@ class TokenObtainer:
             'refresh_token': refresh_token
         }
 
-        response = requests.post(url, data=data)
+        response = traced_request('POST', url, data=data)
         response.raise_for_status()
         token_data = response.json()
         access_token = token_data.get('access_token')
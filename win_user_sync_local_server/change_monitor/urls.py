@@ -5,4 +5,6 @@ from . import views
 urlpatterns = [
     path('start_monitor/', views.start_monitor, name='start_monitor'),
     path('stop_monitor/', views.stop_monitor, name='stop_monitor'),
+    path('poke/', views.poke_monitor, name='poke_monitor'),
+    path('status/', views.monitor_status, name='monitor_status'),
 ]
@@ -6,22 +6,50 @@ from django_keycloak_auth.decorators import keycloak_roles
 from rest_framework.decorators import api_view
 from django.http import JsonResponse
 
-from config.settings.base import PRINCIPAL_ROLE_NAME
+from config.settings.base import MONITOR_LEADER_ELECTION, MONITOR_LEASE_SECONDS, PRINCIPAL_ROLE_NAME
+from win_user_sync_local_server.change_monitor.leader import MONITOR_NAME, LeaseElection, MonitorCoordinator, worker_id
 from win_user_sync_local_server.change_monitor.monitor import Monitor
 
 
 monitor = Monitor()
+monitor_coordinator = MonitorCoordinator(
+    monitor,
+    LeaseElection(MONITOR_NAME, worker_id(), MONITOR_LEASE_SECONDS),
+    MONITOR_LEASE_SECONDS / 3
+)
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['POST'])
 def start_monitor(request):
-    """Start the interval monitor."""
+    """Start the interval monitor, on whichever worker holds the monitor lease."""
     try:
         interval = int(request.POST.get('interval', 3600))  # default to 1 hr if not specified
-        monitor.start_interval_monitor(interval_in_sec=interval)
+        min_interval = request.POST.get('min_interval')
+        max_interval = request.POST.get('max_interval')
+        if (min_interval is None) != (max_interval is None):
+            raise ValueError
+        if min_interval is not None:
+            min_interval, max_interval = int(min_interval), int(max_interval)
+            if not 0 < min_interval <= max_interval:
+                raise ValueError
+        if interval <= 0:
+            raise ValueError
+
+        if MONITOR_LEADER_ELECTION:
+            monitor_coordinator.ensure_started()
+            monitor_coordinator.request_start(interval, min_interval, max_interval)
+        else:
+            monitor.stop_interval_monitor()
+            monitor.start_interval_monitor(interval, min_interval, max_interval)
+
+        if min_interval is not None:
+            message = (f'Interval monitoring started with an adaptive interval between {min_interval} '
+                       f'and {max_interval} seconds, starting at {interval} seconds')
+        else:
+            message = f'Interval monitoring started with an interval of {interval} seconds'
         return JsonResponse({
             'status': 'success',
-            'message': f'Interval monitoring started with an interval of {interval} seconds'
+            'message': message
         }, status=200)
     except ValueError:
         return JsonResponse({
@@ -38,9 +66,13 @@ def start_monitor(request):
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['POST'])
 def stop_monitor(request):
-    """Stop the interval monitor."""
+    """Stop the interval monitor, on whichever worker runs it."""
     try:
-        monitor.stop_interval_monitor()
+        if MONITOR_LEADER_ELECTION:
+            monitor_coordinator.ensure_started()
+            monitor_coordinator.request_stop()
+        else:
+            monitor.stop_interval_monitor()
         return JsonResponse({
             'status': 'success',
             'message': 'Interval monitoring stopped'
@@ -50,3 +82,46 @@ def stop_monitor(request):
             'status': 'error',
             'message': f'Error stopping monitor: {str(exc)}'
         }, status=500)
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['POST'])
+def poke_monitor(request):
+    """Run a monitor cycle right away, on whichever worker runs the monitor."""
+    try:
+        if MONITOR_LEADER_ELECTION:
+            monitor_coordinator.ensure_started()
+            poked = monitor_coordinator.request_poke()
+        else:
+            poked = monitor.poke()
+        if not poked:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'The monitor is not running'
+            }, status=409)
+        return JsonResponse({
+            'status': 'success',
+            'message': 'Monitor cycle requested'
+        }, status=202)
+    except Exception as exc:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Error poking monitor: {str(exc)}'
+        }, status=500)
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET'])
+def monitor_status(request):
+    """Return the state of the monitor, including its current interval and why it was chosen."""
+    try:
+        if MONITOR_LEADER_ELECTION:
+            status = monitor_coordinator.status()
+        else:
+            status = monitor.status()
+        return JsonResponse(status, status=200)
+    except Exception as exc:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Error retrieving monitor status: {str(exc)}'
+        }, status=500)
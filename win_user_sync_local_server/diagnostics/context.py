@@ -0,0 +1,13 @@
+"""
+This module contains helpers carrying diagnostics context into other threads.
+"""
+
+from .profiling import profiler_wrap
+from .tracing import tracer
+
+
+def bind_context(func):
+    """
+    Binds a function to the current span and profile session before handing it to a thread pool.
+    """
+    return profiler_wrap(tracer.wrap(func))
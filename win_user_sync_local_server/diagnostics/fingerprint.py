@@ -0,0 +1,42 @@
+"""
+This module contains functions for fingerprinting PowerShell commands.
+
+A fingerprint keeps cmdlet, script and parameter names and replaces every value with '?',
+so that commands differing only in user or group names (or passwords) are grouped together
+and no secrets or names leak into traces and logs.
+"""
+
+import re
+
+TOKEN_PATTERN = re.compile(r'''"(?:[^"`]|`.)*"|'[^']*'|\|\||[|;{}()]|[^\s|;{}()"']+''')
+CMDLET_PATTERN = re.compile(r'^[A-Za-z]+-[A-Za-z]+$')
+PARAMETER_PATTERN = re.compile(r'^-[A-Za-z][\w-]*:?$')
+SCRIPT_PATTERN = re.compile(r'[^\\/]+\.ps1$', re.IGNORECASE)
+KEEP_TOKENS = {'|', ';', '{', '}', '(', ')', '||', 'foreach', 'try', 'catch', 'if', 'else'}
+
+
+def fingerprint_command(command):
+    """
+    Returns the normalized fingerprint of a PowerShell command.
+
+    Args:
+        command (str or list): The PowerShell command or the whole argument list,
+            in which case the value of the last argument ('-Command' value) is used.
+
+    Returns:
+        str: The fingerprint, e.g. 'Get-LocalGroupMember -Name ? | Format-Table -Property ?'.
+    """
+    if isinstance(command, (list, tuple)):
+        command = command[-1] if command else ''
+
+    tokens = []
+    for token in TOKEN_PATTERN.findall(command):
+        script = SCRIPT_PATTERN.search(token)
+        if token in KEEP_TOKENS or token.lower() in KEEP_TOKENS or CMDLET_PATTERN.match(token) \
+                or PARAMETER_PATTERN.match(token):
+            tokens.append(token)
+        elif script and not token.startswith(('"', "'")):
+            tokens.append(script.group(0))
+        elif not tokens or tokens[-1] != '?':
+            tokens.append('?')
+    return ' '.join(tokens)
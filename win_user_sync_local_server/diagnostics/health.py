@@ -0,0 +1,170 @@
+"""
+This module contains the ReadinessProbe class checking the dependencies of the server.
+
+Every check is a function returning a dictionary of details and raising an exception if the
+dependency isn't usable. Results are cached for a few seconds, so frequent load balancer probes
+don't add load on the dependencies, and concurrent probes share a single round of checks.
+"""
+
+import os
+import shutil
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from py_eureka_client import eureka_client
+
+from config.settings.base import (
+    ADMISSION_MAX_QUEUE_DEPTH,
+    EUREKA_URL,
+    READINESS_CACHE_SECONDS,
+    READINESS_CHECKS,
+    READINESS_TIMEOUT,
+    SERVER_NAME
+)
+from ..accounts.store import account_store
+from ..admission.load import powershell_load
+from ..remoting.hosts import session_pool
+from ..users.user_scripts import LocalShell
+
+
+class NotReady(Exception):
+    """
+    Raised by a check when its dependency isn't usable.
+    """
+
+
+def check_database(timeout):
+    """
+    Runs a trivial query on the default database.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    return {'vendor': connection.vendor}
+
+
+def check_powershell(timeout):
+    """
+    Checks that the PowerShell executable exists and the running commands don't saturate the server.
+    """
+    store = getattr(account_store, 'store', account_store)
+    details = {
+        'backend': type(store).__name__,
+        'in_flight': powershell_load.in_flight,
+        'max_in_flight': ADMISSION_MAX_QUEUE_DEPTH,
+        'command_latency_ms': round(powershell_load.latency * 1000, 3),
+        'remote_sessions': session_pool.status(),
+    }
+    shell = getattr(store, 'shell', None)
+    if isinstance(shell, LocalShell) and not (
+            os.path.isfile(shell.powershell_path) or shutil.which(shell.powershell_path)):
+        raise NotReady(f'PowerShell executable {shell.powershell_path} not found')
+    if powershell_load.in_flight >= ADMISSION_MAX_QUEUE_DEPTH:
+        raise NotReady(f'{powershell_load.in_flight} PowerShell commands are running already')
+    return details
+
+
+def check_keycloak(timeout):
+    """
+    Checks that the keys of the Keycloak realm are cached, fetching them into the cache otherwise.
+    """
+    # The same cache key the Keycloak middleware reads the keys from
+    if cache.get('jwks') is not None:
+        return {'keys': 'cached'}
+    config = settings.KEYCLOAK_CONFIG
+    response = requests.get(
+        f"{config['KEYCLOAK_SERVER_URL']}/realms/{config['KEYCLOAK_REALM']}/protocol/openid-connect/certs",
+        timeout=timeout
+    )
+    response.raise_for_status()
+    cache.set('jwks', response.json())
+    return {'keys': 'fetched'}
+
+
+def check_eureka(timeout):
+    """
+    Checks that the Eureka client was initialized and Eureka lists an instance of this server.
+    """
+    if eureka_client.get_client() is None:
+        raise NotReady('The Eureka client is not initialized')
+    response = requests.get(
+        f'{str(EUREKA_URL).rstrip("/")}/apps/{SERVER_NAME}',
+        headers={'Accept': 'application/json'},
+        timeout=timeout
+    )
+    if response.status_code == 404:
+        raise NotReady(f'{SERVER_NAME} is not registered in Eureka')
+    response.raise_for_status()
+    instances = response.json().get('application', {}).get('instance', [])
+    if isinstance(instances, dict):
+        instances = [instances]
+    return {'instances': len(instances)}
+
+
+CHECKS = {
+    'database': check_database,
+    'powershell': check_powershell,
+    'keycloak': check_keycloak,
+    'eureka': check_eureka,
+}
+
+
+class ReadinessProbe:
+    """
+    Runs the readiness checks and caches their result.
+
+    Attributes:
+        checks (dict): The check functions keyed by name.
+        cache_seconds (float): The number of seconds a result is reused for.
+        timeout (float): The number of seconds a check waits for a network response.
+    """
+    def __init__(self, checks, cache_seconds, timeout):
+        self.checks = checks
+        self.cache_seconds = cache_seconds
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._result = None
+        self._checked_at = None
+
+    def result(self):
+        """
+        Returns the cached result or runs the checks if it's stale.
+
+        Returns:
+            dict: Whether the server is ready, when it was checked, and the outcome and latency of every check.
+        """
+        with self._lock:
+            if self._result is None or time.monotonic() - self._checked_at >= self.cache_seconds:
+                self._result = self.run()
+                self._checked_at = time.monotonic()
+            return {**self._result, 'age_ms': round((time.monotonic() - self._checked_at) * 1000, 3)}
+
+    def run(self):
+        """
+        Runs every check once.
+        """
+        checks = {}
+        for name, check in self.checks.items():
+            started_at = time.perf_counter()
+            try:
+                outcome = {'ok': True, **check(self.timeout)}
+            except Exception as exc:
+                outcome = {'ok': False, 'error': str(exc)}
+            outcome['latency_ms'] = round((time.perf_counter() - started_at) * 1000, 3)
+            checks[name] = outcome
+        return {
+            'ready': all(outcome['ok'] for outcome in checks.values()),
+            'checked_at': time.time(),
+            'checks': checks,
+        }
+
+
+readiness_probe = ReadinessProbe(
+    {name: CHECKS[name] for name in READINESS_CHECKS},
+    READINESS_CACHE_SECONDS,
+    READINESS_TIMEOUT
+)
@@ -0,0 +1,43 @@
+"""
+This module contains the liveness and readiness endpoints probed by load balancers and orchestrators.
+
+They aren't protected by Keycloak, so probes don't need a token, and they aren't limited by admission control.
+"""
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_safe
+
+from .health import readiness_probe
+
+
+@require_safe
+def healthz(request):
+    """
+    Liveness endpoint. Responds without touching any dependency.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: A response with the status 'ok'.
+    """
+    return JsonResponse({'status': 'ok'}, content_type='application/json')
+
+
+@require_safe
+def readyz(request):
+    """
+    Readiness endpoint. Reports the cached outcome of the dependency checks.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: The outcome and latency of every check, with status 503 if any failed.
+    """
+    result = readiness_probe.result()
+    return JsonResponse(
+        {'status': 'ready' if result['ready'] else 'not_ready', **result},
+        status=200 if result['ready'] else 503,
+        content_type='application/json'
+    )
@@ -0,0 +1,149 @@
+"""
+This module contains middleware tracing and profiling requests.
+"""
+
+import re
+import time
+
+from django.http import JsonResponse
+
+from config.settings.base import PRINCIPAL_ROLE_NAME, PROFILING_ENABLED
+from .profiling import CLOCKS, StoredProfile, profile_store, profiled
+from .tracing import tracer
+
+TRACE_ID_HEADER = 'X-Trace-Id'
+TRACE_ID_PATTERN = re.compile(r'^[0-9a-fA-F-]{8,64}$')
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+PROFILE_SKIPPED_HEADER = 'X-Profile-Skipped'
+
+
+def incoming_trace_id(request):
+    """
+    Returns the trace ID from the X-Trace-Id or the W3C traceparent header, if valid.
+    """
+    trace_id = request.headers.get(TRACE_ID_HEADER)
+    if trace_id and TRACE_ID_PATTERN.match(trace_id):
+        return trace_id.replace('-', '').lower()
+
+    parts = request.headers.get('traceparent', '').split('-')
+    if len(parts) == 4 and len(parts[1]) == 32 and TRACE_ID_PATTERN.match(parts[1]):
+        return parts[1].lower()
+    return None
+
+
+class TracingMiddleware:
+    """
+    Wraps every request in a root span and returns its trace ID in the X-Trace-Id header.
+
+    Should be placed first, so that the root span covers all other middleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        span = tracer.start_span(
+            f'{request.method} {request.path}',
+            trace_id=incoming_trace_id(request),
+            method=request.method,
+            path=request.path
+        )
+        if span is None:
+            return self.get_response(request)
+
+        try:
+            response = self.get_response(request)
+        except Exception as exc:
+            tracer.finish_span(getattr(request, 'trace_view_span', None), exc)
+            tracer.finish_span(span, exc)
+            raise
+
+        tracer.finish_span(getattr(request, 'trace_view_span', None))
+        span.set_attribute('status', response.status_code)
+        if request.resolver_match is not None:
+            span.set_attribute('route', request.resolver_match.route)
+        tracer.finish_span(span)
+        response[TRACE_ID_HEADER] = span.trace_id
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.trace_auth_started = (time.time(), time.perf_counter())
+
+
+class TracingViewMiddleware:
+    """
+    Records the time spent authenticating the request and wraps the view in a span.
+
+    Should be placed right after the Keycloak middleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        started = getattr(request, 'trace_auth_started', None)
+        if started is not None:
+            tracer.record_span('keycloak_auth', started[0], time.perf_counter() - started[1])
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        request.trace_view_span = tracer.start_span(f'view.{url_name or view_func.__name__}')
+
+
+def requested_profile_clock(request):
+    """
+    Returns the clock requested with the profile query parameter or the X-Profile header.
+
+    '1' and 'true' select the wall clock. Returns None if no profile was requested.
+    """
+    value = request.GET.get('profile') or request.headers.get(PROFILE_HEADER)
+    if not value:
+        return None
+    value = value.lower()
+    return 'wall' if value in ('1', 'true') else value
+
+
+class ProfilingMiddleware:
+    """
+    Runs the view under cProfile when requested with ?profile=wall|cpu or the X-Profile header.
+
+    Only requests with the principal role are profiled. The profile is kept in memory and
+    its ID returned in the X-Profile-Id header. Should be placed after the Keycloak middleware.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        clock = requested_profile_clock(request)
+        if not PROFILING_ENABLED or clock is None:
+            return None
+        if PRINCIPAL_ROLE_NAME not in (getattr(request, 'roles', None) or []):
+            return JsonResponse(
+                {"error": "Profiling requires the principal role"},
+                status=403,
+                content_type='application/json'
+            )
+        if clock not in CLOCKS:
+            return JsonResponse(
+                {"error": f"Unknown profile clock {clock}. Use one of: {', '.join(CLOCKS)}"},
+                status=400,
+                content_type='application/json'
+            )
+
+        started = time.perf_counter()
+        with profiled(clock) as session:
+            response = view_func(request, *view_args, **view_kwargs)
+            # Rendering is part of the serialization cost
+            if hasattr(response, 'render') and callable(response.render):
+                response = response.render()
+        stats = session.stats()
+        if session.skipped or stats is None:
+            response[PROFILE_SKIPPED_HEADER] = 'Another profiler is active'
+            return response
+        profile = StoredProfile(request.method, request.path, clock, time.perf_counter() - started, stats)
+        profile_store.add(profile)
+        response[PROFILE_ID_HEADER] = profile.profile_id
+        return response
@@ -0,0 +1,286 @@
+"""
+This module contains classes for on-demand profiling of requests and monitor cycles.
+
+Profiles are taken with cProfile either against the wall clock or against the CPU time
+of the profiled thread. The latter leaves out time spent waiting for PowerShell
+processes and other threads, so parsing, serialization and thread handoff costs stand out.
+Work handed to thread pools should be wrapped with profiler_wrap() to be profiled as well.
+
+Since Python 3.12 cProfile is built on sys.monitoring, so only one profiler can be active in the
+process and it sees every thread. Sessions then take turns: a session started while another one
+is profiling runs unprofiled, and wrapping work for thread pools isn't needed.
+"""
+
+import cProfile
+import functools
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from config.settings.base import PROFILING_MONITOR, PROFILING_MONITOR_CLOCK, PROFILING_STORE_SIZE
+
+CLOCKS = {
+    'wall': time.perf_counter,
+    'cpu': time.thread_time,
+}
+
+SORT_KEYS = ('cumulative', 'tottime', 'calls')
+
+# Whether a single profiler sees every thread of the process
+PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+_current_session = ContextVar('current_profile_session', default=None)
+# Held by the session using the process-wide profiler
+_process_profiler_lock = threading.Lock()
+
+
+def stats_rows(stats, sort='cumulative', limit=50):
+    """
+    Converts profile statistics to a list of dictionaries.
+
+    Args:
+        stats (pstats.Stats): The statistics.
+        sort (str): One of 'cumulative', 'tottime' and 'calls'.
+        limit (int): The maximum number of returned functions.
+
+    Returns:
+        list: The most expensive functions with call counts and times in milliseconds.
+    """
+    index = {'calls': 1, 'tottime': 2, 'cumulative': 3}[sort]
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][index], reverse=True)[:limit]
+    return [
+        {
+            'function': function,
+            'file': file,
+            'line': line,
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'total_time_ms': round(total_time * 1000, 3),
+            'cumulative_time_ms': round(cumulative_time * 1000, 3),
+        }
+        for (file, line, function), (primitive_calls, calls, total_time, cumulative_time, _) in rows
+    ]
+
+
+class ProfileSession:
+    """
+    Collects the profile of a thread and of the work it hands to thread pools.
+
+    Attributes:
+        clock (str): Either 'wall' or 'cpu'.
+        skipped (bool): Whether profiling was skipped, because another profiler was active.
+    """
+    def __init__(self, clock):
+        self.clock = clock
+        self.skipped = False
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def start_profile(self):
+        """
+        Starts a new profile of the session in the calling thread.
+
+        Returns:
+            cProfile.Profile: The enabled profile or None if another profiler is active.
+        """
+        profile = cProfile.Profile(timer=CLOCKS[self.clock])
+        try:
+            profile.enable()
+        except ValueError:
+            # Raised since Python 3.12 while another profiler, such as a debugger, is active
+            self.skipped = True
+            return None
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def stats(self):
+        """
+        Returns the merged statistics of all collected profiles or None if nothing was collected.
+        """
+        with self._lock:
+            profiles = list(self._profiles)
+        stats = None
+        for profile in profiles:
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        return stats
+
+
+@contextmanager
+def profiled(clock):
+    """
+    Profiles the wrapped block. Yields the ProfileSession.
+
+    The block runs unprofiled, with the session marked as skipped, if another session
+    holds the process-wide profiler or another profiler is active.
+    """
+    session = ProfileSession(clock)
+    if PROCESS_WIDE_PROFILER and not _process_profiler_lock.acquire(blocking=False):
+        session.skipped = True
+        yield session
+        return
+
+    token = _current_session.set(session)
+    try:
+        profile = session.start_profile()
+        try:
+            yield session
+        finally:
+            if profile is not None:
+                profile.disable()
+    finally:
+        _current_session.reset(token)
+        if PROCESS_WIDE_PROFILER:
+            _process_profiler_lock.release()
+
+
+def profiler_wrap(func):
+    """
+    Binds a function to the current profile session, so that it's profiled when it runs in another thread.
+
+    The function runs unprofiled if its profile can't be started.
+    """
+    session = _current_session.get()
+    # The process-wide profiler already sees the other threads
+    if session is None or PROCESS_WIDE_PROFILER:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = session.start_profile()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+    return wrapper
+
+
+class StoredProfile:
+    """
+    Represents the profile of a single request.
+
+    Attributes:
+        profile_id (str): The ID of the profile.
+        method (str): The HTTP method of the request.
+        path (str): The path of the request.
+        clock (str): Either 'wall' or 'cpu'.
+        duration (float): The wall duration of the request in seconds.
+        stats (pstats.Stats): The profile statistics.
+        created_at (float): The time the profile was stored at, as returned by time.time().
+    """
+    def __init__(self, method, path, clock, duration, stats):
+        self.profile_id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.clock = clock
+        self.duration = duration
+        self.stats = stats
+        self.created_at = time.time()
+
+    def summary(self):
+        return {
+            'profile_id': self.profile_id,
+            'method': self.method,
+            'path': self.path,
+            'clock': self.clock,
+            'duration_ms': round(self.duration * 1000, 3),
+            'profiled_time_ms': round(self.stats.total_tt * 1000, 3) if self.stats else 0,
+            'created_at': self.created_at,
+        }
+
+
+class ProfileStore:
+    """
+    Keeps the most recent request profiles in memory.
+
+    Attributes:
+        size (int): The maximum number of kept profiles.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._profiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile):
+        with self._lock:
+            self._profiles[profile.profile_id] = profile
+            while len(self._profiles) > self.size:
+                self._profiles.popitem(last=False)
+
+    def get(self, profile_id):
+        return self._profiles.get(profile_id)
+
+    def all(self):
+        """
+        Returns the kept profiles, the most recent first.
+        """
+        with self._lock:
+            return list(reversed(self._profiles.values()))
+
+
+class AggregateProfiler:
+    """
+    Accumulates profiles of repeated operations, such as monitor cycles, by operation name.
+
+    Attributes:
+        enabled (bool): Whether operations are profiled at all.
+        clock (str): Either 'wall' or 'cpu'.
+    """
+    def __init__(self, enabled, clock='cpu'):
+        self.enabled = enabled
+        self.clock = clock
+        self._stats = {}
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, name):
+        """
+        Profiles the wrapped block and adds its statistics to the ones of the given operation.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        with profiled(self.clock) as session:
+            yield
+        stats = session.stats()
+        if stats is None:
+            return
+        with self._lock:
+            self._runs[name] = self._runs.get(name, 0) + 1
+            if name in self._stats:
+                self._stats[name].add(stats)
+            else:
+                self._stats[name] = stats
+
+    def report(self, sort='cumulative', limit=50):
+        """
+        Returns the accumulated statistics of every operation.
+
+        Returns:
+            dict: The number of runs and the most expensive functions keyed by operation name.
+        """
+        with self._lock:
+            return {
+                name: {'runs': self._runs[name], 'functions': stats_rows(stats, sort, limit)}
+                for name, stats in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._runs.clear()
+
+
+profile_store = ProfileStore(PROFILING_STORE_SIZE)
+monitor_profiler = AggregateProfiler(PROFILING_MONITOR, PROFILING_MONITOR_CLOCK)
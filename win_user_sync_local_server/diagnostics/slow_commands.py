@@ -0,0 +1,143 @@
+"""
+This module contains the SlowCommandLog class recording PowerShell commands slower than a threshold.
+
+Commands are recorded by their fingerprint (see the fingerprint module), so no names or secrets
+are kept, in a ring buffer and optionally in a rotating JSON-lines file. The buffer is aggregated
+by fingerprint to find the commands costing the most time in total or in the worst case.
+"""
+
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from logging.handlers import RotatingFileHandler
+
+from config.settings.base import (
+    SLOW_COMMAND_BUFFER_SIZE,
+    SLOW_COMMAND_FILE,
+    SLOW_COMMAND_FILE_BACKUPS,
+    SLOW_COMMAND_FILE_MAX_BYTES,
+    SLOW_COMMAND_STDERR_CHARS,
+    SLOW_COMMAND_THRESHOLD
+)
+from .fingerprint import fingerprint_command
+
+SORT_KEYS = ('total', 'p99', 'max', 'count')
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of sorted values.
+    """
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+class SlowCommandLog:
+    """
+    Keeps the most recent PowerShell commands that took longer than the threshold.
+
+    Attributes:
+        threshold (float): The number of seconds above which a command is recorded.
+        size (int): The number of most recent slow commands kept in memory.
+        stderr_chars (int): The number of characters of the standard error kept.
+        path (str): The JSON-lines file slow commands are appended to, or empty.
+    """
+    def __init__(self, threshold, size, stderr_chars, path='', max_bytes=0, backups=0):
+        self.threshold = threshold
+        self.stderr_chars = stderr_chars
+        self.path = path
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._logger = None
+        if path:
+            self._logger = logging.getLogger(f'{__name__}.file')
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self._logger.addHandler(handler)
+
+    def record(self, command, duration, exit_code, stderr='', host=None):
+        """
+        Records a command if it took longer than the threshold.
+
+        Args:
+            command (str or list): The command or the whole argument list, see fingerprint_command().
+            duration (float): The number of seconds the command took.
+            exit_code (int): The exit code of the command.
+            stderr (str): The standard error or the error message of the command.
+            host (str): The remote host the command ran on or None for this machine.
+        """
+        if duration < self.threshold:
+            return
+        entry = {
+            'fingerprint': fingerprint_command(command),
+            'host': host,
+            'at': time.time(),
+            'duration_ms': round(duration * 1000, 3),
+            'exit_code': exit_code,
+            'stderr': (stderr or '').strip()[:self.stderr_chars],
+        }
+        with self._lock:
+            self._entries.append(entry)
+        if self._logger is not None:
+            self._logger.info(json.dumps(entry))
+
+    def entries(self):
+        """
+        Returns the slow commands kept in memory, the oldest first.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    def offenders(self, sort='total', limit=20):
+        """
+        Aggregates the slow commands kept in memory by fingerprint.
+
+        Args:
+            sort (str): One of SORT_KEYS.
+            limit (int): The maximum number of fingerprints returned.
+
+        Returns:
+            list: Dictionaries with the count, failures, total, p99 and maximum duration and the
+                last error of every fingerprint, the costliest first.
+        """
+        durations, failures, last_errors = defaultdict(list), defaultdict(int), {}
+        for entry in self.entries():
+            fingerprint = entry['fingerprint']
+            durations[fingerprint].append(entry['duration_ms'])
+            if entry['exit_code']:
+                failures[fingerprint] += 1
+                last_errors[fingerprint] = entry['stderr']
+
+        rows = []
+        for fingerprint, values in durations.items():
+            values.sort()
+            rows.append({
+                'fingerprint': fingerprint,
+                'count': len(values),
+                'failures': failures[fingerprint],
+                'total_ms': round(sum(values), 3),
+                'p99_ms': percentile(values, 0.99),
+                'max_ms': values[-1],
+                'last_error': last_errors.get(fingerprint),
+            })
+        key = {'total': 'total_ms', 'p99': 'p99_ms', 'max': 'max_ms', 'count': 'count'}[sort]
+        rows.sort(key=lambda row: row[key], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+slow_command_log = SlowCommandLog(
+    SLOW_COMMAND_THRESHOLD,
+    SLOW_COMMAND_BUFFER_SIZE,
+    SLOW_COMMAND_STDERR_CHARS,
+    SLOW_COMMAND_FILE,
+    SLOW_COMMAND_FILE_MAX_BYTES,
+    SLOW_COMMAND_FILE_BACKUPS
+)
@@ -0,0 +1,303 @@
+"""
+This module contains the Tracer class for lightweight request tracing.
+
+Spans are nested through a context variable, so a span started while another one is
+current becomes its child. Work handed to thread pools should be wrapped with
+Tracer.wrap() to keep the parent span.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+
+from config.settings.base import (
+    TRACING_BUFFER_SIZE,
+    TRACING_ENABLED,
+    TRACING_EXPORTERS,
+    TRACING_FILE
+)
+
+_current_span = ContextVar('current_span', default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def new_span_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    """
+    Represents a timed operation.
+
+    Attributes:
+        name (str): The name of the operation.
+        trace_id (str): The ID of the trace the span belongs to.
+        span_id (str): The ID of the span.
+        parent_id (str): The ID of the parent span or None for a root span.
+        attributes (dict): Operation specific attributes.
+        started_at (float): The start time as returned by time.time().
+        duration (float): The duration in seconds, None while the span is running.
+        error (str): The error the operation failed with or None.
+    """
+    def __init__(self, name, trace_id, parent_id=None, **attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.started_at = time.time()
+        self.duration = None
+        self.error = None
+        self._started = time.perf_counter()
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def serialize(self):
+        """
+        Serializes the span to a dictionary.
+
+        Returns:
+            dict: A dictionary representation of the span.
+        """
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 3) if self.duration is not None else None,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class RingBufferExporter:
+    """
+    Keeps the most recent finished spans in memory.
+
+    Attributes:
+        size (int): The maximum number of kept spans.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._spans = deque(maxlen=size)
+
+    def export(self, span):
+        self._spans.append(span)
+
+    def traces(self):
+        """
+        Returns the kept spans grouped by trace, the most recent trace first.
+
+        Returns:
+            OrderedDict: Lists of Span objects keyed by trace ID.
+        """
+        traces = OrderedDict()
+        for span in reversed(list(self._spans)):
+            traces.setdefault(span.trace_id, []).append(span)
+        return traces
+
+
+class JsonLinesExporter:
+    """
+    Appends finished spans to a JSON-lines file.
+
+    Attributes:
+        path (str): The path of the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.serialize(), default=str)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as file:
+                file.write(line + os.linesep)
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to exporters.
+
+    Attributes:
+        enabled (bool): Whether spans are created at all.
+        exporters (list): The exporters finished spans are handed to.
+    """
+    def __init__(self, enabled, exporters):
+        self.enabled = enabled
+        self.exporters = exporters
+
+    def start_span(self, name, trace_id=None, **attributes):
+        """
+        Starts a span and makes it the current one.
+
+        Args:
+            name (str): The name of the operation.
+            trace_id (str, optional): The trace ID for a root span. Defaults to the current
+                span's trace or a new one.
+            **attributes: Operation specific attributes.
+
+        Returns:
+            Span: The started span or None if tracing is disabled.
+        """
+        if not self.enabled:
+            return None
+        parent = _current_span.get()
+        if parent is not None and trace_id is None:
+            span = Span(name, parent.trace_id, parent.span_id, **attributes)
+        else:
+            span = Span(name, trace_id or new_trace_id(), **attributes)
+        span._token = _current_span.set(span)
+        return span
+
+    def finish_span(self, span, error=None):
+        """
+        Finishes a span started by start_span(), restores its parent as the current span and exports it.
+
+        Args:
+            span (Span): The span to finish. None is ignored.
+            error (Exception, optional): The error the operation failed with.
+        """
+        if span is None:
+            return
+        span.finish()
+        if error is not None:
+            span.error = f'{type(error).__name__}: {error}'
+        if span._token is not None:
+            _current_span.reset(span._token)
+            span._token = None
+        self._export(span)
+
+    def record_span(self, name, started_at, duration, **attributes):
+        """
+        Records an already finished child span of the current one.
+
+        Args:
+            name (str): The name of the operation.
+            started_at (float): The start time as returned by time.time().
+            duration (float): The duration in seconds.
+            **attributes: Operation specific attributes.
+        """
+        parent = _current_span.get()
+        if not self.enabled or parent is None:
+            return
+        span = Span(name, parent.trace_id, parent.span_id, **attributes)
+        span.started_at = started_at
+        span.duration = duration
+        self._export(span)
+
+    @contextmanager
+    def span(self, name, trace_id=None, **attributes):
+        """
+        Wraps a block in a span. Yields the span, which is None if tracing is disabled.
+        """
+        span = self.start_span(name, trace_id, **attributes)
+        try:
+            yield span
+        except BaseException as exc:
+            self.finish_span(span, exc)
+            raise
+        self.finish_span(span)
+
+    def traced(self, name=None):
+        """
+        Decorator wrapping every call of a function in a span named after its qualified name.
+        """
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def wrap(self, func):
+        """
+        Binds a function to the current span, so that spans it starts in another thread are children of it.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_span.set(parent)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current_span.reset(token)
+        return wrapper
+
+    def current_trace_id(self):
+        span = _current_span.get()
+        return span.trace_id if span is not None else None
+
+    def buffer(self):
+        """
+        Returns the ring buffer exporter or None if spans aren't kept in memory.
+        """
+        return next((exporter for exporter in self.exporters if isinstance(exporter, RingBufferExporter)), None)
+
+    def _export(self, span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as exc:
+                print(f"Error exporting a span: {str(exc)}")
+
+
+def traced_request(method, url, **kwargs):
+    """
+    Sends an HTTP request with the requests library in a span, propagating the trace ID.
+
+    Args:
+        method (str): The HTTP method.
+        url (str): The URL.
+        **kwargs: Arguments passed to requests.request().
+
+    Returns:
+        requests.Response: The response.
+    """
+    with tracer.span('http.client', method=method, url=url.split('?')[0]) as span:
+        if span is not None:
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), 'X-Trace-Id': span.trace_id}
+        response = requests.request(method, url, **kwargs)
+        if span is not None:
+            span.set_attribute('status', response.status_code)
+        return response
+
+
+def create_exporters(names, buffer_size, path):
+    """
+    Creates exporters by their names: 'memory' for the ring buffer and 'jsonl' for the JSON-lines file.
+    """
+    exporters = []
+    if 'memory' in names:
+        exporters.append(RingBufferExporter(buffer_size))
+    if 'jsonl' in names:
+        exporters.append(JsonLinesExporter(path))
+    return exporters
+
+
+tracer = Tracer(TRACING_ENABLED, create_exporters(TRACING_EXPORTERS, TRACING_BUFFER_SIZE, TRACING_FILE))
@@ -0,0 +1,12 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('traces/', views.get_traces, name='get_traces'),
+    path('traces/<str:trace_id>/', views.get_trace, name='get_trace'),
+    path('profiles/', views.get_profiles, name='get_profiles'),
+    path('profiles/monitor/', views.monitor_profiles, name='monitor_profiles'),
+    path('profiles/<str:profile_id>/', views.get_profile, name='get_profile'),
+    path('slow-commands/', views.slow_commands, name='slow_commands'),
+]
@@ -0,0 +1,218 @@
+"""
+This module contains views for inspecting diagnostics collected by the server.
+"""
+
+from django.http import JsonResponse
+from django_keycloak_auth.decorators import keycloak_roles
+from rest_framework.decorators import api_view
+
+from config.settings.base import PRINCIPAL_ROLE_NAME
+from .profiling import SORT_KEYS, monitor_profiler, profile_store, stats_rows
+from .slow_commands import SORT_KEYS as SLOW_COMMAND_SORT_KEYS, slow_command_log
+from .tracing import tracer
+
+
+def profile_params(request):
+    """
+    Returns the sort key and the row limit of a profile report from the query parameters.
+
+    Raises:
+        ValueError: If the parameters are invalid.
+    """
+    sort = request.GET.get('sort', 'cumulative')
+    if sort not in SORT_KEYS:
+        raise ValueError(f"sort should be one of: {', '.join(SORT_KEYS)}")
+    limit = int(request.GET.get('limit', 50))
+    if limit < 1:
+        raise ValueError("limit should be positive")
+    return sort, limit
+
+
+def trace_buffer_missing():
+    return JsonResponse(
+        {"error": "Spans aren't kept in memory. Add 'memory' to TRACING_EXPORTERS"},
+        status=404,
+        content_type='application/json'
+    )
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET'])
+def get_traces(request):
+    """
+    API endpoint to retrieve summaries of the most recent traces kept in memory.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: A JSON response containing a list of trace summaries, the most recent first.
+    """
+    buffer = tracer.buffer()
+    if buffer is None:
+        return trace_buffer_missing()
+
+    summaries = []
+    for trace_id, spans in buffer.traces().items():
+        root = next((span for span in spans if span.parent_id is None), None)
+        summaries.append({
+            'trace_id': trace_id,
+            'name': root.name if root else None,
+            'started_at': min(span.started_at for span in spans),
+            'duration_ms': round(root.duration * 1000, 3) if root else None,
+            'status': root.attributes.get('status') if root else None,
+            'spans': len(spans),
+        })
+    return JsonResponse(summaries, safe=False, content_type='application/json')
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET'])
+def get_trace(request, trace_id):
+    """
+    API endpoint to retrieve all spans of a trace kept in memory.
+
+    Args:
+        request (HttpRequest): The request object.
+        trace_id (str): The ID of the trace.
+
+    Returns:
+        JsonResponse: A JSON response containing the spans ordered by start time.
+    """
+    buffer = tracer.buffer()
+    if buffer is None:
+        return trace_buffer_missing()
+
+    spans = buffer.traces().get(trace_id)
+    if not spans:
+        return JsonResponse(
+            {"error": f"Trace {trace_id} not found"},
+            status=404,
+            content_type='application/json'
+        )
+    return JsonResponse(
+        [span.serialize() for span in sorted(spans, key=lambda span: span.started_at)],
+        safe=False,
+        content_type='application/json'
+    )
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET'])
+def get_profiles(request):
+    """
+    API endpoint to retrieve summaries of the request profiles kept in memory.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: A JSON response containing a list of profile summaries, the most recent first.
+    """
+    return JsonResponse(
+        [profile.summary() for profile in profile_store.all()],
+        safe=False,
+        content_type='application/json'
+    )
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET'])
+def get_profile(request, profile_id):
+    """
+    API endpoint to retrieve the most expensive functions of a request profile.
+
+    Args:
+        request (HttpRequest): The request object.
+        profile_id (str): The ID of the profile.
+
+    Returns:
+        JsonResponse: A JSON response containing the profile summary and its functions.
+    """
+    try:
+        sort, limit = profile_params(request)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400, content_type='application/json')
+
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        return JsonResponse(
+            {"error": f"Profile {profile_id} not found"},
+            status=404,
+            content_type='application/json'
+        )
+    return JsonResponse(
+        {**profile.summary(), 'functions': stats_rows(profile.stats, sort, limit) if profile.stats else []},
+        content_type='application/json'
+    )
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET', 'DELETE'])
+def monitor_profiles(request):
+    """
+    API endpoint to retrieve or reset the profiles accumulated over monitor cycles.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: A JSON response containing the number of runs and the most expensive
+            functions keyed by monitor operation.
+    """
+    if request.method == 'DELETE':
+        monitor_profiler.reset()
+        return JsonResponse({"message": "Monitor profiles reset"}, content_type='application/json')
+
+    try:
+        sort, limit = profile_params(request)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400, content_type='application/json')
+
+    return JsonResponse(
+        {
+            'enabled': monitor_profiler.enabled,
+            'clock': monitor_profiler.clock,
+            'operations': monitor_profiler.report(sort, limit),
+        },
+        content_type='application/json'
+    )
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET', 'DELETE'])
+def slow_commands(request):
+    """
+    API endpoint to retrieve or reset the PowerShell commands slower than SLOW_COMMAND_THRESHOLD.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: A JSON response containing the slow commands aggregated by fingerprint,
+            the costliest first, and the most recent slow commands.
+    """
+    if request.method == 'DELETE':
+        slow_command_log.reset()
+        return JsonResponse({"message": "Slow commands reset"}, content_type='application/json')
+
+    sort = request.GET.get('sort', 'total')
+    try:
+        if sort not in SLOW_COMMAND_SORT_KEYS:
+            raise ValueError(f"sort should be one of: {', '.join(SLOW_COMMAND_SORT_KEYS)}")
+        limit = int(request.GET.get('limit', 20))
+        if limit < 1:
+            raise ValueError("limit should be positive")
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=400, content_type='application/json')
+
+    entries = slow_command_log.entries()
+    return JsonResponse(
+        {
+            'threshold_ms': round(slow_command_log.threshold * 1000, 3),
+            'entries': len(entries),
+            'offenders': slow_command_log.offenders(sort, limit),
+            'recent': entries[-limit:][::-1],
+        },
+        content_type='application/json'
+    )
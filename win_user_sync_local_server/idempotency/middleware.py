@@ -0,0 +1,106 @@
+"""
+This module contains the middleware executing mutation requests with the same Idempotency-Key once.
+"""
+
+import hashlib
+import uuid
+
+from django.db import DatabaseError
+from django.http import HttpResponse, JsonResponse
+
+from config.settings.base import (
+    IDEMPOTENCY_CLAIM_SECONDS,
+    IDEMPOTENCY_ENABLED,
+    IDEMPOTENCY_MAX_ENTRIES,
+    IDEMPOTENCY_STORE,
+    IDEMPOTENCY_TTL,
+    IDEMPOTENCY_WAIT
+)
+from .store import IDEMPOTENCY_STORES, IdempotencyBusy, IdempotencyMismatch, StoredResponse
+from ..admission.middleware import token_subject
+from ..state.digest import sha256
+
+MUTATION_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+MAX_KEY_LENGTH = 255
+
+idempotency_store = IDEMPOTENCY_STORES[IDEMPOTENCY_STORE](
+    IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_ENTRIES, IDEMPOTENCY_WAIT, IDEMPOTENCY_CLAIM_SECONDS
+)
+
+
+def request_fingerprint(request):
+    """
+    Hashes the query string and the body of a request, to tell whether a key is reused for another request.
+    """
+    digest = hashlib.sha256(request.META.get('QUERY_STRING', '').encode('utf-8'))
+    digest.update(b'\x1f')
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+class IdempotencyMiddleware:
+    """
+    Replays the response of the first mutation request with an Idempotency-Key to retries with the same key.
+
+    Keys are scoped by the token subject, the method and the path. Responses with a 5xx status
+    aren't kept, so that retries of failed requests execute again. Should be placed after the
+    Keycloak and admission control middleware, so that only authorized, admitted requests are
+    replayed and rejected ones don't claim keys.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        except Exception:
+            self._finish(request, None)
+            raise
+        self._finish(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not IDEMPOTENCY_ENABLED or request.method not in MUTATION_METHODS:
+            return None
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return None
+        if len(key) > MAX_KEY_LENGTH:
+            return JsonResponse(
+                {"error": f"Idempotency-Key should be at most {MAX_KEY_LENGTH} characters long"},
+                status=400,
+                content_type='application/json'
+            )
+
+        scoped_key = sha256(token_subject(request) or '', request.method, request.path, key)
+        owner = uuid.uuid4().hex
+        try:
+            stored = idempotency_store.begin(scoped_key, request_fingerprint(request), owner)
+        except IdempotencyMismatch as exc:
+            return JsonResponse({"error": str(exc)}, status=422, content_type='application/json')
+        except IdempotencyBusy as exc:
+            response = JsonResponse({"error": str(exc)}, status=409, content_type='application/json')
+            response['Retry-After'] = str(exc.retry_after)
+            return response
+
+        if stored is not None:
+            response = HttpResponse(stored.body, status=stored.status, content_type=stored.content_type)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        request.idempotency_claim = (scoped_key, owner)
+        return None
+
+    def _finish(self, request, response):
+        claim = getattr(request, 'idempotency_claim', None)
+        if claim is None:
+            return
+        key, owner = claim
+        try:
+            if response is None or response.status_code >= 500 or getattr(response, 'streaming', False):
+                idempotency_store.abandon(key, owner)
+            else:
+                idempotency_store.complete(
+                    key, owner, StoredResponse(response.status_code, response.get('Content-Type', ''), response.content)
+                )
+        except DatabaseError as exc:
+            print(f"Error storing the idempotent response: {str(exc)}")
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.7 on 2026-10-19 01:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('completed', models.BooleanField(default=False)),
+                ('status', models.IntegerField(null=True)),
+                ('content_type', models.CharField(blank=True, max_length=256)),
+                ('body', models.BinaryField(default=b'')),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-19 01:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('idempotency', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencyrecord',
+            name='owner',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
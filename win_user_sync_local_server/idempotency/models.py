@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class IdempotencyRecord(models.Model):
+    key = models.CharField(max_length=64, unique=True)
+    fingerprint = models.CharField(max_length=64)
+    owner = models.CharField(max_length=32, blank=True)
+    completed = models.BooleanField(default=False)
+    status = models.IntegerField(null=True)
+    content_type = models.CharField(max_length=256, blank=True)
+    body = models.BinaryField(default=b'')
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f'{self.key} {"completed" if self.completed else "pending"}'
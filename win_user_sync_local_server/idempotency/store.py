@@ -0,0 +1,225 @@
+"""
+This module contains stores of responses to requests carrying an Idempotency-Key header.
+
+A store hands out a claim for the first request with a key and keeps its response when it
+completes, so that retries with the same key get that response without executing again.
+Retries arriving while the first request is still running wait for its response.
+
+A claim is held by an owner token and lasts for the claim lifetime, after which the key is
+free again, e.g. if the worker running the request died. complete() and abandon() only apply
+to a claim still held by their owner, so a request outliving its claim doesn't touch the claim
+or the response of the request that took the key over.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.utils import timezone
+
+from .models import IdempotencyRecord
+
+
+class IdempotencyMismatch(Exception):
+    """
+    Raised when a key is reused for a different request.
+    """
+
+
+class IdempotencyBusy(Exception):
+    """
+    Raised when the request holding a key is still running after the wait.
+
+    Attributes:
+        retry_after (int): The number of seconds after which the request may be retried.
+    """
+    def __init__(self, retry_after):
+        super().__init__('A request with the same Idempotency-Key is still running')
+        self.retry_after = retry_after
+
+
+class StoredResponse:
+    """
+    The parts of a response replayed to retries.
+
+    Attributes:
+        status (int): The status code.
+        content_type (str): The Content-Type header.
+        body (bytes): The body.
+    """
+    def __init__(self, status, content_type, body):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+
+
+class MemoryIdempotencyStore:
+    """
+    Keeps responses in memory, evicting them after the TTL or the oldest ones beyond the maximum number.
+
+    Attributes:
+        ttl (float): The number of seconds a response is kept.
+        max_entries (int): The maximum number of responses kept.
+        wait (float): The number of seconds a retry waits for the request holding its key.
+        claim_seconds (float): The number of seconds a claim lasts.
+    """
+    def __init__(self, ttl, max_entries, wait, claim_seconds):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait = wait
+        self.claim_seconds = claim_seconds
+        self._lock = threading.Lock()
+        # Completed responses by key as (fingerprint, response, expiry), the oldest first
+        self._completed = OrderedDict()
+        # Running requests by key as (fingerprint, owner, claim expiry, event set when they complete or are abandoned)
+        self._pending = {}
+
+    def begin(self, key, fingerprint, owner):
+        """
+        Claims a key or returns the response of the request that claimed it first.
+
+        Args:
+            key (str): The scoped idempotency key.
+            fingerprint (str): The hash of the request, to detect keys reused for other requests.
+            owner (str): A token unique to the request, holding the claim.
+
+        Returns:
+            StoredResponse: The response to replay, or None if the caller claimed the key and
+                should call complete() or abandon() once it's done.
+
+        Raises:
+            IdempotencyMismatch: If the key was used for a different request.
+            IdempotencyBusy: If the request holding the key runs longer than the wait.
+        """
+        deadline = time.monotonic() + self.wait
+        while True:
+            with self._lock:
+                self._evict()
+                if key in self._completed:
+                    stored_fingerprint, response, _ = self._completed[key]
+                    if stored_fingerprint != fingerprint:
+                        raise IdempotencyMismatch('The Idempotency-Key was used for a different request')
+                    return response
+                if key in self._pending and self._pending[key][2] <= time.monotonic():
+                    # Wakes the retries waiting for the expired claim, to wait for the new one
+                    self._pending.pop(key)[3].set()
+                if key not in self._pending:
+                    self._pending[key] = (fingerprint, owner, time.monotonic() + self.claim_seconds, threading.Event())
+                    return None
+                stored_fingerprint, _, _, done = self._pending[key]
+                if stored_fingerprint != fingerprint:
+                    raise IdempotencyMismatch('The Idempotency-Key was used for a different request')
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not done.wait(remaining):
+                raise IdempotencyBusy(max(1, round(self.wait)))
+
+    def complete(self, key, owner, response):
+        """
+        Keeps the response of a key claimed by the owner and wakes the retries waiting for it.
+        """
+        with self._lock:
+            if key not in self._pending or self._pending[key][1] != owner:
+                return
+            fingerprint, _, _, done = self._pending.pop(key)
+            self._completed[key] = (fingerprint, response, time.monotonic() + self.ttl)
+            self._evict()
+        done.set()
+
+    def abandon(self, key, owner):
+        """
+        Gives a key claimed by the owner up without a response, so that the next request with it executes.
+        """
+        with self._lock:
+            if key not in self._pending or self._pending[key][1] != owner:
+                return
+            done = self._pending.pop(key)[3]
+        done.set()
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._completed:
+            key, (_, _, expires_at) = next(iter(self._completed.items()))
+            if expires_at > now and len(self._completed) <= self.max_entries:
+                break
+            del self._completed[key]
+
+
+class DatabaseIdempotencyStore:
+    """
+    Keeps responses in the database, so that retries reaching another worker are answered as well.
+
+    A claim is a pending row holding the owner token. It expires after the claim lifetime, so a
+    worker dying while running a request doesn't block its key for longer.
+
+    Attributes:
+        ttl (float): The number of seconds a response is kept.
+        max_entries (int): The maximum number of responses kept.
+        wait (float): The number of seconds a retry waits for the request holding its key.
+        claim_seconds (float): The number of seconds a claim lasts.
+        poll_interval (float): The number of seconds between checks of a pending row.
+    """
+    def __init__(self, ttl, max_entries, wait, claim_seconds, poll_interval=0.1):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.wait = wait
+        self.claim_seconds = claim_seconds
+        self.poll_interval = poll_interval
+
+    def begin(self, key, fingerprint, owner):
+        """
+        Claims a key or returns the response of the request that claimed it first, see MemoryIdempotencyStore.begin().
+        """
+        deadline = time.monotonic() + self.wait
+        while True:
+            now = timezone.now()
+            IdempotencyRecord.objects.filter(expires_at__lt=now).delete()
+            # Single statements only: SQLite fails transactions upgrading from reading to writing when contended
+            try:
+                IdempotencyRecord.objects.create(
+                    key=key, fingerprint=fingerprint, owner=owner, expires_at=now + timedelta(seconds=self.claim_seconds)
+                )
+                return None
+            except IntegrityError:
+                pass
+
+            record = IdempotencyRecord.objects.filter(key=key).first()
+            if record is None:
+                continue
+            if record.fingerprint != fingerprint:
+                raise IdempotencyMismatch('The Idempotency-Key was used for a different request')
+            if record.completed:
+                return StoredResponse(record.status, record.content_type, bytes(record.body))
+            if time.monotonic() >= deadline:
+                raise IdempotencyBusy(max(1, round(min(self.wait, (record.expires_at - now).total_seconds()))))
+            time.sleep(self.poll_interval)
+
+    def complete(self, key, owner, response):
+        """
+        Keeps the response of a key claimed by the owner and drops the oldest responses beyond the maximum number.
+        """
+        IdempotencyRecord.objects.filter(key=key, owner=owner, completed=False).update(
+            completed=True,
+            status=response.status,
+            content_type=response.content_type,
+            body=response.body,
+            expires_at=timezone.now() + timedelta(seconds=self.ttl)
+        )
+        excess = IdempotencyRecord.objects.filter(completed=True).count() - self.max_entries
+        if excess > 0:
+            oldest = IdempotencyRecord.objects.filter(completed=True).order_by('expires_at').values_list('pk', flat=True)
+            IdempotencyRecord.objects.filter(pk__in=list(oldest[:excess])).delete()
+
+    def abandon(self, key, owner):
+        """
+        Gives a key claimed by the owner up without a response, so that the next request with it executes.
+        """
+        IdempotencyRecord.objects.filter(key=key, owner=owner, completed=False).delete()
+
+
+IDEMPOTENCY_STORES = {
+    'memory': MemoryIdempotencyStore,
+    'database': DatabaseIdempotencyStore,
+}
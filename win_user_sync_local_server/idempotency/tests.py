@@ -0,0 +1,28 @@
+from django.test import TransactionTestCase
+
+from .store import DatabaseIdempotencyStore, MemoryIdempotencyStore, StoredResponse
+
+
+class ClaimOwnershipTests(TransactionTestCase):
+    """
+    A request outliving its claim doesn't touch the claim or the response of the request that took the key over.
+
+    Not wrapped in a transaction, since the database store relies on failed inserts in autocommit mode.
+    """
+    def assert_expired_claim_is_kept_by_new_owner(self, store):
+        self.assertIsNone(store.begin('key', 'fingerprint', 'first'))
+        # The claim of 'first' expires right away, so the retry takes the key over
+        self.assertIsNone(store.begin('key', 'fingerprint', 'retry'))
+
+        store.complete('key', 'first', StoredResponse(201, 'application/json', b'first'))
+        store.abandon('key', 'first')
+        store.complete('key', 'retry', StoredResponse(201, 'application/json', b'retry'))
+
+        store.claim_seconds = 60
+        self.assertEqual(store.begin('key', 'fingerprint', 'other').body, b'retry')
+
+    def test_database_store(self):
+        self.assert_expired_claim_is_kept_by_new_owner(DatabaseIdempotencyStore(60, 10, 1, claim_seconds=-1))
+
+    def test_memory_store(self):
+        self.assert_expired_claim_is_kept_by_new_owner(MemoryIdempotencyStore(60, 10, 1, claim_seconds=0))
@@ -0,0 +1,88 @@
+"""
+This module contains the middleware compressing responses with brotli or gzip.
+"""
+
+import gzip
+import re
+
+from django.utils.cache import patch_vary_headers
+
+from config.settings.base import COMPRESSION_MIN_LENGTH
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODING_PATTERN = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*$')
+
+# Fast levels keep the compression time well below the serialization time
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def accepted_encodings(header):
+    """
+    Parses the Accept-Encoding header.
+
+    Returns:
+        dict: Quality values keyed by lowercase encoding.
+    """
+    encodings = {}
+    for part in header.split(','):
+        match = ENCODING_PATTERN.match(part)
+        if match:
+            try:
+                encodings[match.group(1).lower()] = float(match.group(2) or 1)
+            except ValueError:
+                continue
+    return encodings
+
+
+def choose_encoding(header):
+    """
+    Returns 'br' or 'gzip', whichever the client accepts with the higher quality, preferring 'br' on a tie.
+    """
+    encodings = accepted_encodings(header)
+    candidates = (['br'] if brotli is not None else []) + ['gzip']
+    qualities = {encoding: encodings.get(encoding, encodings.get('*', 0)) for encoding in candidates}
+    best = max(candidates, key=lambda encoding: qualities[encoding])
+    return best if qualities[best] > 0 else None
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least COMPRESSION_MIN_LENGTH bytes with brotli, if installed, or gzip.
+
+    Streaming responses, such as change events, are left untouched.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < COMPRESSION_MIN_LENGTH:
+            return response
+
+        encoding = choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding == 'br':
+            compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        elif encoding == 'gzip':
+            compressed = gzip.compress(response.content, compresslevel=GZIP_LEVEL, mtime=0)
+        else:
+            return response
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        if response.has_header('ETag'):
+            # A weak ETag stays valid for the compressed representation
+            etag = response['ETag']
+            response['ETag'] = etag if etag.startswith('W/') else f'W/{etag}'
+        return response
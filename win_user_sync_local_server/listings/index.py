@@ -0,0 +1,396 @@
+"""
+This module contains indexes answering filtered, paginated listings from a cached snapshot.
+
+Users and user groups are kept sorted by their lowercase name, so a prefix is a range found
+by bisection and pages continue after the last name of the previous one. Substrings of three
+or more characters are looked up in a trigram index built on first use, shorter ones are found
+with str.find() on all names joined in the same order, so matches come out sorted either way.
+Enabled users, the members of user groups, found on first use, and user groups by member
+count are kept as sorted positions. A query walks the most selective of its conditions and checks the others
+for every position it visits, stopping once the page is full.
+
+Indexes are built once per snapshot. The snapshot of this machine is taken again once older
+than LISTING_INDEX_MAX_AGE seconds or when a change was recorded to the change log after it.
+"""
+
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import islice
+from urllib.parse import urlencode
+
+from config.settings.base import LISTING_INDEX_MAX_AGE
+from ..accounts.store import account_store_for
+from ..change_log.recorder import change_recorder
+from ..diagnostics.tracing import tracer
+from ..state.shared import local_snapshot
+from ..state.snapshot import LocalSnapshot
+
+LISTING_PARAMETERS = ('prefix', 'contains', 'enabled', 'member_of', 'min_members', 'limit', 'after')
+USER_PARAMETERS = ('prefix', 'contains', 'enabled', 'member_of', 'limit', 'after')
+USERGROUP_PARAMETERS = ('prefix', 'contains', 'min_members', 'limit', 'after')
+# Sorts after every character, to find the end of a prefix range
+HIGHEST_CHARACTER = '\U0010ffff'
+TRIGRAM_LENGTH = 3
+
+
+class InvalidListingQuery(Exception):
+    """
+    Raised when a filter or pagination parameter has an invalid value.
+    """
+
+
+class Page:
+    """
+    A page of a listing.
+
+    Attributes:
+        items (list): The users or user groups of the page.
+        next_after (str): The value of the 'after' parameter of the next page or None if this is the last page.
+    """
+    def __init__(self, items, next_after):
+        self.items = items
+        self.next_after = next_after
+
+
+class Condition:
+    """
+    A filter of a query, walked in name order or checked for a single position.
+
+    Attributes:
+        size (int): The number of positions matching the condition or None if unknown.
+        positions: Takes a start position and returns the matching positions from it on, ascending.
+        test: Takes a position and returns whether it matches.
+    """
+    def __init__(self, size, positions, test):
+        self.size = size
+        self.positions = positions
+        self.test = test
+
+    @classmethod
+    def sorted_positions(cls, positions, test):
+        """
+        Creates a condition from ascending positions.
+        """
+        return cls(len(positions), lambda start: islice(positions, bisect_left(positions, start), None), test)
+
+
+class NameIndex:
+    """
+    Keeps items sorted by their lowercase name, searchable by prefix and substring.
+
+    Attributes:
+        items (list): The items, sorted by name.
+        keys (list): The lowercase names of the items, in the same order.
+    """
+    parameters = ('prefix', 'contains', 'limit', 'after')
+
+    def __init__(self, items, name):
+        self.items = sorted(items, key=lambda item: name(item).lower())
+        self.keys = [name(item).lower() for item in self.items]
+        self._positions = {key: position for position, key in enumerate(self.keys)}
+        self._trigrams = None
+        # Names can't contain newlines, so no substring match spans two of them
+        self.text = '\n'.join(self.keys)
+        self.offsets = []
+        offset = 0
+        for key in self.keys:
+            self.offsets.append(offset)
+            offset += len(key) + 1
+
+    def query(self, params):
+        """
+        Returns a page of the items matching the filters.
+
+        Args:
+            params (QueryDict): The URL parameters of the listing.
+
+        Returns:
+            Page: The matching items after the 'after' name, at most 'limit' of them.
+
+        Raises:
+            InvalidListingQuery: If a parameter has an invalid value or doesn't apply to the listing.
+        """
+        unknown = [parameter for parameter in LISTING_PARAMETERS
+                   if parameter in params and parameter not in self.parameters]
+        if unknown:
+            raise InvalidListingQuery(f"{', '.join(unknown)} can't filter this listing")
+        limit = positive_integer(params, 'limit')
+        after = params.get('after')
+        start = bisect_right(self.keys, after.lower()) if after else 0
+        conditions = self.conditions(params)
+
+        # Walk the condition with the fewest positions, a short substring search only if it's the only one
+        size = len(self.keys)
+        driver = min(conditions, key=lambda condition: size if condition.size is None else condition.size, default=None)
+        positions = driver.positions(start) if driver is not None else range(start, size)
+        others = [condition.test for condition in conditions if condition is not driver]
+        found = []
+        for position in positions:
+            for test in others:
+                if not test(position):
+                    break
+            else:
+                found.append(position)
+                if limit is not None and len(found) > limit:
+                    break
+
+        if limit is not None and len(found) > limit:
+            found = found[:limit]
+            return Page([self.items[position] for position in found], self.keys[found[-1]])
+        return Page([self.items[position] for position in found], None)
+
+    def conditions(self, params):
+        """
+        Returns the conditions of the filters in the parameters.
+        """
+        conditions = []
+        prefix = params.get('prefix')
+        if prefix:
+            low = bisect_left(self.keys, prefix.lower())
+            high = bisect_left(self.keys, prefix.lower() + HIGHEST_CHARACTER)
+            conditions.append(Condition(
+                high - low,
+                lambda start: range(max(start, low), high),
+                lambda position: low <= position < high
+            ))
+        contains = params.get('contains')
+        if contains:
+            conditions.append(self._contains_condition(contains.lower()))
+        return conditions
+
+    def _contains_condition(self, term):
+        """
+        Returns the condition of names containing a term, narrowed down by its rarest trigram if it has any.
+        """
+        def test(position):
+            return term in self.keys[position]
+
+        if len(term) < TRIGRAM_LENGTH:
+            return Condition(None, lambda start: self._containing(term, start), test)
+        trigrams = self._trigram_index()
+        candidates = min(
+            (trigrams.get(term[i:i + TRIGRAM_LENGTH], []) for i in range(len(term) - TRIGRAM_LENGTH + 1)), key=len
+        )
+        return Condition(
+            len(candidates),
+            lambda start: (
+                position for position in islice(candidates, bisect_left(candidates, start), None) if test(position)
+            ),
+            test
+        )
+
+    def _trigram_index(self):
+        """
+        Returns the ascending positions of the names containing every trigram, building them on first use.
+        """
+        if self._trigrams is None:
+            with tracer.span('listing_index.trigrams', items=len(self.keys)):
+                trigrams = defaultdict(list)
+                for position, key in enumerate(self.keys):
+                    for trigram in {key[i:i + TRIGRAM_LENGTH] for i in range(len(key) - TRIGRAM_LENGTH + 1)}:
+                        trigrams[trigram].append(position)
+                self._trigrams = dict(trigrams)
+        return self._trigrams
+
+    def _containing(self, term, start):
+        """
+        Yields the positions of the names containing a term from a start position on.
+        """
+        if '\n' in term or start >= len(self.keys):
+            return
+        offset = self.offsets[start]
+        while True:
+            found = self.text.find(term, offset)
+            if found < 0:
+                return
+            position = bisect_right(self.offsets, found) - 1
+            yield position
+            if position + 1 >= len(self.offsets):
+                return
+            offset = self.offsets[position + 1]
+
+
+class UserIndex(NameIndex):
+    """
+    Indexes users by name, whether they're enabled and the user groups they're members of.
+    """
+    parameters = USER_PARAMETERS
+
+    def __init__(self, users, usergroups):
+        super().__init__(users, lambda user: user.username)
+        self._enabled = {
+            value: [position for position, user in enumerate(self.items) if user.enabled is value]
+            for value in (True, False)
+        }
+        self._usergroups = {usergroup.name.lower(): usergroup for usergroup in usergroups}
+        self._members = {}
+
+    def conditions(self, params):
+        conditions = super().conditions(params)
+        enabled = params.get('enabled')
+        if enabled is not None:
+            if enabled.lower() not in ('true', 'false'):
+                raise InvalidListingQuery('enabled should be true or false')
+            value = enabled.lower() == 'true'
+            conditions.append(Condition.sorted_positions(
+                self._enabled[value], lambda position: self.items[position].enabled is value
+            ))
+        member_of = params.get('member_of')
+        if member_of is not None:
+            positions, members = self._member_positions(member_of.lower())
+            conditions.append(Condition.sorted_positions(positions, members.__contains__))
+        return conditions
+
+    def _member_positions(self, name):
+        """
+        Returns the positions of the members of a user group, sorted and as a set, finding them on first use.
+        """
+        if name not in self._members:
+            usergroup = self._usergroups.get(name)
+            position = self._positions.get
+            positions = {position(user.username.lower()) for user in usergroup.users} if usergroup else set()
+            positions.discard(None)
+            self._members[name] = (sorted(positions), positions)
+        return self._members[name]
+
+
+class UsergroupIndex(NameIndex):
+    """
+    Indexes user groups by name and number of members.
+    """
+    parameters = USERGROUP_PARAMETERS
+
+    def __init__(self, usergroups):
+        super().__init__(usergroups, lambda usergroup: usergroup.name)
+        self._counts = [len(usergroup.users) for usergroup in self.items]
+        # Positions by number of members, to find the user groups with at least a number of members by bisection
+        self._by_count = sorted(range(len(self.items)), key=self._counts.__getitem__)
+        self._sorted_counts = [self._counts[position] for position in self._by_count]
+        # Ascending positions of the user groups with at least a number of members, by the first of them in _by_count
+        self._at_least = {}
+
+    def conditions(self, params):
+        conditions = super().conditions(params)
+        if 'min_members' in params:
+            minimum = positive_integer(params, 'min_members', allow_zero=True)
+            conditions.append(Condition.sorted_positions(
+                self._positions_at_least(minimum), lambda position: self._counts[position] >= minimum
+            ))
+        return conditions
+
+    def _positions_at_least(self, minimum):
+        """
+        Returns the ascending positions of the user groups with at least a number of members, sorting them on first use.
+        """
+        first = bisect_left(self._sorted_counts, minimum)
+        if first not in self._at_least:
+            self._at_least[first] = sorted(self._by_count[first:])
+        return self._at_least[first]
+
+
+class ListingIndex:
+    """
+    The user and user group indexes of a snapshot.
+
+    Attributes:
+        users (UserIndex): The user index.
+        usergroups (UsergroupIndex): The user group index.
+    """
+    def __init__(self, snapshot):
+        with tracer.span('listing_index.build', users=len(snapshot.users), usergroups=len(snapshot.usergroups)):
+            self.users = UserIndex(snapshot.users, snapshot.usergroups)
+            self.usergroups = UsergroupIndex(snapshot.usergroups)
+
+
+class ListingIndexCache:
+    """
+    Keeps the listing index of every host, building it again from a new snapshot when it's stale.
+
+    Attributes:
+        max_age (float): The number of seconds an index is used for.
+    """
+    def __init__(self, max_age):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._refresh_locks = {}
+        self._indexes = {}
+
+    def get(self, host):
+        """
+        Returns the index of a host.
+
+        Args:
+            host (str): The remote host or None for this machine.
+
+        Returns:
+            ListingIndex: The index.
+        """
+        # Changes to remote hosts aren't recorded to the change log, so only their age counts
+        revision = change_recorder.current_revision() if host is None else None
+        cached = self._indexes.get(host)
+        if self._usable(cached, revision):
+            return cached[0]
+
+        with self._lock:
+            refresh_lock = self._refresh_locks.setdefault(host, threading.Lock())
+        # Concurrent requests for the same host wait for a single build
+        with refresh_lock:
+            cached = self._indexes.get(host)
+            if self._usable(cached, revision):
+                return cached[0]
+            index = ListingIndex(listing_snapshot(host))
+            self._indexes[host] = (index, revision, time.monotonic())
+            return index
+
+    def _usable(self, cached, revision):
+        return cached is not None and cached[1] == revision and time.monotonic() - cached[2] <= self.max_age
+
+
+def listing_snapshot(host):
+    """
+    Returns the snapshot of this machine, shared between workers if configured, or lists a remote host.
+    """
+    if host is None:
+        return local_snapshot()
+    store = account_store_for(host)
+    return LocalSnapshot(store.get_users(), store.get_usergroups())
+
+
+def positive_integer(params, name, allow_zero=False):
+    """
+    Returns a positive integer URL parameter, or zero if allowed, or None if it's missing.
+
+    Raises:
+        InvalidListingQuery: If the parameter has another value.
+    """
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0 or (number == 0 and not allow_zero):
+        raise InvalidListingQuery(f'{name} should be a positive integer')
+    return number
+
+
+def is_indexed_query(params):
+    """
+    Returns whether a listing request has filter or pagination parameters, to be answered from the index.
+    """
+    return any(parameter in params for parameter in LISTING_PARAMETERS)
+
+
+def next_page_link(request, next_after):
+    """
+    Returns the Link header pointing to the next page, keeping the other URL parameters.
+    """
+    params = request.query_params.copy()
+    params['after'] = next_after
+    return f'<{request.build_absolute_uri(request.path)}?{urlencode(list(params.lists()), doseq=True)}>; rel="next"'
+
+
+listing_indexes = ListingIndexCache(LISTING_INDEX_MAX_AGE)
@@ -0,0 +1,77 @@
+"""
+This module contains renderers for compact encodings of listings.
+
+Listing views negotiate the encoding with the Accept header or the 'format' URL parameter:
+'application/json' (the default), 'application/x-ndjson' and, if the msgpack package is
+installed, 'application/msgpack'. Rendering is traced in a 'serialize' span.
+"""
+
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from ..diagnostics.tracing import tracer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class TracedRenderer:
+    """
+    Traces the rendering of the renderer it's mixed into, listed before it in the bases.
+
+    DRF renders the response after the view has returned, so the span can't be opened by the view.
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with tracer.span('serialize', format=self.format):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Renders every item of a list as a JSON line. Anything else is rendered as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        items = data if isinstance(data, list) else [data]
+        return b''.join(json.dumps(item, separators=(',', ':')).encode('utf-8') + b'\n' for item in items)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renders data as MessagePack.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return msgpack.packb(data, use_bin_type=True)
+
+
+class TracedJSONRenderer(TracedRenderer, JSONRenderer):
+    """
+    Renders JSON, traced.
+    """
+
+
+class TracedNDJSONRenderer(TracedRenderer, NDJSONRenderer):
+    """
+    Renders NDJSON, traced.
+    """
+
+
+class TracedMessagePackRenderer(TracedRenderer, MessagePackRenderer):
+    """
+    Renders MessagePack, traced.
+    """
+
+
+LISTING_RENDERERS = [TracedJSONRenderer, TracedNDJSONRenderer] + (
+    [TracedMessagePackRenderer] if msgpack is not None else []
+)
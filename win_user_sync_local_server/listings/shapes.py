@@ -0,0 +1,31 @@
+"""
+This module contains functions shaping listings.
+"""
+
+DEDUP_SHAPE = 'dedup'
+
+
+def deduplicate_usergroups(usergroups):
+    """
+    Lists every member username once and refers to it from user groups by index.
+
+    Args:
+        usergroups (list): A list of Usergroup objects.
+
+    Returns:
+        dict: 'users', the sorted usernames, and 'usergroups', their names, descriptions and
+            member indexes into 'users'.
+    """
+    usernames = sorted({user.username for usergroup in usergroups for user in usergroup.users})
+    index = {username: position for position, username in enumerate(usernames)}
+    return {
+        'users': usernames,
+        'usergroups': [
+            {
+                'name': usergroup.name,
+                'description': usergroup.description,
+                'users': [index[user.username] for user in usergroup.users],
+            }
+            for usergroup in usergroups
+        ],
+    }
@@ -0,0 +1,69 @@
+from django.http import QueryDict
+from django.test import SimpleTestCase
+
+from .index import InvalidListingQuery, UserIndex, UsergroupIndex
+from ..user_groups.usergroups_scripts import Usergroup
+from ..users.user_scripts import User
+
+
+def query(index, params):
+    page = index.query(QueryDict(params))
+    return [getattr(item, 'username', None) or item.name for item in page.items], page.next_after
+
+
+class UserIndexTests(SimpleTestCase):
+    """
+    Filtered, paginated user listings.
+    """
+    def setUp(self):
+        users = [
+            User('alice', enabled=True), User('Alfred', enabled=False), User('bob', enabled=True),
+            User('carol', enabled=True), User('malice', enabled=False), User('al', enabled=None),
+        ]
+        usergroups = [Usergroup('staff', '', [User('bob'), User('ALICE'), User('ghost')])]
+        self.index = UserIndex(users, usergroups)
+
+    def test_prefix_matches_case_insensitively_in_name_order(self):
+        self.assertEqual(query(self.index, 'prefix=AL'), (['al', 'Alfred', 'alice'], None))
+
+    def test_short_and_long_substrings_match_the_same_way(self):
+        self.assertEqual(query(self.index, 'contains=li'), (['alice', 'malice'], None))
+        self.assertEqual(query(self.index, 'contains=lic'), (['alice', 'malice'], None))
+        self.assertEqual(query(self.index, 'contains=xyz'), ([], None))
+
+    def test_filters_combine(self):
+        self.assertEqual(query(self.index, 'enabled=false&contains=al'), (['Alfred', 'malice'], None))
+        self.assertEqual(query(self.index, 'member_of=STAFF&prefix=a'), (['alice'], None))
+        self.assertEqual(query(self.index, 'member_of=nobody'), ([], None))
+
+    def test_pages_continue_after_the_last_name(self):
+        self.assertEqual(query(self.index, 'limit=2'), (['al', 'Alfred'], 'alfred'))
+        self.assertEqual(query(self.index, 'limit=2&after=alfred'), (['alice', 'bob'], 'bob'))
+        self.assertEqual(query(self.index, 'limit=2&after=bob'), (['carol', 'malice'], None))
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in ('limit=0', 'limit=x', 'enabled=maybe', 'min_members=1'):
+            with self.assertRaises(InvalidListingQuery):
+                self.index.query(QueryDict(params))
+
+
+class UsergroupIndexTests(SimpleTestCase):
+    """
+    Filtered, paginated user group listings.
+    """
+    def setUp(self):
+        self.index = UsergroupIndex([
+            Usergroup(name, '', [User(f'user{index}') for index in range(count)])
+            for name, count in (('delta', 3), ('alpha', 0), ('charlie', 5), ('bravo', 3), ('echo', 1))
+        ])
+
+    def test_min_members_lists_in_name_order(self):
+        self.assertEqual(query(self.index, 'min_members=3'), (['bravo', 'charlie', 'delta'], None))
+        self.assertEqual(query(self.index, 'min_members=0'), (['alpha', 'bravo', 'charlie', 'delta', 'echo'], None))
+        self.assertEqual(query(self.index, 'min_members=6'), ([], None))
+
+    def test_min_members_pages_and_combines(self):
+        self.assertEqual(query(self.index, 'min_members=1&limit=2&after=bravo'), (['charlie', 'delta'], 'delta'))
+        self.assertEqual(query(self.index, 'min_members=3&contains=ha'), (['charlie'], None))
+        # Repeated with the threshold's positions already sorted
+        self.assertEqual(query(self.index, 'min_members=3'), (['bravo', 'charlie', 'delta'], None))
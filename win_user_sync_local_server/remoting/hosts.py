@@ -0,0 +1,150 @@
+"""
+This module contains helpers running user and user group operations on remote hosts.
+
+Views decorated with fan_out_hosts accept the 'host' URL parameter: a host, a
+comma-separated list of hosts or '*' for all configured hosts. Without it, operations
+run on this machine.
+"""
+
+import functools
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+from rest_framework.response import Response
+
+from config.settings.base import (
+    get_powershell_path,
+    REMOTE_FAN_OUT_WORKERS,
+    REMOTE_HOSTS,
+    REMOTE_HOSTS_TRANSPORT,
+    REMOTE_SESSION_IDLE_TIMEOUT,
+    REMOTE_SESSIONS_PER_HOST
+)
+from .pool import SessionPool
+from ..diagnostics.context import bind_context
+from ..diagnostics.fingerprint import fingerprint_command
+from ..diagnostics.slow_commands import slow_command_log
+from ..diagnostics.tracing import tracer
+
+ALL_HOSTS = '*'
+
+session_pool = SessionPool(
+    import_string(REMOTE_HOSTS_TRANSPORT)(get_powershell_path()),
+    REMOTE_SESSIONS_PER_HOST,
+    REMOTE_SESSION_IDLE_TIMEOUT
+)
+
+
+class UnknownHost(ValueError):
+    """
+    Raised when a host isn't one of the configured remote hosts.
+    """
+
+
+class RemoteShell:
+    """
+    Runs PowerShell commands on a remote host through the session pool.
+
+    Attributes:
+        host (str): The remote host.
+        pool (SessionPool): The pool lending sessions.
+    """
+    def __init__(self, host, pool=session_pool):
+        self.host = host
+        self.pool = pool
+
+    def run(self, command):
+        with tracer.span('powershell.remote', host=self.host, command=fingerprint_command(command)):
+            return self._execute(command, lambda session: session.run(command))
+
+    def run_script(self, script, *args):
+        with tracer.span('powershell.remote', host=self.host, command=script):
+            return self._execute(script, lambda session: session.run_script(script, *args))
+
+    def _execute(self, command, call):
+        with self.pool.session(self.host) as session:
+            # Timed once a session is lent, so waiting for a busy pool doesn't count as a slow command
+            started_at = time.perf_counter()
+            exit_code, error = 0, ''
+            try:
+                return call(session)
+            except Exception as exc:
+                exit_code, error = 1, str(exc)
+                raise
+            finally:
+                slow_command_log.record(command, time.perf_counter() - started_at, exit_code, error, self.host)
+
+
+def parse_hosts(value):
+    """
+    Parses the 'host' URL parameter.
+
+    Args:
+        value (str): A host, a comma-separated list of hosts or '*'.
+
+    Returns:
+        list: The hosts.
+
+    Raises:
+        UnknownHost: If a host isn't configured.
+    """
+    if value.strip() == ALL_HOSTS:
+        hosts = list(REMOTE_HOSTS)
+    else:
+        hosts = list(dict.fromkeys(host.strip() for host in value.split(',') if host.strip()))
+    if not hosts:
+        raise UnknownHost("No hosts given. Configure them in REMOTE_HOSTS")
+    unknown = [host for host in hosts if host not in REMOTE_HOSTS]
+    if unknown:
+        raise UnknownHost(f"Unknown hosts: {', '.join(unknown)}. Configure them in REMOTE_HOSTS")
+    return hosts
+
+
+def response_data(response):
+    """
+    Returns the data of a DRF or a JSON response.
+    """
+    if hasattr(response, 'data'):
+        return response.data
+    return json.loads(response.content) if response.content else None
+
+
+def fan_out_hosts(view):
+    """
+    Decorator passing the target host to the view as the 'host' keyword argument.
+
+    The host is None for this machine. With several hosts the view runs for every host in
+    parallel, and the response holds the status and body of every host keyed by host.
+    It's 200 OK if all hosts succeeded and 207 Multi-Status otherwise.
+    Should be placed below api_view.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        value = request.query_params.get('host')
+        if not value:
+            return view(request, *args, host=None, **kwargs)
+        try:
+            hosts = parse_hosts(value)
+        except UnknownHost as exc:
+            return JsonResponse({"error": str(exc)}, status=400, content_type='application/json')
+        if len(hosts) == 1:
+            return view(request, *args, host=hosts[0], **kwargs)
+
+        # The body is read once before the threads share the request
+        request.body
+
+        def run(host):
+            try:
+                response = view(request, *args, host=host, **kwargs)
+                return host, {'status': response.status_code, 'body': response_data(response)}
+            except Exception as exc:
+                return host, {'status': 500, 'body': {"error": str(exc)}}
+
+        with ThreadPoolExecutor(max_workers=max(1, min(len(hosts), REMOTE_FAN_OUT_WORKERS))) as executor:
+            results = dict(executor.map(bind_context(run), hosts))
+        succeeded = all(200 <= result['status'] < 300 for result in results.values())
+        return Response({'hosts': results}, status=200 if succeeded else 207)
+    return wrapper
@@ -0,0 +1,98 @@
+"""
+This module contains the SessionPool class keeping persistent sessions to remote hosts.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class SessionPool:
+    """
+    Keeps up to a number of sessions per host open and hands them out one thread at a time.
+
+    Attributes:
+        transport: The transport opening sessions, see the transports module.
+        max_sessions_per_host (int): The maximum number of sessions open to a single host.
+        idle_timeout (float): The number of seconds after which an unused session is closed.
+    """
+    def __init__(self, transport, max_sessions_per_host, idle_timeout):
+        self.transport = transport
+        self.max_sessions_per_host = max_sessions_per_host
+        self.idle_timeout = idle_timeout
+        self._idle = defaultdict(list)
+        self._open = defaultdict(int)
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def session(self, host):
+        """
+        Lends a session to the host, waiting for one if all are busy. Yields the session.
+
+        Sessions that aren't alive anymore when given back are closed and replaced on demand.
+        """
+        session = self._acquire(host)
+        try:
+            yield session
+        finally:
+            self._release(host, session)
+
+    def status(self):
+        """
+        Returns the number of open and idle sessions keyed by host.
+        """
+        with self._condition:
+            return {
+                host: {'open': count, 'idle': len(self._idle[host])}
+                for host, count in self._open.items() if count
+            }
+
+    def close_all(self):
+        with self._condition:
+            for host, idle in self._idle.items():
+                for session, _ in idle:
+                    session.close()
+                self._open[host] -= len(idle)
+                idle.clear()
+            self._condition.notify_all()
+
+    def _acquire(self, host):
+        with self._condition:
+            while True:
+                self._close_expired(host)
+                if self._idle[host]:
+                    session, _ = self._idle[host].pop()
+                    return session
+                if self._open[host] < self.max_sessions_per_host:
+                    self._open[host] += 1
+                    break
+                self._condition.wait()
+
+        try:
+            return self.transport.open(host)
+        except Exception:
+            with self._condition:
+                self._open[host] -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, host, session):
+        alive = session.alive
+        with self._condition:
+            if alive:
+                self._idle[host].append((session, time.monotonic()))
+            else:
+                self._open[host] -= 1
+            self._condition.notify()
+        if not alive:
+            session.close()
+
+    def _close_expired(self, host):
+        deadline = time.monotonic() - self.idle_timeout
+        expired = [session for session, last_used in self._idle[host] if last_used < deadline]
+        if expired:
+            self._idle[host] = [(session, last_used) for session, last_used in self._idle[host] if last_used >= deadline]
+            self._open[host] -= len(expired)
+            for session in expired:
+                session.close()
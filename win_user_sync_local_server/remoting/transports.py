@@ -0,0 +1,208 @@
+"""
+This module contains transports opening PowerShell sessions to remote hosts.
+
+A transport has an open(host) method returning a session with run(command),
+run_script(script, *args) and close() methods and an alive property. Sessions are
+used by one thread at a time.
+"""
+
+import queue
+import subprocess
+import threading
+import time
+import uuid
+
+from config.settings.base import BASE_DIR, POWERSHELL_COMMAND_TIMEOUT
+from ..users.user_scripts import LocalShell
+
+
+class RemoteCommandError(Exception):
+    """
+    Raised when a command fails on the remote host. The session stays usable.
+    """
+
+
+class RemoteSessionClosed(Exception):
+    """
+    Raised when the session ends unexpectedly. The session isn't usable anymore.
+    """
+
+
+def ps_quote(value):
+    """
+    Quotes a value as a PowerShell single-quoted string.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class PSRemotingSession:
+    """
+    A persistent PowerShell process holding a PSSession to the remote host.
+
+    Statements are written to the standard input of the process one per line, and their
+    output is read up to a marker line carrying the result. The output is read by a thread
+    of the session, so a statement can be given up on once it takes longer than the timeout.
+
+    Attributes:
+        host (str): The remote host.
+        command_timeout (float): The number of seconds a statement may take.
+    """
+    def __init__(self, powershell_path, host, command_timeout=POWERSHELL_COMMAND_TIMEOUT):
+        self.host = host
+        self.command_timeout = command_timeout
+        self._marker = f'__done_{uuid.uuid4().hex}__'
+        self._broken = False
+        self._lines = queue.Queue()
+        self._process = subprocess.Popen(
+            [powershell_path, '-NoProfile', '-NonInteractive', '-ExecutionPolicy', 'Bypass', '-Command', '-'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        threading.Thread(target=self._read_output, name=f'ps-remoting-{host}', daemon=True).start()
+        try:
+            self._execute(f'$session = New-PSSession -ComputerName {ps_quote(host)} -ErrorAction Stop', capture=False)
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def alive(self):
+        return not self._broken and self._process.poll() is None
+
+    def run(self, command):
+        """
+        Runs a command on the remote host.
+
+        Args:
+            command (str): The PowerShell command.
+
+        Returns:
+            str: The output of the command.
+        """
+        return self._execute(f'Invoke-Command -Session $session -ErrorAction Stop -ScriptBlock {{ {command} }}')
+
+    def run_script(self, script, *args):
+        """
+        Runs a script of the scripts directory on the remote host.
+
+        Args:
+            script (str): The file name of the script.
+            *args: The arguments of the script.
+
+        Returns:
+            str: The output of the script.
+        """
+        arguments = f" -ArgumentList {','.join(ps_quote(arg) for arg in args)}" if args else ''
+        return self._execute(
+            f'Invoke-Command -Session $session -ErrorAction Stop '
+            f'-FilePath {ps_quote(BASE_DIR / "scripts" / script)}{arguments}'
+        )
+
+    def close(self):
+        if self._process.poll() is None:
+            try:
+                self._process.stdin.write('Remove-PSSession $session\n')
+                self._process.stdin.close()
+                self._process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._process.kill()
+
+    def _execute(self, statement, capture=True):
+        if capture:
+            statement += ' | Out-String -Width 4096'
+        try:
+            self._process.stdin.write(
+                f"try {{ {statement}; '{self._marker}0' }} catch {{ ($_ | Out-String); '{self._marker}1' }}\n"
+            )
+            self._process.stdin.flush()
+        except OSError as exc:
+            self._broken = True
+            raise RemoteSessionClosed(f'Session to {self.host} is closed: {exc}')
+
+        lines = []
+        deadline = time.monotonic() + self.command_timeout
+        while True:
+            try:
+                line = self._lines.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                # The statement may still be running, so the rest of its output can't be told apart
+                self._broken = True
+                self._process.kill()
+                raise RemoteSessionClosed(
+                    f'Session to {self.host} timed out after {self.command_timeout} seconds'
+                ) from None
+            if not line:
+                self._broken = True
+                raise RemoteSessionClosed(f'Session to {self.host} ended unexpectedly')
+            line = line.rstrip('\r\n')
+            if line.startswith(self._marker):
+                failed = line[len(self._marker):] == '1'
+                break
+            lines.append(line)
+
+        output = '\n'.join(lines).strip()
+        if failed:
+            raise RemoteCommandError(output)
+        return output
+
+    def _read_output(self):
+        """
+        Queues the output lines of the process, then an empty line once it ends.
+        """
+        try:
+            for line in self._process.stdout:
+                self._lines.put(line)
+        except (OSError, ValueError):
+            pass
+        self._lines.put('')
+
+
+class PSRemotingTransport:
+    """
+    Opens sessions to remote hosts with PowerShell remoting (WinRM).
+
+    The account running the server should be allowed to open sessions to the hosts.
+
+    Attributes:
+        powershell_path (str): The path to the PowerShell executable.
+        command_timeout (float): The number of seconds a statement may take.
+    """
+    def __init__(self, powershell_path, command_timeout=POWERSHELL_COMMAND_TIMEOUT):
+        self.powershell_path = powershell_path
+        self.command_timeout = command_timeout
+
+    def open(self, host):
+        return PSRemotingSession(self.powershell_path, host, self.command_timeout)
+
+
+class LocalSession(LocalShell):
+    """
+    A stand-in session running commands on this machine, each in a new process.
+    """
+    def __init__(self, powershell_path, host):
+        super().__init__(powershell_path)
+        self.host = host
+
+    @property
+    def alive(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class LocalTransport:
+    """
+    A stand-in transport whose sessions run commands on this machine whatever the host.
+
+    Attributes:
+        powershell_path (str): The path to the PowerShell executable.
+    """
+    def __init__(self, powershell_path):
+        self.powershell_path = powershell_path
+
+    def open(self, host):
+        return LocalSession(self.powershell_path, host)
@@ -0,0 +1,21 @@
+Param(
+    $Action,
+    $Names
+)
+$Cmdlet = @{
+    'enable-users' = 'Enable-LocalUser'
+    'disable-users' = 'Disable-LocalUser'
+    'delete-users' = 'Remove-LocalUser'
+    'delete-usergroups' = 'Remove-LocalGroup'
+}[$Action]
+if (-not $Cmdlet) { throw "Unknown action $Action." }
+
+$Names -split ',' | ForEach-Object {
+    $Name = $_
+    try {
+        & $Cmdlet -Name $Name -ErrorAction Stop
+        [PSCustomObject]@{ Name = $Name; Status = 'ok'; Error = '' }
+    } catch {
+        [PSCustomObject]@{ Name = $Name; Status = 'error'; Error = $_.Exception.Message }
+    }
+} | ConvertTo-Csv -NoTypeInformation
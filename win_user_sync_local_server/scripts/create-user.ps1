@@ -2,6 +2,7 @@ Param(
     $Username,
     $Password
 )
+$ErrorActionPreference = 'Stop'
 $SecuredPassword = ConvertTo-SecureString $Password -AsPlainText -Force
 
 New-LocalUser -Name $Username -Password $SecuredPassword
@@ -3,6 +3,7 @@ Param(
     $Username,
     $Password
 )
+$ErrorActionPreference = 'Stop'
 $SecuredPassword = ConvertTo-SecureString $Password -AsPlainText -Force
 
 $UserAccount = Get-LocalUser -Name $Username
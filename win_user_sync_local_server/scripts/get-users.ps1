@@ -0,0 +1,13 @@
+Param(
+    $Username
+)
+$ErrorActionPreference = 'Stop'
+$Users = if ($Username) { Get-LocalUser -Name $Username } else { Get-LocalUser }
+
+$Users | Select-Object Name,
+    @{Name = 'SID'; Expression = { $_.SID.Value }},
+    Enabled,
+    Description,
+    @{Name = 'LastLogon'; Expression = { if ($_.LastLogon) { $_.LastLogon.ToUniversalTime().ToString('o') } }},
+    @{Name = 'PasswordLastSet'; Expression = { if ($_.PasswordLastSet) { $_.PasswordLastSet.ToUniversalTime().ToString('o') } }} |
+    ConvertTo-Csv -NoTypeInformation
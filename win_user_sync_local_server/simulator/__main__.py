@@ -0,0 +1,5 @@
+import sys
+
+from .powershell import main
+
+sys.exit(main())
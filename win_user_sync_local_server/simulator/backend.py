@@ -0,0 +1,81 @@
+"""
+This module contains the SimulatedAccountStore backend running commands on simulated machines in-process.
+"""
+
+import os
+import threading
+import time
+
+from config.settings.base import POWERSHELL_COMMAND_TIMEOUT
+from .config import SimulatorConfig
+from ..accounts.powershell import PowerShellAccountStore
+from ..admission.load import powershell_load
+from ..diagnostics.fingerprint import fingerprint_command
+from ..diagnostics.slow_commands import slow_command_log
+from ..diagnostics.tracing import tracer
+from ..users.user_scripts import PowerShellError, PowerShellTimeout
+
+
+class SimulatedShell:
+    """
+    Runs PowerShell commands on a simulated machine, like LocalShell does on this machine.
+
+    Commands fail and time out like LocalShell ones: a failed command raises PowerShellError and
+    a command delayed for longer than the timeout, e.g. a hanging one, raises PowerShellTimeout
+    once the timeout has passed.
+
+    Attributes:
+        machine (SimulatedMachine): The machine.
+        faults (FaultInjector): Decides latency, failures and hangs.
+        command_timeout (float): The number of seconds a command may take.
+    """
+    def __init__(self, machine, faults, command_timeout=POWERSHELL_COMMAND_TIMEOUT):
+        self.machine = machine
+        self.faults = faults
+        self.command_timeout = command_timeout
+
+    def run(self, command):
+        with tracer.span('powershell', command=fingerprint_command(command)) as span:
+            started_at = time.perf_counter()
+            with powershell_load.track():
+                result, delay = self.machine.invoke(command, self.faults)
+                time.sleep(min(delay, self.command_timeout))
+            if delay > self.command_timeout:
+                error = PowerShellTimeout(self.command_timeout)
+                slow_command_log.record(command, time.perf_counter() - started_at, None, str(error))
+                raise error
+            slow_command_log.record(command, time.perf_counter() - started_at, result.exit_code, result.stderr)
+            if span is not None:
+                span.set_attribute('exit_code', result.exit_code)
+        if result.exit_code != 0:
+            raise PowerShellError(result.exit_code, result.stderr)
+        return result.stdout.strip()
+
+    def run_script(self, script, *args):
+        arguments = ' '.join(f'"{arg}"' for arg in args)
+        return self.run(f'{script} {arguments}')
+
+
+class SimulatedAccountStore(PowerShellAccountStore):
+    """
+    Runs the commands of the PowerShell backend on simulated machines, with the data sizes and
+    faults of the SIMULATOR_* environment variables. Every remote host is a machine of its own.
+
+    Attributes:
+        config (SimulatorConfig): Describes data sizes and faults.
+    """
+    def __init__(self, config, host=None):
+        self.config = config
+        self._hosts = {}
+        self._hosts_lock = threading.Lock()
+        super().__init__('powershell', SimulatedShell(config.machine(host), config.faults(host)))
+
+    @classmethod
+    def from_settings(cls):
+        return cls(SimulatorConfig.from_environ(os.environ))
+
+    def for_host(self, host):
+        with self._hosts_lock:
+            if host.lower() not in self._hosts:
+                self._hosts[host.lower()] = SimulatedAccountStore(self.config, host)
+            return self._hosts[host.lower()]
@@ -0,0 +1,77 @@
+"""
+This module contains the SimulatorConfig class read from SIMULATOR_* environment variables.
+
+The variables are read here rather than in the settings, so the fake executable runs
+without configuring Django.
+"""
+
+from .faults import FaultInjector
+from .machine import SimulatedMachine
+
+LOCAL_MACHINE_NAME = 'SIMULATED'
+
+
+class SimulatorConfig:
+    """
+    Describes the data sizes and faults of simulated machines.
+
+    Attributes:
+        users (int): The number of generated users per machine.
+        usergroups (int): The number of generated user groups per machine.
+        members_per_group (int): The number of members of every generated user group.
+        latency (str): The latency distribution of commands, see faults.parse_latency.
+        row_latency (float): The additional number of seconds per object a command writes.
+        error_rate (float): The probability of a command failing.
+        hang_rate (float): The probability of a command hanging.
+        hang_seconds (float): The number of seconds a hanging command takes.
+        seed (str): Seeds data generation and fault draws.
+    """
+    def __init__(self, users=10, usergroups=5, members_per_group=3, latency='fixed:0', row_latency=0.0,
+                 error_rate=0.0, hang_rate=0.0, hang_seconds=3600.0, seed='0'):
+        self.users = users
+        self.usergroups = usergroups
+        self.members_per_group = members_per_group
+        self.latency = latency
+        self.row_latency = row_latency
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.seed = seed
+
+    @classmethod
+    def from_environ(cls, environ):
+        """
+        Reads the configuration from SIMULATOR_* variables, using the defaults for missing ones.
+
+        Args:
+            environ (dict): The environment, e.g. os.environ.
+
+        Returns:
+            SimulatorConfig: The configuration.
+        """
+        config = cls()
+        for attribute, parse in (
+                ('users', int), ('usergroups', int), ('members_per_group', int), ('latency', str),
+                ('row_latency', float), ('error_rate', float), ('hang_rate', float), ('hang_seconds', float),
+                ('seed', str)
+        ):
+            value = environ.get(f'SIMULATOR_{attribute.upper()}')
+            if value is not None:
+                setattr(config, attribute, parse(value))
+        return config
+
+    def machine(self, host=None):
+        """
+        Creates the populated machine of this machine or of a remote host.
+        """
+        return SimulatedMachine.populated(
+            self.users, self.usergroups, self.members_per_group, self.seed, (host or LOCAL_MACHINE_NAME).upper()
+        )
+
+    def faults(self, host=None):
+        """
+        Creates the fault injector of this machine or of a remote host.
+        """
+        return FaultInjector(
+            self.latency, self.row_latency, self.error_rate, self.hang_rate, self.hang_seconds, f'{self.seed}:{host or ""}'
+        )
@@ -0,0 +1,94 @@
+"""
+This module contains the FaultInjector class drawing latency, failures and hangs of simulated commands.
+
+Draws are seeded by the seed, the command and the number of times the command has run,
+so a run is reproducible whatever the order in which threads or processes issue commands.
+"""
+
+import random
+
+LATENCY_DISTRIBUTIONS = {
+    'fixed': (1, lambda generator, seconds: seconds),
+    'uniform': (2, lambda generator, low, high: generator.uniform(low, high)),
+    'normal': (2, lambda generator, mean, stddev: generator.gauss(mean, stddev)),
+    'lognormal': (2, lambda generator, mu, sigma: generator.lognormvariate(mu, sigma)),
+    'exponential': (1, lambda generator, mean: generator.expovariate(1 / mean) if mean else 0.0),
+}
+
+
+def parse_latency(spec):
+    """
+    Parses a latency distribution.
+
+    Args:
+        spec (str): The distribution and its parameters in seconds separated by colons:
+            'fixed:S', 'uniform:LOW:HIGH', 'normal:MEAN:STDDEV', 'lognormal:MU:SIGMA' or 'exponential:MEAN'.
+
+    Returns:
+        function: A function drawing a latency in seconds from a random.Random.
+
+    Raises:
+        ValueError: If the distribution is unknown or has the wrong number of parameters.
+    """
+    name, *params = spec.split(':')
+    if name not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution '{name}', expected one of {', '.join(LATENCY_DISTRIBUTIONS)}")
+    arity, draw = LATENCY_DISTRIBUTIONS[name]
+    if len(params) != arity:
+        raise ValueError(f"The '{name}' latency distribution takes {arity} parameter(s), got '{spec}'")
+    params = [float(param) for param in params]
+    return lambda generator: max(0.0, draw(generator, *params))
+
+
+class Fault:
+    """
+    Represents the faults drawn for a single command.
+
+    Attributes:
+        delay (float): The number of seconds the command takes, including a hang.
+        fail (bool): Whether the command fails.
+        hang (bool): Whether the command hangs.
+    """
+    def __init__(self, delay, fail, hang):
+        self.delay = delay
+        self.fail = fail
+        self.hang = hang
+
+
+class FaultInjector:
+    """
+    Draws faults of simulated commands.
+
+    Attributes:
+        latency (str): The latency distribution, see parse_latency.
+        row_latency (float): The additional number of seconds per object a command writes.
+        error_rate (float): The probability of a command failing.
+        hang_rate (float): The probability of a command hanging.
+        hang_seconds (float): The number of seconds a hanging command takes.
+        seed (int or str): Seeds the draws.
+    """
+    def __init__(self, latency='fixed:0', row_latency=0.0, error_rate=0.0, hang_rate=0.0, hang_seconds=3600.0, seed=0):
+        self.latency = latency
+        self.row_latency = row_latency
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.seed = seed
+        self._draw_latency = parse_latency(latency)
+
+    def decide(self, command, occurrence):
+        """
+        Draws the faults of a command.
+
+        Args:
+            command (str): The command.
+            occurrence (int): The number of times the command has run before.
+
+        Returns:
+            Fault: The faults.
+        """
+        generator = random.Random(f'{self.seed}:{occurrence}:{command}')
+        delay = self._draw_latency(generator)
+        hang = generator.random() < self.hang_rate
+        fail = generator.random() < self.error_rate
+        return Fault(delay + (self.hang_seconds if hang else 0.0), fail, hang)
@@ -0,0 +1,475 @@
+"""
+This module contains the SimulatedMachine class emulating the local-accounts cmdlets of a Windows machine.
+
+Commands are parsed and applied to users and user groups kept in memory, and their output
+is formatted the way PowerShell formats it, so the parsing code of the users and user_groups
+apps runs unchanged. The module doesn't depend on Django, so the fake executable starts fast.
+"""
+
+import csv
+import io
+import random
+import re
+import threading
+from datetime import datetime, timezone
+
+TOKEN_PATTERN = re.compile(r'''"(?:[^"`]|`.)*"|'(?:[^']|'')*'|\||[^\s|"']+''')
+DEFAULT_PROPERTIES = {
+    'user': ['Name', 'Enabled', 'Description'],
+    'group': ['Name', 'Description'],
+    'member': ['ObjectClass', 'Name', 'PrincipalSource'],
+}
+CSV_PROPERTIES = {
+    'user-csv': ['Name', 'SID', 'Enabled', 'Description', 'LastLogon', 'PasswordLastSet'],
+    'bulk-csv': ['Name', 'Status', 'Error'],
+}
+
+BUILTIN_USERS = [('Administrator', False), ('DefaultAccount', False), ('Guest', False), ('WDAGUtilityAccount', False)]
+BUILTIN_USERGROUPS = [
+    ('Administrators', 'Administrators have complete and unrestricted access to the computer/domain', ['Administrator']),
+    ('Guests', 'Guests have the same access as members of the Users group by default, except for the Guest account which is further restricted', ['Guest']),
+    ('Remote Desktop Users', 'Members in this group are granted the right to logon remotely', []),
+    ('Users', 'Users are prevented from making accidental or intentional system-wide changes and can run most applications', []),
+]
+
+
+class CommandError(Exception):
+    """
+    Raised by a simulated cmdlet, reported on stderr with a non-zero exit code like PowerShell does.
+    """
+
+
+class CommandResult:
+    """
+    Represents the outcome of a simulated command.
+
+    Attributes:
+        stdout (str): The standard output.
+        stderr (str): The standard error.
+        exit_code (int): The exit code of the process.
+        rows (int): The number of objects the command wrote.
+    """
+    def __init__(self, stdout='', stderr='', exit_code=0, rows=0):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.exit_code = exit_code
+        self.rows = rows
+
+
+def unquote(token):
+    if token.startswith('"') and token.endswith('"') and len(token) >= 2:
+        return re.sub(r'`(.)', r'\1', token[1:-1])
+    if token.startswith("'") and token.endswith("'") and len(token) >= 2:
+        return token[1:-1].replace("''", "'")
+    return token
+
+
+def parse_pipeline(command):
+    """
+    Parses a command into pipeline stages.
+
+    Args:
+        command (str): The PowerShell command, e.g. 'Get-LocalGroup "x" | Format-Table -Property Name'.
+
+    Returns:
+        list: Stages as (name, positional arguments, named parameters) tuples. Switch parameters are True.
+    """
+    stages, tokens = [], []
+    for token in TOKEN_PATTERN.findall(command) + ['|']:
+        if token != '|':
+            tokens.append(token)
+            continue
+        if not tokens:
+            continue
+        name, positional, named = tokens[0], [], {}
+        index = 1
+        while index < len(tokens):
+            token = tokens[index]
+            if token.startswith('-') and len(token) > 1 and not token[1].isdigit():
+                has_value = index + 1 < len(tokens) and not tokens[index + 1].startswith('-')
+                named[token[1:].rstrip(':').lower()] = unquote(tokens[index + 1]) if has_value else True
+                index += 2 if has_value else 1
+            else:
+                positional.append(unquote(token))
+                index += 1
+        stages.append((unquote(name), positional, named))
+        tokens = []
+    return stages
+
+
+def format_table(objects, properties):
+    """
+    Formats objects as a PowerShell table with the given columns.
+    """
+    if not objects:
+        return ''
+    columns = [[prop] + [format_value(obj.get(prop)) for obj in objects] for prop in properties]
+    widths = [max(len(cell) for cell in column) for column in columns]
+    lines = [
+        ' '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+        for row in zip(*columns)
+    ]
+    lines.insert(1, ' '.join('-' * len(prop) + ' ' * (width - len(prop)) for prop, width in zip(properties, widths)).rstrip())
+    return '\n' + '\n'.join(lines) + '\n\n'
+
+
+def format_csv(objects, properties):
+    """
+    Formats objects the way ConvertTo-Csv -NoTypeInformation does.
+    """
+    if not objects:
+        return ''
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    writer.writerow(properties)
+    for obj in objects:
+        writer.writerow([format_value(obj.get(prop)) for prop in properties])
+    return output.getvalue()
+
+
+def format_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'True' if value else 'False'
+    return str(value)
+
+
+class SimulatedMachine:
+    """
+    Keeps the users and user groups of a simulated machine and runs cmdlets against them.
+
+    Attributes:
+        name (str): The machine name, used as the prefix of group members.
+        users (dict): Users keyed by lowercase name.
+        usergroups (dict): User groups keyed by lowercase name, members as lowercase usernames.
+        invocations (dict): The number of times every command has run, used to draw faults deterministically.
+    """
+    def __init__(self, name='SIMULATED', domain_id='21-1000000000-2000000000-3000000000'):
+        self.name = name
+        self.domain_id = domain_id
+        self.users = {}
+        self.usergroups = {}
+        self.invocations = {}
+        self.next_rid = 1000
+        self._lock = threading.RLock()
+
+    @classmethod
+    def populated(cls, users=0, usergroups=0, members_per_group=0, seed=0, name='SIMULATED'):
+        """
+        Creates a machine with the built-in accounts and generated users and user groups.
+
+        Args:
+            users (int): The number of generated users, named user00001, user00002, ...
+            usergroups (int): The number of generated user groups, named group0001, group0002, ...
+            members_per_group (int): The number of generated users in every generated user group.
+            seed (int or str): Seeds the choice of members.
+            name (str): The machine name.
+
+        Returns:
+            SimulatedMachine: The machine.
+        """
+        machine = cls(name)
+        generator = random.Random(f'{seed}:{name}')
+        for username, enabled in BUILTIN_USERS:
+            machine.add_user(username, enabled=enabled, rid=500 + len(machine.users))
+        for group_name, description, members in BUILTIN_USERGROUPS:
+            machine.add_usergroup(group_name, description, members)
+        usernames = [f'user{index:05d}' for index in range(1, users + 1)]
+        for username in usernames:
+            machine.add_user(username)
+        for index in range(1, usergroups + 1):
+            members = generator.sample(usernames, min(members_per_group, len(usernames)))
+            machine.add_usergroup(f'group{index:04d}', f'Generated group {index}', sorted(members))
+        return machine
+
+    def add_user(self, username, password=None, enabled=True, rid=None):
+        if username.lower() in self.users:
+            raise CommandError(f'User {username} already exists.')
+        self.users[username.lower()] = {
+            'Name': username,
+            'Enabled': enabled,
+            'Description': '',
+            'SID': self._sid(rid),
+            'PasswordLastSet': datetime.now(timezone.utc).isoformat() if password else None,
+            'LastLogon': None,
+        }
+
+    def add_usergroup(self, name, description=None, members=()):
+        if name.lower() in self.usergroups:
+            raise CommandError(f'Group {name} already exists.')
+        self.usergroups[name.lower()] = {
+            'Name': name,
+            'Description': description or '',
+            'SID': self._sid(None),
+            'members': [self.user(member)['Name'].lower() for member in members],
+        }
+
+    def user(self, username):
+        user = self.users.get(str(username).split('\\')[-1].lower())
+        if user is None:
+            raise CommandError(f'User {username} was not found.')
+        return user
+
+    def usergroup(self, name):
+        usergroup = self.usergroups.get(str(name).lower())
+        if usergroup is None:
+            raise CommandError(f'Group {name} was not found.')
+        return usergroup
+
+    def execute(self, command):
+        """
+        Runs a command.
+
+        Args:
+            command (str): The PowerShell command.
+
+        Returns:
+            CommandResult: The output of the command.
+        """
+        stages = parse_pipeline(command)
+        if not stages:
+            return CommandResult()
+        name, positional, named = stages[0]
+        cmdlet = name.rsplit('/', 1)[-1].rsplit('\\', 1)[-1]
+        handler = CMDLETS.get(cmdlet.lower())
+        if handler is None:
+            return CommandResult(
+                stderr=f"{cmdlet} : The term '{cmdlet}' is not recognized as the name of a cmdlet.",
+                exit_code=1
+            )
+
+        with self._lock:
+            try:
+                kind, objects = handler(self, positional, named)
+            except CommandError as exc:
+                return CommandResult(stderr=f'{cmdlet} : {exc}', exit_code=1)
+
+        if kind in CSV_PROPERTIES:
+            return CommandResult(stdout=format_csv(objects, CSV_PROPERTIES[kind]), rows=len(objects))
+        properties = DEFAULT_PROPERTIES.get(kind, ['Name'])
+        for stage_name, stage_positional, stage_named in stages[1:]:
+            if stage_name.lower() == 'format-table':
+                value = stage_named.get('property') or (stage_positional[0] if stage_positional else None)
+                if value:
+                    properties = [prop.strip() for prop in value.split(',')]
+        return CommandResult(stdout=format_table(objects, properties), rows=len(objects))
+
+    def invoke(self, command, faults=None):
+        """
+        Runs a command with injected faults.
+
+        Args:
+            command (str): The PowerShell command.
+            faults (FaultInjector): Decides latency, failures and hangs. No faults if None.
+
+        Returns:
+            tuple: The CommandResult and the number of seconds the caller should wait before returning it.
+        """
+        with self._lock:
+            occurrence = self.invocations.get(command, 0)
+            self.invocations[command] = occurrence + 1
+        if faults is None:
+            return self.execute(command), 0.0
+
+        fault = faults.decide(command, occurrence)
+        if fault.fail:
+            cmdlet = (parse_pipeline(command) or [('powershell', [], {})])[0][0]
+            return CommandResult(stderr=f'{cmdlet} : Simulated failure.', exit_code=1), fault.delay
+        result = self.execute(command)
+        return result, fault.delay + faults.row_latency * result.rows
+
+    def serialize(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'domain_id': self.domain_id,
+                'users': self.users,
+                'usergroups': self.usergroups,
+                'invocations': self.invocations,
+                'next_rid': self.next_rid,
+            }
+
+    @classmethod
+    def deserialize(cls, data):
+        machine = cls(data['name'], data['domain_id'])
+        machine.users = data['users']
+        machine.usergroups = data['usergroups']
+        machine.invocations = data['invocations']
+        machine.next_rid = data['next_rid']
+        return machine
+
+    def _sid(self, rid):
+        if rid is None:
+            self.next_rid += 1
+            rid = self.next_rid
+        return f'S-1-5-{self.domain_id}-{rid}'
+
+    def _member(self, username):
+        return {'ObjectClass': 'User', 'Name': f'{self.name}\\{self.user(username)["Name"]}', 'PrincipalSource': 'Local'}
+
+
+def argument(positional, named, *names):
+    for name in names:
+        if name in named:
+            return named[name]
+    return positional[0] if positional else None
+
+
+def required(value, parameter):
+    if value is None or value is True:
+        raise CommandError(f"Cannot bind argument to parameter '{parameter}' because it is null.")
+    return value
+
+
+def get_local_user(machine, positional, named):
+    name = argument(positional, named, 'name')
+    if name is None:
+        return 'user', list(machine.users.values())
+    return 'user', [machine.user(name)]
+
+
+def new_local_user(machine, positional, named):
+    name = required(argument(positional, named, 'name'), 'Name')
+    machine.add_user(name, named.get('password'))
+    return 'user', [machine.user(name)]
+
+
+def set_local_user_password(machine, positional, named):
+    user = machine.user(required(argument(positional, named, 'name'), 'Name'))
+    user['PasswordLastSet'] = datetime.now(timezone.utc).isoformat()
+    return 'user', []
+
+
+def set_user_enabled(enabled):
+    def cmdlet(machine, positional, named):
+        machine.user(required(argument(positional, named, 'name'), 'Name'))['Enabled'] = enabled
+        return 'user', []
+    return cmdlet
+
+
+def remove_local_user(machine, positional, named):
+    user = machine.user(required(argument(positional, named, 'name'), 'Name'))
+    del machine.users[user['Name'].lower()]
+    for usergroup in machine.usergroups.values():
+        if user['Name'].lower() in usergroup['members']:
+            usergroup['members'].remove(user['Name'].lower())
+    return 'user', []
+
+
+def get_local_group(machine, positional, named):
+    name = argument(positional, named, 'name')
+    if name is None:
+        return 'group', list(machine.usergroups.values())
+    return 'group', [machine.usergroup(name)]
+
+
+def new_local_group(machine, positional, named):
+    name = required(argument(positional, named, 'name'), 'Name')
+    machine.add_usergroup(name, named.get('description'))
+    return 'group', [machine.usergroup(name)]
+
+
+def set_local_group(machine, positional, named):
+    machine.usergroup(required(argument(positional, named, 'name'), 'Name'))['Description'] = named.get('description') or ''
+    return 'group', []
+
+
+def rename_local_group(machine, positional, named):
+    usergroup = machine.usergroup(required(argument(positional, named, 'name'), 'Name'))
+    new_name = required(named.get('newname'), 'NewName')
+    if new_name.lower() != usergroup['Name'].lower() and new_name.lower() in machine.usergroups:
+        raise CommandError(f'Group {new_name} already exists.')
+    del machine.usergroups[usergroup['Name'].lower()]
+    usergroup['Name'] = new_name
+    machine.usergroups[new_name.lower()] = usergroup
+    return 'group', []
+
+
+def remove_local_group(machine, positional, named):
+    usergroup = machine.usergroup(required(argument(positional, named, 'name'), 'Name'))
+    del machine.usergroups[usergroup['Name'].lower()]
+    return 'group', []
+
+
+def get_local_group_member(machine, positional, named):
+    usergroup = machine.usergroup(required(argument(positional, named, 'group', 'name'), 'Group'))
+    return 'member', [machine._member(member) for member in usergroup['members']]
+
+
+def add_local_group_member(machine, positional, named):
+    usergroup = machine.usergroup(required(named.get('group') or named.get('name'), 'Group'))
+    for member in required(named.get('member'), 'Member').split(','):
+        user = machine.user(member.strip())
+        if user['Name'].lower() in usergroup['members']:
+            raise CommandError(f'{machine.name}\\{user["Name"]} is already a member of group {usergroup["Name"]}.')
+        usergroup['members'].append(user['Name'].lower())
+    return 'member', []
+
+
+def remove_local_group_member(machine, positional, named):
+    usergroup = machine.usergroup(required(named.get('group') or named.get('name'), 'Group'))
+    for member in required(named.get('member'), 'Member').split(','):
+        user = machine.user(member.strip())
+        if user['Name'].lower() not in usergroup['members']:
+            raise CommandError(f'Member {user["Name"]} was not found in group {usergroup["Name"]}.')
+        usergroup['members'].remove(user['Name'].lower())
+    return 'member', []
+
+
+def create_user_script(machine, positional, named):
+    username, password = (positional + [None, None])[:2]
+    return new_local_user(machine, [], {'name': username, 'password': password})
+
+
+def get_users_script(machine, positional, named):
+    _, users = get_local_user(machine, positional[:1], {})
+    return 'user-csv', users
+
+
+def edit_user_password_script(machine, positional, named):
+    return set_local_user_password(machine, [positional[0] if positional else None], {})
+
+
+def bulk_accounts_script(machine, positional, named):
+    action, names = (positional + [None, None])[:2]
+    cmdlet = BULK_CMDLETS.get(str(action))
+    if cmdlet is None:
+        raise CommandError(f'Unknown action {action}.')
+    rows = []
+    for name in str(names or '').split(','):
+        try:
+            cmdlet(machine, [], {'name': name})
+            rows.append({'Name': name, 'Status': 'ok', 'Error': ''})
+        except CommandError as exc:
+            rows.append({'Name': name, 'Status': 'error', 'Error': str(exc)})
+    return 'bulk-csv', rows
+
+
+BULK_CMDLETS = {
+    'enable-users': set_user_enabled(True),
+    'disable-users': set_user_enabled(False),
+    'delete-users': remove_local_user,
+    'delete-usergroups': remove_local_group,
+}
+
+CMDLETS = {
+    'get-localuser': get_local_user,
+    'new-localuser': new_local_user,
+    'set-localuser': set_local_user_password,
+    'enable-localuser': set_user_enabled(True),
+    'disable-localuser': set_user_enabled(False),
+    'remove-localuser': remove_local_user,
+    'get-localgroup': get_local_group,
+    'new-localgroup': new_local_group,
+    'set-localgroup': set_local_group,
+    'rename-localgroup': rename_local_group,
+    'remove-localgroup': remove_local_group,
+    'get-localgroupmember': get_local_group_member,
+    'add-localgroupmember': add_local_group_member,
+    'remove-localgroupmember': remove_local_group_member,
+    'create-user.ps1': create_user_script,
+    'edit-user-password.ps1': edit_user_password_script,
+    'get-users.ps1': get_users_script,
+    'bulk-accounts.ps1': bulk_accounts_script,
+}
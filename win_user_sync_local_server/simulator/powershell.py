@@ -0,0 +1,155 @@
+"""
+This module contains the fake powershell executable backed by simulated machines.
+
+It accepts the arguments the server passes to PowerShell: '-Command <command>' runs a
+single command, and '-Command -' reads statements from the standard input the way
+remoting sessions send them. With SIMULATOR_STATE_FILE set, the machines are kept in
+that JSON file between invocations, guarded by a lock file; otherwise every process starts
+from freshly populated machines.
+"""
+
+import fcntl
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+from .config import SimulatorConfig
+from .machine import CommandResult, SimulatedMachine, unquote
+
+QUOTED_PATTERN = re.compile(r"'(?:[^']|'')*'")
+STATEMENT_PATTERN = re.compile(r"^try \{ (?P<statement>.*); '(?P<marker>__done_\w+__)0' \} catch \{.*\}$")
+NEW_SESSION_PATTERN = re.compile(r"^\$session = New-PSSession -ComputerName (?P<host>'(?:[^']|'')*')")
+SCRIPT_BLOCK_PATTERN = re.compile(
+    r"^Invoke-Command -Session \$session -ErrorAction Stop -ScriptBlock \{ (?P<command>.*) \}(?: \| Out-String -Width \d+)?$"
+)
+FILE_PATTERN = re.compile(
+    r"^Invoke-Command -Session \$session -ErrorAction Stop -FilePath (?P<path>'(?:[^']|'')*')"
+    r"(?: -ArgumentList (?P<arguments>.*?))?(?: \| Out-String -Width \d+)?$"
+)
+
+
+class MachineStore:
+    """
+    Holds the simulated machines of a process, keyed by host ('' for this machine).
+
+    Attributes:
+        config (SimulatorConfig): Describes data sizes and faults.
+        state_file (str): The JSON file the machines are kept in, or '' to keep them in memory.
+    """
+    def __init__(self, config, state_file=''):
+        self.config = config
+        self.state_file = state_file
+        self._machines = {}
+
+    def invoke(self, host, command):
+        """
+        Runs a command on the machine of a host and waits for its simulated latency.
+
+        Returns:
+            CommandResult: The outcome of the command.
+        """
+        with self._machines_of_state() as machines:
+            if host not in machines:
+                machines[host] = self.config.machine(host or None)
+            result, delay = machines[host].invoke(command, self.config.faults(host or None))
+        time.sleep(delay)
+        return result
+
+    @contextmanager
+    def _machines_of_state(self):
+        if not self.state_file:
+            yield self._machines
+            return
+
+        with open(f'{self.state_file}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                machines = {}
+                if os.path.exists(self.state_file) and os.path.getsize(self.state_file):
+                    with open(self.state_file) as file:
+                        machines = {
+                            host: SimulatedMachine.deserialize(data) for host, data in json.load(file).items()
+                        }
+                yield machines
+                with open(f'{self.state_file}.tmp', 'w') as file:
+                    json.dump({host: machine.serialize() for host, machine in machines.items()}, file)
+                os.replace(f'{self.state_file}.tmp', self.state_file)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def command_argument(argv):
+    """
+    Returns the value of the -Command argument, or None if there is none.
+    """
+    for index, arg in enumerate(argv):
+        if arg.lower() == '-command':
+            return ' '.join(argv[index + 1:])
+    return None
+
+
+def run_session(store, stdin, stdout):
+    """
+    Serves statements of a remoting session, see remoting.transports.PSRemotingSession.
+    """
+    host = None
+    for line in stdin:
+        line = line.rstrip('\r\n')
+        match = STATEMENT_PATTERN.match(line)
+        if not match:
+            if line.startswith('Remove-PSSession'):
+                break
+            continue
+
+        statement, marker = match.group('statement'), match.group('marker')
+        new_session = NEW_SESSION_PATTERN.match(statement)
+        script_block = SCRIPT_BLOCK_PATTERN.match(statement)
+        file = FILE_PATTERN.match(statement)
+        if new_session:
+            host = unquote(new_session.group('host'))
+            result = CommandResult()
+        elif host is None:
+            result = CommandResult(stderr='Invoke-Command : The session is not open.', exit_code=1)
+        elif script_block:
+            result = store.invoke(host, script_block.group('command'))
+        elif file:
+            script = os.path.basename(unquote(file.group('path')))
+            result = store.invoke(host, ' '.join([script] + QUOTED_PATTERN.findall(file.group('arguments') or '')))
+        else:
+            result = CommandResult(stderr=f'Unsupported statement: {statement}', exit_code=1)
+
+        output = result.stdout.strip() if result.exit_code == 0 else result.stderr
+        if output:
+            stdout.write(output + '\n')
+        stdout.write(f'{marker}{0 if result.exit_code == 0 else 1}\n')
+        stdout.flush()
+
+
+def main(argv=None, environ=None, stdin=None, stdout=None, stderr=None):
+    """
+    Runs the fake executable.
+
+    Returns:
+        int: The exit code.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    environ = os.environ if environ is None else environ
+    stdin, stdout, stderr = stdin or sys.stdin, stdout or sys.stdout, stderr or sys.stderr
+
+    store = MachineStore(SimulatorConfig.from_environ(environ), environ.get('SIMULATOR_STATE_FILE', ''))
+    command = command_argument(argv)
+    if command is None:
+        stderr.write('Only -Command is supported by the simulator\n')
+        return 1
+    if command == '-':
+        run_session(store, stdin, stdout)
+        return 0
+
+    result = store.invoke('', command)
+    stdout.write(result.stdout)
+    if result.stderr:
+        stderr.write(result.stderr + '\n')
+    return result.exit_code
@@ -0,0 +1,185 @@
+"""
+This module contains the Digest class for Merkle-style comparison of users and user groups.
+
+Every entry (a user or a user group) is hashed, entries are spread over a fixed number
+of buckets by the hash of their name, every bucket is hashed over its entries and the
+root is hashed over the buckets. Two peers compare roots first, then bucket hashes and
+finally entry hashes of the diverged buckets only.
+"""
+
+import hashlib
+
+DIGEST_BUCKETS = 16
+
+FIELD_SEPARATOR = '\x1f'
+ITEM_SEPARATOR = '\x1e'
+
+
+def sha256(*parts):
+    """
+    Hashes the given string parts.
+
+    Returns:
+        str: The hex SHA-256 digest of the separated parts.
+    """
+    return hashlib.sha256(FIELD_SEPARATOR.join(parts).encode('utf-8')).hexdigest()
+
+
+def user_hash(user):
+    """
+    Hashes a user.
+
+    Args:
+        user (User): The user to hash.
+
+    Returns:
+        str: The hash of the user.
+    """
+    return sha256('user', user.username)
+
+
+def usergroup_hash(usergroup):
+    """
+    Hashes a user group over its name, description and member names.
+
+    Args:
+        usergroup (Usergroup): The user group to hash.
+
+    Returns:
+        str: The hash of the user group.
+    """
+    return sha256(
+        'usergroup',
+        usergroup.name,
+        usergroup.description or '',
+        ITEM_SEPARATOR.join(sorted(user.username for user in usergroup.users))
+    )
+
+
+def bucket_of(name, buckets=DIGEST_BUCKETS):
+    """
+    Returns the bucket the entry with the given name belongs to.
+
+    Args:
+        name (str): The name of the user or user group.
+        buckets (int): The number of buckets.
+
+    Returns:
+        int: The bucket index.
+    """
+    return int(sha256(name)[:8], 16) % buckets
+
+
+class Digest:
+    """
+    Represents a hash tree over named entries.
+
+    Attributes:
+        entries (dict): Entry hashes keyed by entry name.
+        buckets (int): The number of buckets.
+        bucket_hashes (list): The hash of every bucket.
+        root (str): The hash over all bucket hashes.
+    """
+    def __init__(self, entries, buckets=DIGEST_BUCKETS):
+        self.entries = entries
+        self.buckets = buckets
+        self._bucket_entries = [{} for _ in range(buckets)]
+        for name, entry_hash in entries.items():
+            self._bucket_entries[bucket_of(name, buckets)][name] = entry_hash
+        self.bucket_hashes = [
+            sha256(*(f'{name}{ITEM_SEPARATOR}{entry_hash}' for name, entry_hash in sorted(bucket.items())))
+            for bucket in self._bucket_entries
+        ]
+        self.root = sha256(*self.bucket_hashes)
+
+    def bucket(self, index):
+        """
+        Returns entry hashes of the given bucket keyed by entry name.
+
+        Args:
+            index (int): The bucket index.
+
+        Returns:
+            dict: The entry hashes of the bucket.
+        """
+        return self._bucket_entries[index]
+
+    def diverged_buckets(self, other):
+        """
+        Returns indexes of buckets whose hashes differ from the other digest's.
+
+        Args:
+            other (Digest): The digest to compare with. Should have the same number of buckets.
+
+        Returns:
+            list: The indexes of the diverged buckets.
+        """
+        if self.root == other.root:
+            return []
+        return [
+            index for index, (own, others) in enumerate(zip(self.bucket_hashes, other.bucket_hashes))
+            if own != others
+        ]
+
+    def diverged_entries(self, other):
+        """
+        Returns names of entries that are missing from one of the digests or hashed differently.
+
+        Args:
+            other (Digest): The digest to compare with. Should have the same number of buckets.
+
+        Returns:
+            list: The sorted names of the diverged entries.
+        """
+        diverged = set()
+        for index in self.diverged_buckets(other):
+            own, others = self.bucket(index), other.bucket(index)
+            diverged.update(name for name in own.keys() | others.keys() if own.get(name) != others.get(name))
+        return sorted(diverged)
+
+    def serialize(self):
+        """
+        Serializes the root and bucket hashes to a dictionary.
+
+        Returns:
+            dict: A dictionary representation of the digest.
+        """
+        return {
+            'root': self.root,
+            'buckets': {str(index): bucket_hash for index, bucket_hash in enumerate(self.bucket_hashes)},
+        }
+
+
+def users_digest(users, buckets=DIGEST_BUCKETS):
+    """
+    Builds the digest of the given users.
+
+    Args:
+        users (list): A list of User objects.
+        buckets (int): The number of buckets.
+
+    Returns:
+        Digest: The digest of the users.
+    """
+    return Digest({user.username: user_hash(user) for user in users}, buckets)
+
+
+def usergroups_digest(usergroups, buckets=DIGEST_BUCKETS):
+    """
+    Builds the digest of the given user groups.
+
+    Args:
+        usergroups (list): A list of Usergroup objects.
+        buckets (int): The number of buckets.
+
+    Returns:
+        Digest: The digest of the user groups.
+    """
+    return Digest({usergroup.name: usergroup_hash(usergroup) for usergroup in usergroups}, buckets)
+
+
+def state_root(users_root, usergroups_root):
+    """
+    Combines the users and user groups digest roots into the root of the whole state.
+    """
+    return sha256(users_root, usergroups_root)
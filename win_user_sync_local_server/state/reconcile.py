@@ -0,0 +1,255 @@
+"""
+This module contains functions for reconciling the local state with a desired state.
+
+A plan is a list of steps grouped into phases. Phases run one after another, so users
+and user groups are created before memberships change and memberships are removed
+before anything is deleted. Steps of the same phase are independent and run in parallel.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ..accounts.store import account_store
+from ..change_log.models import ChangeLogEntry
+from ..change_log.recorder import change_recorder
+from ..diagnostics.context import bind_context
+
+CREATE_PHASE = 'create'
+MEMBERSHIP_PHASE = 'membership'
+DELETE_PHASE = 'delete'
+PHASES = (CREATE_PHASE, MEMBERSHIP_PHASE, DELETE_PHASE)
+
+SECRET_PARAMS = ('password',)
+
+
+class PlanStep:
+    """
+    Represents a single change of the local state.
+
+    Attributes:
+        phase (str): The phase the step runs in.
+        action (str): The action name, e.g. 'create_user' or 'add_members'.
+        target (str): The name of the changed user or user group.
+        params (dict): Action specific parameters.
+    """
+    def __init__(self, phase, action, target, **params):
+        self.phase = phase
+        self.action = action
+        self.target = target
+        self.params = params
+
+    def serialize(self):
+        """
+        Serializes the step to a dictionary with secret parameters masked.
+
+        Returns:
+            dict: A dictionary representation of the step.
+        """
+        params = {
+            key: '********' if key in SECRET_PARAMS and value else value
+            for key, value in self.params.items()
+        }
+        return {'phase': self.phase, 'action': self.action, 'target': self.target, **params}
+
+
+def member_name(member):
+    """
+    Returns the username of a desired member given either as a string or as {"username": ...}.
+    """
+    return member.get('username') if isinstance(member, dict) else member
+
+
+def parse_desired_state(request_body):
+    """
+    Validates the desired state and indexes it by case-insensitive names.
+
+    Args:
+        request_body (dict): The desired state with 'users' and 'usergroups' lists.
+
+    Returns:
+        tuple: Desired users and desired user groups, both keyed by lowercase name.
+
+    Raises:
+        ValueError: If the desired state is malformed.
+    """
+    users, usergroups = request_body.get('users'), request_body.get('usergroups')
+    if not isinstance(users, list) or not isinstance(usergroups, list):
+        raise ValueError("Both users and usergroups should be lists")
+
+    desired_users = {}
+    for user in users:
+        if not isinstance(user, dict) or not user.get('username'):
+            raise ValueError("Every user should have a username")
+        desired_users[user['username'].lower()] = user
+
+    desired_usergroups = {}
+    for usergroup in usergroups:
+        if not isinstance(usergroup, dict) or not usergroup.get('name'):
+            raise ValueError("Every user group should have a name")
+        members = [member_name(member) for member in usergroup.get('users') or []]
+        if not all(members):
+            raise ValueError(f"Every member of user group {usergroup['name']} should have a username")
+        desired_usergroups[usergroup['name'].lower()] = {
+            'name': usergroup['name'],
+            'description': usergroup.get('description') or '',
+            'users': members,
+        }
+
+    return desired_users, desired_usergroups
+
+
+def build_plan(snapshot, desired_users, desired_usergroups, protected_users=(), protected_usergroups=(), prune=False):
+    """
+    Builds the minimal plan turning the snapshot into the desired state.
+
+    Local users and user groups missing from the desired state are only deleted when pruning,
+    and protected ones never are. Members should be either desired users or local users
+    that are kept.
+
+    Args:
+        snapshot (LocalSnapshot): The current local state.
+        desired_users (dict): Desired users keyed by lowercase username.
+        desired_usergroups (dict): Desired user groups keyed by lowercase name.
+        protected_users (iterable): Names of users that are never deleted.
+        protected_usergroups (iterable): Names of user groups that are never deleted.
+        prune (bool): Whether to delete local users and user groups missing from the desired state.
+
+    Returns:
+        list: The PlanStep objects ordered by phase.
+
+    Raises:
+        ValueError: If a desired user group has a member that won't exist.
+    """
+    protected_users = {name.lower() for name in protected_users}
+    protected_usergroups = {name.lower() for name in protected_usergroups}
+    local_users = {user.username.lower(): user for user in snapshot.users}
+    local_usergroups = {usergroup.name.lower(): usergroup for usergroup in snapshot.usergroups}
+
+    kept_users = local_users.keys() & protected_users if prune else local_users.keys()
+    known_members = desired_users.keys() | kept_users
+    for usergroup in desired_usergroups.values():
+        unknown = [member for member in usergroup['users'] if member.lower() not in known_members]
+        if unknown:
+            raise ValueError(f"User group {usergroup['name']} has unknown members: {', '.join(unknown)}")
+
+    plan = []
+    for key, user in desired_users.items():
+        if key not in local_users:
+            plan.append(PlanStep(CREATE_PHASE, 'create_user', user['username'], password=user.get('password')))
+        elif user.get('password'):
+            plan.append(PlanStep(CREATE_PHASE, 'set_password', local_users[key].username, password=user['password']))
+
+    for key, usergroup in desired_usergroups.items():
+        local_usergroup = local_usergroups.get(key)
+        if local_usergroup is None:
+            plan.append(PlanStep(CREATE_PHASE, 'create_usergroup', usergroup['name'], description=usergroup['description']))
+            local_members = {}
+        else:
+            if (local_usergroup.description or '') != usergroup['description']:
+                plan.append(PlanStep(CREATE_PHASE, 'set_description', local_usergroup.name, description=usergroup['description']))
+            local_members = {user.username.lower(): user.username for user in local_usergroup.users}
+
+        target = local_usergroup.name if local_usergroup else usergroup['name']
+        desired_members = {member.lower(): member for member in usergroup['users']}
+        for key_member in sorted(local_members.keys() - desired_members.keys()):
+            plan.append(PlanStep(MEMBERSHIP_PHASE, 'remove_member', target, member=local_members[key_member]))
+        added = [desired_members[key_member] for key_member in sorted(desired_members.keys() - local_members.keys())]
+        if added:
+            plan.append(PlanStep(MEMBERSHIP_PHASE, 'add_members', target, members=added))
+
+    if prune:
+        for key, usergroup in sorted(local_usergroups.items()):
+            if key not in desired_usergroups and key not in protected_usergroups:
+                plan.append(PlanStep(DELETE_PHASE, 'delete_usergroup', usergroup.name))
+        for key, user in sorted(local_users.items()):
+            if key not in desired_users and key not in protected_users:
+                plan.append(PlanStep(DELETE_PHASE, 'delete_user', user.username))
+
+    return sorted(plan, key=lambda step: PHASES.index(step.phase))
+
+
+def split_into_batches(plan, batch_size):
+    """
+    Splits 'add_members' steps into steps of at most batch_size members.
+
+    Args:
+        plan (list): The PlanStep objects.
+        batch_size (int): The maximum number of members added by one step.
+
+    Returns:
+        list: The PlanStep objects with large membership additions split.
+    """
+    batched = []
+    for step in plan:
+        if step.action != 'add_members':
+            batched.append(step)
+            continue
+        members = step.params['members']
+        batched += [
+            PlanStep(step.phase, step.action, step.target, members=members[start:start + batch_size])
+            for start in range(0, len(members), batch_size)
+        ]
+    return batched
+
+
+def apply_step(step):
+    """
+    Applies a single step and records the change.
+
+    Args:
+        step (PlanStep): The step to apply.
+    """
+    target, params = step.target, step.params
+    if step.action == 'create_user':
+        account_store.add_user(target, params.get('password'))
+        change_recorder.record(ChangeLogEntry.USER, 'created', target)
+    elif step.action == 'set_password':
+        account_store.edit_user_password(target, params['password'])
+        change_recorder.record(ChangeLogEntry.USER, 'password_changed', target)
+    elif step.action == 'delete_user':
+        account_store.delete_user(target)
+        change_recorder.record(ChangeLogEntry.USER, 'deleted', target)
+    elif step.action == 'create_usergroup':
+        account_store.add_usergroup(target, description=params.get('description'))
+        change_recorder.record(ChangeLogEntry.USERGROUP, 'created', target, description=params.get('description'), users=[])
+    elif step.action == 'set_description':
+        account_store.set_usergroup_description(target, params['description'])
+        change_recorder.record(ChangeLogEntry.USERGROUP, 'updated', target, description=params['description'])
+    elif step.action == 'remove_member':
+        account_store.remove_usergroup_user(target, params['member'])
+        change_recorder.record(ChangeLogEntry.USERGROUP, 'member_removed', target, member=params['member'])
+    elif step.action == 'add_members':
+        account_store.add_usergroup_users(target, params['members'])
+        for member in params['members']:
+            change_recorder.record(ChangeLogEntry.USERGROUP, 'member_added', target, member=member)
+    elif step.action == 'delete_usergroup':
+        account_store.delete_usergroup(target)
+        change_recorder.record(ChangeLogEntry.USERGROUP, 'deleted', target)
+    else:
+        raise ValueError(f"Unknown action {step.action}")
+
+
+def apply_plan(plan, max_workers):
+    """
+    Applies the plan phase by phase, running steps of the same phase in parallel.
+
+    A failed step doesn't abort the rest of the plan.
+
+    Args:
+        plan (list): The PlanStep objects.
+        max_workers (int): The maximum number of steps running at the same time.
+
+    Returns:
+        list: The result of every step: its serialization with 'status' and, on failure, 'error'.
+    """
+    def run(step):
+        try:
+            apply_step(step)
+            return {**step.serialize(), 'status': 'applied'}
+        except Exception as exc:
+            return {**step.serialize(), 'status': 'failed', 'error': str(exc)}
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for phase in PHASES:
+            results += executor.map(bind_context(run), [step for step in plan if step.phase == phase])
+    return results
@@ -0,0 +1,308 @@
+"""
+This module contains the SharedSnapshotStore class sharing local snapshots between worker processes.
+
+Snapshots are written to a directory as compact binary files named by their generation
+number. Every file is written under a unique temporary name and linked under the name of the
+next generation when complete, so readers never see a partial snapshot, and readers switch to
+the highest complete generation. Linking fails if another worker has published that generation
+meanwhile, and the snapshot is then published as the following one. Files
+are decoded straight from a memory map of the page cache all workers share, once per
+generation, and unmapped right away so old generations can be removed on Windows as well.
+
+A snapshot is used while younger than the maximum age and no change was recorded to the
+change log after it was taken. Otherwise the worker winning the 'snapshot' lease lists the
+accounts and publishes a new generation, while the other workers wait for it.
+
+Layout, little-endian:
+    header      magic, format version, generation, change log revision, taken_at,
+                string count, user count, user group count, member count
+    offsets     string count + 1 uint32 offsets into the string data
+    strings     UTF-8 string data, every distinct string once
+    users       name, SID, description, last logon, password last set (string indexes)
+                and enabled (0, 1 or 2 if unknown)
+    usergroups  name, description (string indexes), first member, member count
+    members     string indexes of member usernames
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from config.settings.base import SHARED_SNAPSHOT_DIR, SHARED_SNAPSHOT_MAX_AGE, SHARED_SNAPSHOT_WAIT
+from ..change_log.recorder import change_recorder
+from ..change_monitor.leader import LeaseElection, worker_id
+from ..diagnostics.tracing import tracer
+from ..user_groups.usergroups_scripts import Usergroup
+from ..users.user_scripts import User
+from .snapshot import LocalSnapshot, take_snapshot
+
+MAGIC = b'WUSS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHQQdIIII')
+# The generation number in the header, after the magic and the format version
+GENERATION = struct.Struct('<Q')
+GENERATION_OFFSET = struct.calcsize('<4sH')
+USER = struct.Struct('<IIIIIB')
+USERGROUP = struct.Struct('<IIII')
+INDEX = struct.Struct('<I')
+NONE = 0xFFFFFFFF
+FILE_PREFIX = 'snapshot-'
+FILE_SUFFIX = '.bin'
+
+
+def encode_snapshot(snapshot, generation, revision):
+    """
+    Encodes a snapshot in the binary layout.
+
+    Args:
+        snapshot (LocalSnapshot): The snapshot.
+        generation (int): The generation number of the snapshot.
+        revision (int): The change log revision the snapshot was taken at.
+
+    Returns:
+        bytes: The encoded snapshot.
+    """
+    strings, indexes = [], {}
+
+    def index(value):
+        if value is None:
+            return NONE
+        if value not in indexes:
+            indexes[value] = len(strings)
+            strings.append(value.encode('utf-8'))
+        return indexes[value]
+
+    users = [
+        USER.pack(
+            index(user.username), index(user.sid), index(user.description),
+            index(user.last_logon), index(user.password_last_set),
+            2 if user.enabled is None else int(user.enabled)
+        )
+        for user in snapshot.users
+    ]
+    usergroups, members = [], []
+    for usergroup in snapshot.usergroups:
+        usergroups.append(USERGROUP.pack(index(usergroup.name), index(usergroup.description), len(members), len(usergroup.users)))
+        members += [INDEX.pack(index(user.username)) for user in usergroup.users]
+
+    offsets, position = [], 0
+    for string in strings:
+        offsets.append(INDEX.pack(position))
+        position += len(string)
+    offsets.append(INDEX.pack(position))
+
+    return b''.join([
+        HEADER.pack(
+            MAGIC, FORMAT_VERSION, generation, revision, snapshot.taken_at,
+            len(strings), len(users), len(usergroups), len(members)
+        ),
+        *offsets, *strings, *users, *usergroups, *members
+    ])
+
+
+def decode_snapshot(buffer):
+    """
+    Decodes a snapshot from a buffer in the binary layout, e.g. a memory map.
+
+    Args:
+        buffer: The encoded snapshot.
+
+    Returns:
+        tuple: The generation, the change log revision and the LocalSnapshot.
+
+    Raises:
+        ValueError: If the buffer isn't a snapshot of this format version.
+    """
+    view = memoryview(buffer)
+    magic, version, generation, revision, taken_at, string_count, user_count, usergroup_count, member_count = \
+        HEADER.unpack_from(view)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError('Not a shared snapshot of a supported version')
+
+    position = HEADER.size
+    offsets = [offset for offset, in INDEX.iter_unpack(view[position:position + (string_count + 1) * INDEX.size])]
+    position += (string_count + 1) * INDEX.size
+    data = view[position:position + offsets[-1]]
+    strings = [str(data[offsets[i]:offsets[i + 1]], 'utf-8') for i in range(string_count)]
+    position += offsets[-1]
+
+    def string(index):
+        return None if index == NONE else strings[index]
+
+    users = []
+    for name, sid, description, last_logon, password_last_set, enabled in \
+            USER.iter_unpack(view[position:position + user_count * USER.size]):
+        users.append(User(
+            strings[name], sid=string(sid), enabled=None if enabled == 2 else bool(enabled),
+            description=string(description), last_logon=string(last_logon), password_last_set=string(password_last_set)
+        ))
+    position += user_count * USER.size
+
+    usergroup_entries = list(USERGROUP.iter_unpack(view[position:position + usergroup_count * USERGROUP.size]))
+    position += usergroup_count * USERGROUP.size
+    members = [strings[index] for index, in INDEX.iter_unpack(view[position:position + member_count * INDEX.size])]
+    usergroups = [
+        Usergroup(strings[name], string(description), [User(member) for member in members[first:first + count]])
+        for name, description, first, count in usergroup_entries
+    ]
+    return generation, revision, LocalSnapshot(users, usergroups, taken_at)
+
+
+class SharedSnapshotStore:
+    """
+    Shares snapshots of the local users and user groups between the workers of a host.
+
+    Attributes:
+        directory (str): The directory the snapshot files are kept in.
+        max_age (float): The number of seconds a snapshot is used for.
+        wait (float): The number of seconds a worker waits for another one's refresh before listing itself.
+        lister: Lists the accounts, returning a LocalSnapshot.
+    """
+    def __init__(self, directory, max_age, wait, lister):
+        self.directory = directory
+        self.max_age = max_age
+        self.wait = wait
+        self.lister = lister
+        self.election = LeaseElection('snapshot', worker_id(), wait)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._current = None
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self):
+        """
+        Returns the shared snapshot, refreshing it if it's stale.
+
+        Returns:
+            LocalSnapshot: The snapshot.
+        """
+        revision = change_recorder.current_revision()
+        current = self._latest()
+        if self._usable(current, revision):
+            return current[2]
+
+        # Threads of a worker share its lease, so they refresh one at a time
+        with self._refresh_lock:
+            deadline = time.monotonic() + self.wait
+            while True:
+                current = self._latest()
+                if self._usable(current, revision):
+                    return current[2]
+                if time.monotonic() >= deadline:
+                    return self.refresh()
+                if self.election.try_acquire():
+                    try:
+                        return self.refresh()
+                    finally:
+                        self.election.release()
+                time.sleep(0.05)
+
+    def refresh(self):
+        """
+        Lists the accounts and publishes them as a new generation.
+
+        Returns:
+            LocalSnapshot: The new snapshot.
+        """
+        revision = change_recorder.current_revision()
+        snapshot = self.lister()
+        self.publish(snapshot, revision)
+        return snapshot
+
+    def publish(self, snapshot, revision):
+        """
+        Writes a snapshot as the next generation and removes all but the two latest generations.
+
+        Args:
+            snapshot (LocalSnapshot): The snapshot.
+            revision (int): The change log revision taken before the snapshot was listed.
+        """
+        with tracer.span('shared_snapshot.publish', users=len(snapshot.users), usergroups=len(snapshot.usergroups)):
+            generations = self._generations()
+            generation = (generations[-1] if generations else 0) + 1
+            descriptor, temporary = tempfile.mkstemp(prefix=FILE_PREFIX, suffix='.tmp', dir=self.directory)
+            try:
+                with os.fdopen(descriptor, 'wb') as file:
+                    file.write(encode_snapshot(snapshot, generation, revision))
+                    file.flush()
+                    while True:
+                        try:
+                            # Unlike a rename, a link never replaces a generation published by another worker
+                            os.link(temporary, self._path(generation))
+                            break
+                        except FileExistsError:
+                            generation = max([generation, *self._generations()]) + 1
+                            file.seek(GENERATION_OFFSET)
+                            file.write(GENERATION.pack(generation))
+                            file.flush()
+            finally:
+                os.remove(temporary)
+
+            for old in self._generations():
+                if old >= generation - 1:
+                    break
+                try:
+                    os.remove(self._path(old))
+                except OSError:
+                    # Still mapped by a reader on Windows, removed by a later publish
+                    pass
+
+    def _usable(self, current, revision):
+        return current is not None and current[1] >= revision and time.time() - current[2].taken_at <= self.max_age
+
+    def _latest(self):
+        """
+        Returns the generation, revision and snapshot of the latest generation, mapping it if it's new.
+        """
+        generations = self._generations()
+        with self._lock:
+            if not generations:
+                return self._current
+            if self._current is not None and self._current[0] >= generations[-1]:
+                return self._current
+            try:
+                with open(self._path(generations[-1]), 'rb') as file, \
+                        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    try:
+                        self._current = decode_snapshot(mapped)
+                    except (ValueError, IndexError, struct.error):
+                        # Corrupt, the current generation is kept. Handled before the map is closed,
+                        # since the traceback references views of the map until then
+                        pass
+            except OSError:
+                pass
+            return self._current
+
+    def _generations(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(
+            int(name[len(FILE_PREFIX):-len(FILE_SUFFIX)]) for name in names
+            if name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)
+            and name[len(FILE_PREFIX):-len(FILE_SUFFIX)].isdigit()
+        )
+
+    def _path(self, generation):
+        return os.path.join(self.directory, f'{FILE_PREFIX}{generation:012d}{FILE_SUFFIX}')
+
+
+def local_snapshot():
+    """
+    Returns the snapshot shared between workers if SHARED_SNAPSHOT_DIR is set, or lists the accounts otherwise.
+
+    Returns:
+        LocalSnapshot: The snapshot of the local users and user groups.
+    """
+    if shared_snapshot_store is None:
+        return take_snapshot()
+    return shared_snapshot_store.get()
+
+
+shared_snapshot_store = SharedSnapshotStore(
+    SHARED_SNAPSHOT_DIR, SHARED_SNAPSHOT_MAX_AGE, SHARED_SNAPSHOT_WAIT, take_snapshot
+) if SHARED_SNAPSHOT_DIR else None
@@ -0,0 +1,37 @@
+"""
+This module contains the LocalSnapshot class representing the local users and user groups.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ..accounts.store import account_store
+from ..diagnostics.context import bind_context
+
+
+class LocalSnapshot:
+    """
+    Represents local users and user groups listed at one point in time.
+
+    Attributes:
+        users (list): A list of User objects.
+        usergroups (list): A list of Usergroup objects.
+        taken_at (float): The time the snapshot was taken at, as returned by time.time().
+    """
+    def __init__(self, users, usergroups, taken_at=None):
+        self.users = users
+        self.usergroups = usergroups
+        self.taken_at = taken_at if taken_at is not None else time.time()
+
+
+def take_snapshot():
+    """
+    Lists local users and user groups concurrently.
+
+    Returns:
+        LocalSnapshot: The snapshot of the local users and user groups.
+    """
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        users = executor.submit(bind_context(account_store.get_users))
+        usergroups = executor.submit(bind_context(account_store.get_usergroups))
+        return LocalSnapshot(users.result(), usergroups.result())
@@ -0,0 +1,165 @@
+import os
+import tempfile
+
+from django.test import SimpleTestCase, TestCase
+
+from .reconcile import PHASES, build_plan, parse_desired_state, split_into_batches
+from .shared import SharedSnapshotStore, decode_snapshot, encode_snapshot
+from .snapshot import LocalSnapshot
+from ..change_log.models import ChangeLogEntry
+from ..change_log.recorder import change_recorder
+from ..user_groups.usergroups_scripts import Usergroup
+from ..users.user_scripts import User
+
+
+class BuildPlanTests(SimpleTestCase):
+    """
+    Plans turning a local snapshot into a desired state.
+    """
+    def setUp(self):
+        self.snapshot = LocalSnapshot(
+            [User('Administrator'), User('alice'), User('bob')],
+            [
+                Usergroup('Administrators', '', [User('Administrator')]),
+                Usergroup('staff', 'Staff', [User('alice'), User('bob')]),
+                Usergroup('old', '', []),
+            ]
+        )
+
+    def plan(self, body, prune=False):
+        desired_users, desired_usergroups = parse_desired_state(body)
+        return build_plan(self.snapshot, desired_users, desired_usergroups, ['Administrator'], ['Administrators'], prune)
+
+    def steps(self, plan):
+        return [(step.phase, step.action, step.target) for step in plan]
+
+    def test_phases_run_in_order(self):
+        plan = self.plan({
+            'users': [{'username': 'alice'}, {'username': 'carol'}],
+            'usergroups': [{'name': 'staff', 'description': 'Staff', 'users': ['alice', 'carol']}],
+        }, prune=True)
+
+        self.assertEqual(self.steps(plan), [
+            ('create', 'create_user', 'carol'),
+            ('membership', 'remove_member', 'staff'),
+            ('membership', 'add_members', 'staff'),
+            ('delete', 'delete_usergroup', 'old'),
+            ('delete', 'delete_user', 'bob'),
+        ])
+        self.assertEqual([step.phase for step in plan], sorted((step.phase for step in plan), key=PHASES.index))
+
+    def test_missing_entries_are_kept_without_pruning(self):
+        plan = self.plan({'users': [{'username': 'carol'}], 'usergroups': [{'name': 'staff', 'description': 'Staff', 'users': ['alice', 'bob']}]})
+
+        self.assertEqual(self.steps(plan), [('create', 'create_user', 'carol')])
+
+    def test_protected_entries_are_never_deleted(self):
+        plan = self.plan({'users': [], 'usergroups': []}, prune=True)
+
+        self.assertEqual(self.steps(plan), [
+            ('delete', 'delete_usergroup', 'old'),
+            ('delete', 'delete_usergroup', 'staff'),
+            ('delete', 'delete_user', 'alice'),
+            ('delete', 'delete_user', 'bob'),
+        ])
+
+    def test_members_should_be_kept_users(self):
+        body = {'users': [], 'usergroups': [{'name': 'staff', 'users': ['Administrator', 'alice']}]}
+
+        self.assertEqual(self.steps(self.plan(body)), [
+            ('create', 'set_description', 'staff'),
+            ('membership', 'remove_member', 'staff'),
+            ('membership', 'add_members', 'staff'),
+        ])
+        with self.assertRaisesMessage(ValueError, 'unknown members: alice'):
+            self.plan(body, prune=True)
+
+    def test_passwords_are_masked(self):
+        plan = self.plan({'users': [{'username': 'carol', 'password': 'P@ss1'}], 'usergroups': []})
+
+        self.assertEqual(plan[0].serialize()['password'], '********')
+        self.assertEqual(plan[0].params['password'], 'P@ss1')
+
+    def test_member_additions_are_batched(self):
+        plan = self.plan({
+            'users': [{'username': name} for name in ('carol', 'dave', 'erin')],
+            'usergroups': [{'name': 'new', 'users': ['carol', 'dave', 'erin']}],
+        })
+
+        additions = [step.params['members'] for step in split_into_batches(plan, 2) if step.action == 'add_members']
+        self.assertEqual(additions, [['carol', 'dave'], ['erin']])
+
+
+def snapshot_names(snapshot):
+    return (
+        [user.serialize() for user in snapshot.users],
+        [(usergroup.name, usergroup.description, [user.username for user in usergroup.users]) for usergroup in snapshot.usergroups],
+    )
+
+
+class SharedSnapshotTests(TestCase):
+    """
+    Snapshots shared between workers through generation files.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.listings = 0
+        self.store = SharedSnapshotStore(self.directory, 60, 1, self.list_accounts)
+
+    def list_accounts(self):
+        self.listings += 1
+        return LocalSnapshot(
+            [User('alice', sid='S-1-5-21-1', enabled=True), User('Zoë', enabled=None, description='')],
+            [Usergroup('staff', None, [User('alice'), User('Zoë')]), Usergroup('empty', 'Nobody', [])]
+        )
+
+    def files(self):
+        return sorted(name for name in os.listdir(self.directory) if name.endswith('.bin'))
+
+    def test_encoded_snapshot_decodes_unchanged(self):
+        snapshot = self.list_accounts()
+
+        generation, revision, decoded = decode_snapshot(encode_snapshot(snapshot, 7, 42))
+
+        self.assertEqual((generation, revision, decoded.taken_at), (7, 42, snapshot.taken_at))
+        self.assertEqual(snapshot_names(decoded), snapshot_names(snapshot))
+
+    def test_other_data_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_snapshot(b'XXXX' + encode_snapshot(self.list_accounts(), 1, 0)[4:])
+
+    def test_snapshot_is_listed_once_until_a_change_is_recorded(self):
+        self.store.get()
+        self.store.get()
+        self.assertEqual(self.listings, 1)
+
+        change_recorder.record(ChangeLogEntry.USER, 'created', 'bob')
+        self.store.get()
+        self.assertEqual(self.listings, 2)
+
+    def test_other_workers_read_the_published_generation(self):
+        self.store.get()
+        other = SharedSnapshotStore(self.directory, 60, 1, self.list_accounts)
+
+        self.assertEqual(snapshot_names(other.get()), snapshot_names(self.list_accounts()))
+        self.assertEqual(self.listings, 2)
+
+    def test_only_the_two_latest_generations_are_kept(self):
+        for _ in range(4):
+            self.store.refresh()
+
+        self.assertEqual(self.files(), ['snapshot-000000000003.bin', 'snapshot-000000000004.bin'])
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith('.tmp')], [])
+
+    def test_corrupt_generation_keeps_the_current_one(self):
+        self.store.get()
+        # Maps the published generation
+        self.store.get()
+        with open(os.path.join(self.directory, 'snapshot-000000000002.bin'), 'wb') as file:
+            file.write(b'corrupt')
+
+        self.store.get()
+
+        self.assertEqual(self.listings, 1)
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('', views.put_state, name='put_state'),
+    path('digest/', views.get_state_digest, name='get_state_digest'),
+]
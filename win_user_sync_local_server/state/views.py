@@ -0,0 +1,174 @@
+"""
+This module contains views for comparing and reconciling the local state.
+"""
+
+import json
+from django.http import JsonResponse
+from django_keycloak_auth.decorators import keycloak_roles
+from rest_framework.decorators import api_view
+
+from config.settings.base import (
+    PRINCIPAL_ROLE_NAME,
+    STATE_APPLY_BATCH_SIZE,
+    STATE_APPLY_WORKERS,
+    STATE_PROTECTED_USERGROUPS,
+    STATE_PROTECTED_USERS
+)
+from .digest import DIGEST_BUCKETS, state_root, usergroups_digest, users_digest
+from .reconcile import apply_plan, build_plan, parse_desired_state, split_into_batches
+from .shared import local_snapshot
+from .snapshot import take_snapshot
+
+DIGEST_KINDS = ('users', 'usergroups')
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['GET'])
+def get_state_digest(request):
+    """
+    API endpoint to retrieve Merkle-style digests of local users and user groups.
+
+    Without URL parameters returns the root hash and the bucket hashes of users and user groups.
+    With 'kind' ('users' or 'usergroups') and 'bucket' returns the hash of every entry in the bucket.
+
+    Args:
+        request (HttpRequest): The request object.
+
+    Returns:
+        JsonResponse: A JSON response containing the requested digest level.
+    """
+    kind = request.GET.get('kind')
+    bucket = request.GET.get('bucket')
+    if (kind is None) != (bucket is None):
+        return JsonResponse(
+            {"error": "Parameters kind and bucket should be specified together"},
+            status=400,
+            content_type='application/json'
+        )
+
+    if bucket is not None:
+        try:
+            bucket = int(bucket)
+        except ValueError:
+            bucket = -1
+        if kind not in DIGEST_KINDS or not 0 <= bucket < DIGEST_BUCKETS:
+            return JsonResponse(
+                {"error": f"Invalid kind or bucket parameter. Kind should be one of {', '.join(DIGEST_KINDS)} "
+                          f"and bucket should be between 0 and {DIGEST_BUCKETS - 1}"},
+                status=400,
+                content_type='application/json'
+            )
+
+    try:
+        snapshot = local_snapshot()
+        digests = {
+            'users': users_digest(snapshot.users),
+            'usergroups': usergroups_digest(snapshot.usergroups),
+        }
+    except Exception as exc:
+        return JsonResponse(
+            {"error": f"Error computing the state digest: {str(exc)}"},
+            status=500,
+            content_type='application/json'
+        )
+
+    if bucket is not None:
+        return JsonResponse(
+            {
+                'kind': kind,
+                'bucket': bucket,
+                'hash': digests[kind].bucket_hashes[bucket],
+                'entries': digests[kind].bucket(bucket)
+            },
+            content_type='application/json'
+        )
+
+    return JsonResponse(
+        {
+            'root': state_root(digests['users'].root, digests['usergroups'].root),
+            'bucket_count': DIGEST_BUCKETS,
+            'users': digests['users'].serialize(),
+            'usergroups': digests['usergroups'].serialize()
+        },
+        content_type='application/json'
+    )
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['PUT'])
+def put_state(request):
+    """
+    API endpoint to reconcile local users and user groups with the desired state.
+
+    Expects a JSON body with the 'users' and 'usergroups' lists. Users and user groups
+    missing from the lists are deleted, unless protected, only with the 'prune' URL parameter.
+    With the 'dry_run' URL parameter the plan is returned without being applied.
+
+    Args:
+        request (HttpRequest): The request object containing the JSON body.
+
+    Returns:
+        JsonResponse: A JSON response containing the plan and the result of every applied step.
+    """
+    try:
+        request_body = json.loads(request.body.decode('utf-8'))
+        desired_users, desired_usergroups = parse_desired_state(request_body)
+    except json.JSONDecodeError:
+        return JsonResponse(
+            {"error": "Invalid JSON body"},
+            status=400,
+            content_type='application/json'
+        )
+    except (AttributeError, ValueError) as exc:
+        return JsonResponse(
+            {"error": f"Invalid desired state: {str(exc)}"},
+            status=400,
+            content_type='application/json'
+        )
+
+    dry_run = request.GET.get('dry_run', '').lower() in ('1', 'true', 'yes')
+    prune = request.GET.get('prune', '').lower() in ('1', 'true', 'yes')
+
+    try:
+        snapshot = take_snapshot()
+    except Exception as exc:
+        return JsonResponse(
+            {"error": f"Error retrieving the local state: {str(exc)}"},
+            status=500,
+            content_type='application/json'
+        )
+
+    try:
+        plan = build_plan(
+            snapshot,
+            desired_users,
+            desired_usergroups,
+            STATE_PROTECTED_USERS,
+            STATE_PROTECTED_USERGROUPS,
+            prune
+        )
+    except ValueError as exc:
+        return JsonResponse(
+            {"error": f"Invalid desired state: {str(exc)}"},
+            status=400,
+            content_type='application/json'
+        )
+
+    plan = split_into_batches(plan, STATE_APPLY_BATCH_SIZE)
+    if dry_run:
+        return JsonResponse(
+            {'dry_run': True, 'plan': [step.serialize() for step in plan]},
+            content_type='application/json'
+        )
+
+    results = apply_plan(plan, STATE_APPLY_WORKERS)
+    failed = sum(1 for result in results if result['status'] == 'failed')
+    return JsonResponse(
+        {
+            'dry_run': False,
+            'applied': len(results) - failed,
+            'failed': failed,
+            'results': results
+        },
+        content_type='application/json'
+    )
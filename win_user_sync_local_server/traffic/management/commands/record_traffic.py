@@ -0,0 +1,22 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from ...recording import traffic_recorder
+
+
+class Command(BaseCommand):
+    help = "Runs the development server recording sanitized API traffic to a JSON-lines file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="The JSON-lines file records are appended to.")
+        parser.add_argument('addrport', nargs='?', default='', help="Optional port number, or ipaddr:port.")
+
+    def handle(self, *args, **options):
+        traffic_recorder.start(options['output'])
+        self.stdout.write(f"Recording traffic to {options['output']}")
+        try:
+            # The recorder lives in this process, so the autoreloader can't be used
+            addrport = [options['addrport']] if options['addrport'] else []
+            call_command('runserver', *addrport, use_reloader=False)
+        finally:
+            traffic_recorder.stop()
@@ -0,0 +1,56 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...replay import Replayer, load_records
+
+
+class Command(BaseCommand):
+    help = "Replays recorded API traffic against a server and reports latency percentiles and error rates per route."
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="The JSON-lines file written by record_traffic.")
+        parser.add_argument('--target', default='http://localhost:8000', help="The URL of the server.")
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help="The speed factor, e.g. 2 for twice as fast. 0 sends requests back to back.")
+        parser.add_argument('--concurrency', type=int, default=8, help="The maximum number of requests in flight.")
+        parser.add_argument('--token-env', default='REPLAY_TOKEN',
+                            help="The environment variable holding the bearer token sent with every request.")
+        parser.add_argument('--password-env', default='REPLAY_PASSWORD',
+                            help="The environment variable holding the password sent in place of recorded ones.")
+        parser.add_argument('--timeout', type=float, default=60.0, help="The timeout of a single request in seconds.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        if options['speed'] < 0 or options['concurrency'] < 1:
+            raise CommandError("speed should be non-negative and concurrency positive")
+        try:
+            records = load_records(options['input'])
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f"Can't read records: {str(exc)}")
+
+        token = os.environ.get(options['token_env'])
+        replayer = Replayer(
+            options['target'],
+            speed=options['speed'],
+            concurrency=options['concurrency'],
+            headers={'Authorization': f'Bearer {token}'} if token else None,
+            password=os.environ.get(options['password_env']),
+            timeout=options['timeout']
+        )
+        report = replayer.replay(records)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Replayed {len(records)} requests in {report['elapsed']}s")
+        self.stdout.write(
+            f"{'route':<60} {'requests':>8} {'errors':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+        )
+        for route, summary in report['routes'].items():
+            self.stdout.write(
+                f"{route:<60} {summary['requests']:>8} {summary['error_rate']:>7.1%} "
+                f"{summary['p50_ms']:>9} {summary['p90_ms']:>9} {summary['p99_ms']:>9} {summary['max_ms']:>9}"
+            )
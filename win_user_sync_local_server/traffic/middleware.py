@@ -0,0 +1,29 @@
+"""
+This module contains the middleware recording API traffic.
+"""
+
+import time
+
+from .recording import FORM_CONTENT_TYPE, traffic_recorder
+
+
+class TrafficRecordingMiddleware:
+    """
+    Hands requests to the traffic recorder while recording is started.
+
+    Should be placed right after the tracing middleware, so that the recorded timing
+    covers authentication and admission control.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not traffic_recorder.active:
+            return self.get_response(request)
+
+        # The body is read before the view consumes the request stream
+        body = request.body if request.content_type in ('application/json', FORM_CONTENT_TYPE) else None
+        started = time.perf_counter()
+        response = self.get_response(request)
+        traffic_recorder.record(request, body, response, time.perf_counter() - started)
+        return response
@@ -0,0 +1,163 @@
+"""
+This module contains the TrafficRecorder class for recording sanitized API traffic.
+
+Names of users and user groups are replaced with pseudonyms, stable within one recording,
+so that requests touching the same entity still do so on replay. Passwords are dropped
+and only the shape of other body values is kept, for JSON and form-encoded bodies alike.
+Numbers, booleans and the URL parameters controlling a listing's output are kept as they are.
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+
+from django.http import QueryDict
+
+from config.settings.base import TRAFFIC_RECORD_FILE
+
+# Modules of the views whose traffic is recorded
+RECORDED_VIEW_MODULES = (
+    'win_user_sync_local_server.users.views',
+    'win_user_sync_local_server.user_groups.views',
+    'win_user_sync_local_server.change_monitor.views',
+)
+
+SECRET_KEYS = ('password',)
+SECRET_PLACEHOLDER = '<secret>'
+# URL parameters whose values are kept, since they control the output rather than name entities
+CONTROL_PARAMETERS = ('format', 'shape', 'limit', 'after', 'dry_run')
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+
+
+class TrafficRecorder:
+    """
+    Appends sanitized request records to a JSON-lines file while recording is started.
+
+    Every record has the offset in seconds from the start of the recording ('t'), the
+    'method', the 'route' with its pseudonymized 'params', the 'query', the shape of a JSON
+    'body' or of 'form' fields, the response 'status' and the 'duration_ms'.
+    """
+    def __init__(self):
+        self.path = None
+        self._file = None
+        self._salt = None
+        self._started = None
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self._file is not None
+
+    def start(self, path):
+        """
+        Starts appending records to the given file.
+
+        Args:
+            path (str): The path of the JSON-lines file.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self.path = path
+            self._file = open(path, 'a', encoding='utf-8')
+            self._salt = secrets.token_bytes(16)
+            self._started = time.monotonic()
+
+    def stop(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = None
+
+    def pseudonym(self, value):
+        """
+        Returns a pseudonym of a name that's valid as a Windows user or user group name.
+        """
+        return 'r-' + hashlib.sha256(self._salt + value.encode('utf-8')).hexdigest()[:12]
+
+    def sanitize(self, value, key=None):
+        """
+        Replaces strings of a JSON value with pseudonyms and secrets with a placeholder.
+
+        Args:
+            value: The JSON value.
+            key (str, optional): The key the value is found under.
+
+        Returns:
+            The sanitized value of the same shape.
+        """
+        if isinstance(value, dict):
+            return {item_key: self.sanitize(item, item_key) for item_key, item in value.items()}
+        if isinstance(value, list):
+            return [self.sanitize(item, key) for item in value]
+        if isinstance(value, str):
+            return SECRET_PLACEHOLDER if key in SECRET_KEYS else self.pseudonym(value)
+        return value
+
+    def sanitize_parameters(self, params):
+        """
+        Sanitizes URL parameters or form fields, keeping control parameters, numbers and booleans.
+
+        Args:
+            params (QueryDict): The parameters.
+
+        Returns:
+            dict: The sanitized value of every parameter.
+        """
+        def sanitize(key, value):
+            if key in CONTROL_PARAMETERS:
+                return value
+            if key not in SECRET_KEYS and (value.isdigit() or value.lower() in ('true', 'false')):
+                return value
+            return self.sanitize(value, key)
+
+        return {key: sanitize(key, value) for key, value in params.items()}
+
+    def record(self, request, body, response, duration):
+        """
+        Records a request to a recorded view. Other requests are ignored.
+
+        Args:
+            request (HttpRequest): The request object.
+            body (bytes): The JSON or form-encoded body of the request, read before the view consumed it.
+            response (HttpResponse): The response object.
+            duration (float): The time it took to respond in seconds.
+        """
+        match = request.resolver_match
+        if not self.active or match is None or match.func.__module__ not in RECORDED_VIEW_MODULES:
+            return
+
+        body_shape, form_shape = None, None
+        if body and request.content_type == FORM_CONTENT_TYPE:
+            form_shape = self.sanitize_parameters(QueryDict(body, encoding=request.encoding))
+        elif body:
+            try:
+                body_shape = self.sanitize(json.loads(body))
+            except ValueError:
+                body_shape = SECRET_PLACEHOLDER
+
+        with self._lock:
+            if self._file is None:
+                return
+            record = {
+                't': round(time.monotonic() - self._started, 3),
+                'method': request.method,
+                'route': match.route,
+                'url_name': match.url_name,
+                'params': {key: self.pseudonym(str(value)) for key, value in match.kwargs.items()},
+                'query': self.sanitize_parameters(request.GET),
+                'body': body_shape,
+                'form': form_shape,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 3),
+            }
+            self._file.write(json.dumps(record) + os.linesep)
+            self._file.flush()
+
+
+traffic_recorder = TrafficRecorder()
+if TRAFFIC_RECORD_FILE:
+    traffic_recorder.start(TRAFFIC_RECORD_FILE)
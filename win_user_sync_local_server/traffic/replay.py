@@ -0,0 +1,170 @@
+"""
+This module contains the Replayer class for playing recorded API traffic back.
+"""
+
+import json
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .recording import SECRET_PLACEHOLDER
+
+ROUTE_PARAM_PATTERN = re.compile(r'<(?:\w+:)?(\w+)>')
+
+
+def load_records(path):
+    """
+    Reads records from a JSON-lines file, ordered by their offset.
+
+    Args:
+        path (str): The path of the file.
+
+    Returns:
+        list: The records as dictionaries.
+    """
+    with open(path, encoding='utf-8') as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    return sorted(records, key=lambda record: record['t'])
+
+
+def build_path(route, params):
+    """
+    Fills the parameters of a route, e.g. 'users/<str:username>/', with the given values.
+    """
+    return '/' + ROUTE_PARAM_PATTERN.sub(lambda match: params[match.group(1)], route)
+
+
+def materialize(shape, password):
+    """
+    Turns a recorded body shape into a body, replacing secret placeholders with the given password.
+    """
+    if isinstance(shape, dict):
+        return {key: materialize(value, password) for key, value in shape.items()}
+    if isinstance(shape, list):
+        return [materialize(value, password) for value in shape]
+    return password if shape == SECRET_PLACEHOLDER else shape
+
+
+def percentile(sorted_values, percent):
+    """
+    Returns the nearest-rank percentile of sorted values or None if there are none.
+    """
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)]
+
+
+class RouteStats:
+    """
+    Accumulates the results of replayed requests of a single route.
+    """
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.status_mismatches = 0
+
+    def add(self, latency, error, status_mismatch):
+        self.latencies.append(latency)
+        self.errors += error
+        self.status_mismatches += status_mismatch
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            'requests': len(latencies),
+            'error_rate': round(self.errors / len(latencies), 4) if latencies else 0,
+            'status_mismatches': self.status_mismatches,
+            'p50_ms': percentile(latencies, 50),
+            'p90_ms': percentile(latencies, 90),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': latencies[-1] if latencies else None,
+        }
+
+
+class Replayer:
+    """
+    Plays records back against a server, keeping their relative timing.
+
+    Attributes:
+        base_url (str): The URL of the server, e.g. 'http://localhost:8000'.
+        speed (float): The speed factor, e.g. 2 plays the traffic twice as fast. 0 sends requests back to back.
+        concurrency (int): The maximum number of requests in flight.
+        headers (dict): Headers sent with every request, e.g. Authorization.
+        password (str): The password sent in place of recorded secrets.
+        timeout (float): The timeout of a single request in seconds.
+    """
+    def __init__(self, base_url, speed=1.0, concurrency=8, headers=None, password=None, timeout=60.0):
+        self.base_url = base_url.rstrip('/')
+        self.speed = speed
+        self.concurrency = concurrency
+        self.headers = headers or {}
+        self.password = password
+        self.timeout = timeout
+        self._stats = defaultdict(RouteStats)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def replay(self, records):
+        """
+        Replays the records and returns the statistics per route.
+
+        Requests are sent at their offsets from the first record divided by the speed factor. When all
+        workers are busy, requests wait for a free one and the lag shows in their latency.
+
+        Args:
+            records (list): The records ordered by their offset.
+
+        Returns:
+            dict: Summaries with the request count, error rate and latency percentiles keyed by
+                '<method> <route>', and the total 'elapsed' seconds.
+        """
+        first_offset = records[0]['t'] if records else 0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for record in records:
+                if self.speed:
+                    delay = (record['t'] - first_offset) / self.speed - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                executor.submit(self._send, record, time.monotonic())
+
+        return {
+            'elapsed': round(time.monotonic() - started, 3),
+            'routes': {route: stats.summary() for route, stats in sorted(self._stats.items())},
+        }
+
+    def _session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update(self.headers)
+        return session
+
+    def _send(self, record, scheduled_at):
+        url = self.base_url + build_path(record['route'], record.get('params') or {})
+        body, form = record.get('body'), record.get('form')
+        try:
+            response = self._session().request(
+                record['method'],
+                url,
+                params=record.get('query') or None,
+                data=materialize(form, self.password) if form is not None else None,
+                json=materialize(body, self.password) if body is not None else None,
+                timeout=self.timeout
+            )
+            status = response.status_code
+        except requests.RequestException:
+            status = None
+
+        latency = round((time.monotonic() - scheduled_at) * 1000, 3)
+        with self._lock:
+            self._stats[f"{record['method']} {record['route']}"].add(
+                latency,
+                status is None or status >= 400,
+                status != record.get('status')
+            )
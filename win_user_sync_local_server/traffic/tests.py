@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from .recording import SECRET_PLACEHOLDER, TrafficRecorder
+from .replay import materialize
+
+
+class TrafficRecorderTests(SimpleTestCase):
+    """
+    Sanitization of recorded requests.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'traffic.jsonl')
+        self.recorder = TrafficRecorder()
+        self.recorder.start(self.path)
+        self.addCleanup(self.recorder.stop)
+
+    def record(self, request, body=None, **kwargs):
+        request.resolver_match = SimpleNamespace(
+            func=SimpleNamespace(__module__='win_user_sync_local_server.users.views'),
+            route='users/<str:username>/', url_name='get_user', kwargs=kwargs
+        )
+        self.recorder.record(request, body, HttpResponse(status=200), 0.01)
+        with open(self.path, encoding='utf-8') as file:
+            return json.loads(file.readlines()[-1])
+
+    def test_names_are_pseudonymized_consistently(self):
+        record = self.record(RequestFactory().get('/users/alice/'), username='alice')
+        other = self.record(RequestFactory().get('/users/alice/'), username='alice')
+
+        self.assertNotEqual(record['params']['username'], 'alice')
+        self.assertEqual(record['params']['username'], other['params']['username'])
+
+    def test_control_parameters_numbers_and_booleans_are_kept(self):
+        request = RequestFactory().get('/users/', {
+            'format': 'ndjson', 'shape': 'compact', 'limit': '50', 'after': 'alice', 'dry_run': '1',
+            'enabled': 'true', 'prefix': 'adm',
+        })
+
+        query = self.record(request)['query']
+
+        self.assertEqual({key: value for key, value in query.items() if key != 'prefix'}, {
+            'format': 'ndjson', 'shape': 'compact', 'limit': '50', 'after': 'alice', 'dry_run': '1', 'enabled': 'true',
+        })
+        self.assertNotEqual(query['prefix'], 'adm')
+
+    def test_json_body_keeps_its_shape(self):
+        body = json.dumps({'username': 'alice', 'password': 'P@ss1', 'interval': 30}).encode('utf-8')
+        request = RequestFactory().post('/users/create/', body, content_type='application/json')
+
+        record = self.record(request, body)
+
+        self.assertEqual(record['body']['password'], SECRET_PLACEHOLDER)
+        self.assertEqual(record['body']['interval'], 30)
+        self.assertNotEqual(record['body']['username'], 'alice')
+        self.assertIsNone(record['form'])
+
+    def test_form_body_keeps_its_shape(self):
+        body = b'interval=30&password=1234&name=alice'
+        request = RequestFactory().post('/start/', body, content_type='application/x-www-form-urlencoded')
+
+        record = self.record(request, body)
+
+        self.assertEqual(record['form']['interval'], '30')
+        self.assertEqual(record['form']['password'], SECRET_PLACEHOLDER)
+        self.assertNotEqual(record['form']['name'], 'alice')
+        self.assertIsNone(record['body'])
+
+    def test_replayed_body_gets_the_password(self):
+        self.assertEqual(
+            materialize({'interval': '30', 'password': SECRET_PLACEHOLDER}, 'secret'),
+            {'interval': '30', 'password': 'secret'}
+        )
+
+    def test_other_views_are_not_recorded(self):
+        request = RequestFactory().get('/healthz/')
+        request.resolver_match = SimpleNamespace(func=SimpleNamespace(__module__='other.views'))
+
+        with mock.patch.object(self.recorder, '_file') as file:
+            self.recorder.record(request, None, HttpResponse(), 0.01)
+        file.write.assert_not_called()
@@ -9,6 +9,7 @@ from .views import (
     rename_usergroup,
     add_user_to_usergroup,
     delete_usergroup,
+    bulk_delete_usergroups,
     remove_user_from_usergroup
 )
 
@@ -29,4 +30,7 @@ urlpatterns = [
     # Delete
     path('delete/<str:usergroup_name>/', delete_usergroup, name='delete_usergroup'),
     path('remove-user/<str:usergroup_name>/<str:username>/', remove_user_from_usergroup, name='remove_user_from_usergroup'),
+
+    # Bulk
+    path('bulk/delete/', bulk_delete_usergroups, name='bulk_delete_usergroups'),
 ]
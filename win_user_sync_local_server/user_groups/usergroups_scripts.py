@@ -1,7 +1,8 @@
-import subprocess
 from concurrent.futures import ThreadPoolExecutor
 
-from ..users.user_scripts import User, deserialize_users
+from ..diagnostics.context import bind_context
+from ..diagnostics.tracing import tracer
+from ..users.user_scripts import LocalShell, User, deserialize_users, run_bulk_script
 
 
 def skip_header(output, lines_to_skip=1):
@@ -60,13 +61,15 @@ class UsergroupEditor:
 
     Attributes:
         powershell_path (str): The path to the PowerShell executable.
+        shell: Runs the commands. Defaults to a LocalShell, see the remoting package for remote hosts.
     """
-    def __init__(self, powershell_path):
+    def __init__(self, powershell_path, shell=None):
         self.powershell_path = powershell_path
+        self.shell = shell or LocalShell(powershell_path)
 
     def _run_powershell_command(self, command):
         """
-        Executes a PowerShell command using subprocess.
+        Executes a PowerShell command with the shell.
 
         Args:
             command (str): The PowerShell command to execute.
@@ -74,12 +77,9 @@ class UsergroupEditor:
         Returns:
             str: The stdout output from the command.
         """
-        result = subprocess.run(
-            [self.powershell_path, '-NoProfile', '-ExecutionPolicy', 'Bypass', '-Command', command],
-            capture_output=True, text=True
-        )
-        return result.stdout.strip()
+        return self.shell.run(command)
 
+    @tracer.traced()
     def add(self, usergroup_name, description=None, users=None):
         """
         Creates a new user group.
@@ -96,6 +96,7 @@ class UsergroupEditor:
         if users:
             self.add_users(usergroup_name, users)
 
+    @tracer.traced()
     def rename(self, old_usergroup_name, new_usergroup_name):
         """
         Renames an existing user group.
@@ -108,6 +109,20 @@ class UsergroupEditor:
             f'Rename-LocalGroup -Name "{old_usergroup_name}" -NewName "{new_usergroup_name}"'
         )
 
+    @tracer.traced()
+    def set_description(self, usergroup_name, description):
+        """
+        Sets the description of an existing user group.
+
+        Args:
+            usergroup_name (str): The name of the user group.
+            description (str): The new description of the user group.
+        """
+        self._run_powershell_command(
+            f'Set-LocalGroup -Name "{usergroup_name}" -Description "{description or ""}"'
+        )
+
+    @tracer.traced()
     def remove_user(self, usergroup_name, username):
         """
         Removes users from an existing user group.
@@ -120,6 +135,7 @@ class UsergroupEditor:
             f'Remove-LocalGroupMember -Group "{usergroup_name}" -Member "{username}"'
         )
 
+    @tracer.traced()
     def add_users(self, usergroup_name, users):
         """
         Adds users to an existing user group concurrently using ThreadPoolExecutor.
@@ -133,8 +149,10 @@ class UsergroupEditor:
             for user in deserialize_users(users)
         ]
         with ThreadPoolExecutor() as executor:
-            executor.map(self._run_powershell_command, commands)
+            # Consumed so that a failed addition raises
+            list(executor.map(bind_context(self._run_powershell_command), commands))
 
+    @tracer.traced()
     def delete(self, usergroup_name):
         """
         Deletes an existing user group.
@@ -144,6 +162,19 @@ class UsergroupEditor:
         """
         self._run_powershell_command(f'Remove-LocalGroup -Name "{usergroup_name}"')
 
+    @tracer.traced()
+    def delete_many(self, usergroup_names):
+        """
+        Deletes many user groups in a single PowerShell invocation.
+
+        Args:
+            usergroup_names (list): The names of the user groups to delete.
+
+        Returns:
+            dict: The error of every user group or None if it was deleted, keyed by lowercase name.
+        """
+        return run_bulk_script(self.shell, 'delete-usergroups', usergroup_names)
+
 
 class UsergroupRetriever:
     """
@@ -151,13 +182,15 @@ class UsergroupRetriever:
 
     Attributes:
         powershell_path (str): The path to the PowerShell executable.
+        shell: Runs the commands. Defaults to a LocalShell, see the remoting package for remote hosts.
     """
-    def __init__(self, powershell_path):
+    def __init__(self, powershell_path, shell=None):
         self.powershell_path = powershell_path
+        self.shell = shell or LocalShell(powershell_path)
 
     def _run_powershell_command(self, command):
         """
-        Executes a PowerShell command using subprocess.
+        Executes a PowerShell command with the shell.
 
         Args:
             command (str): The PowerShell command to execute.
@@ -165,12 +198,10 @@ class UsergroupRetriever:
         Returns:
             list: A list of output lines from the command.
         """
-        result = subprocess.run(
-            [self.powershell_path, '-NoProfile', '-ExecutionPolicy', 'Bypass', '-Command', command],
-            capture_output=True, text=True
-        )
-        return skip_header(result.stdout.strip(), lines_to_skip=2).split('\n')
+        output = self.shell.run(command)
+        return skip_header(output, lines_to_skip=2).split('\n')
 
+    @tracer.traced()
     def get_all(self):
         """
         Retrieves all local user groups.
@@ -180,8 +211,9 @@ class UsergroupRetriever:
         """
         name_column = self.get_names()
         with ThreadPoolExecutor() as executor:
-            return list(executor.map(self.get, (name.strip() for name in name_column)))
+            return list(executor.map(bind_context(self.get), (name.strip() for name in name_column)))
 
+    @tracer.traced()
     def get(self, name):
         """
         Retrieves a specific user group by name.
@@ -198,6 +230,7 @@ class UsergroupRetriever:
         users = self.get_users(name)
         return Usergroup(name, description, users)
 
+    @tracer.traced()
     def get_names(self, name=None):
         """
         Retrieves names of all local user groups or a specific user group.
@@ -211,6 +244,7 @@ class UsergroupRetriever:
         command = f'Get-LocalGroup "{name}" | Format-Table -Property Name' if name else 'Get-LocalGroup | Format-Table -Property Name'
         return self._run_powershell_command(command)
 
+    @tracer.traced()
     def get_descriptions(self, name=''):
         """
         Retrieves descriptions of all local user groups or a specific user group.
@@ -224,6 +258,7 @@ class UsergroupRetriever:
         command = f'Get-LocalGroup "{name}" | Format-Table -Property Description' if name else 'Get-LocalGroup | Format-Table -Property Description'
         return self._run_powershell_command(command)
 
+    @tracer.traced()
     def get_users(self, name):
         """
         Retrieves users of a specific local user group.
@@ -237,6 +272,7 @@ class UsergroupRetriever:
         users = self._run_powershell_command(f'Get-LocalGroupMember -Name "{name}" | Format-Table -Property Name')
         return [User(user.strip().split('\\')[1]) for user in users if user]
 
+    @tracer.traced()
     def get_included_users(self, group_name, users):
         """
         Retrieves users from a list that are included in a specific local user group.
@@ -5,15 +5,19 @@ This module contains views for user group management.
 import json
 from django.http import JsonResponse
 from django_keycloak_auth.decorators import keycloak_roles
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.response import Response
 
-from config.settings.base import get_powershell_path, PRINCIPAL_ROLE_NAME
-from .usergroups_scripts import UsergroupEditor, UsergroupRetriever
-
-
-# Initialize UsergroupEditor and UsergroupRetriever with the PowerShell path
-usergroups_editor = UsergroupEditor(get_powershell_path())
-usergroups_retriever = UsergroupRetriever(get_powershell_path())
+from config.settings.base import BULK_MAX_NAMES, PRINCIPAL_ROLE_NAME
+from ..accounts.store import account_store_for
+from ..users.user_scripts import deserialize_users
+from ..users.views import bulk_response
+from ..change_log.models import ChangeLogEntry
+from ..change_log.recorder import change_recorder
+from ..listings.index import InvalidListingQuery, is_indexed_query, listing_indexes, next_page_link
+from ..listings.renderers import LISTING_RENDERERS
+from ..listings.shapes import DEDUP_SHAPE, deduplicate_usergroups
+from ..remoting.hosts import fan_out_hosts
 
 
 def check_name_presence(request_body):
@@ -31,7 +35,8 @@ def check_name_presence(request_body):
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['POST'])
-def create_usergroup(request):
+@fan_out_hosts
+def create_usergroup(request, host=None):
     """
     API endpoint to create a new user group.
 
@@ -39,6 +44,7 @@ def create_usergroup(request):
 
     Args:
         request (HttpRequest): The request object containing the JSON body.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A response with the details of the created user group or an error message.
@@ -64,7 +70,11 @@ def create_usergroup(request):
     users = request_body.get('users')
 
     try:
-        usergroups_editor.add(usergroup_name, description=description, users=users)
+        account_store_for(host).add_usergroup(
+            usergroup_name,
+            description=description,
+            usernames=[user.username for user in deserialize_users(users or [])]
+        )
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error creating user group: {str(exc)}"},
@@ -72,6 +82,14 @@ def create_usergroup(request):
             content_type="application/json"
         )
 
+    if host is None:
+        change_recorder.record(
+            ChangeLogEntry.USERGROUP,
+            'created',
+            usergroup_name,
+            description=description,
+            users=[user.username for user in deserialize_users(users or [])]
+        )
     response_data = {
         'usergroup': usergroup_name,
         'message': f"User group '{usergroup_name}' was added successfully"
@@ -87,19 +105,21 @@ def create_usergroup(request):
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['GET'])
-def get_usergroup(request, usergroup_name):
+@fan_out_hosts
+def get_usergroup(request, usergroup_name, host=None):
     """
     API endpoint to retrieve a specific user group by name.
 
     Args:
         request (HttpRequest): The request object.
         usergroup_name (str): The name of the user group to retrieve.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A JSON response containing the user group's details.
     """
     try:
-        usergroup = usergroups_retriever.get(usergroup_name)
+        usergroup = account_store_for(host).get_usergroup(usergroup_name)
     except Exception as exc:
         return JsonResponse(
             {"error": f"User group not found: {str(exc)}"},
@@ -113,18 +133,48 @@ def get_usergroup(request, usergroup_name):
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['GET'])
-def get_usergroups(request):
+@renderer_classes(LISTING_RENDERERS)
+@fan_out_hosts
+def get_usergroups(request, host=None):
     """
     API endpoint to retrieve all user groups.
 
+    The encoding is negotiated with the Accept header: JSON, NDJSON or MessagePack.
+    With the URL parameter 'shape=dedup' member usernames are listed once and user groups
+    refer to them by index. With the URL parameters 'prefix', 'contains', 'min_members', 'limit'
+    or 'after' the matching user groups are listed from the listing index, a page at a time with 'limit'.
+
     Args:
         request (HttpRequest): The request object.
+        host (str): The remote host or None for this machine.
 
     Returns:
-        JsonResponse: A JSON response containing a list of all user groups.
+        Response: A response containing a list of all user groups.
     """
+    if is_indexed_query(request.query_params):
+        try:
+            page = listing_indexes.get(host).usergroups.query(request.query_params)
+        except InvalidListingQuery as exc:
+            return JsonResponse({"error": str(exc)}, status=400, content_type="application/json")
+        except Exception as exc:
+            return JsonResponse(
+                {"error": f"Error retrieving user groups: {str(exc)}"},
+                status=500,
+                content_type="application/json"
+            )
+
+        if request.query_params.get('shape') == DEDUP_SHAPE:
+            response = Response(deduplicate_usergroups(page.items))
+        else:
+            response = Response([usergroup.serialize() for usergroup in page.items])
+        if page.next_after is not None:
+            response['Link'] = next_page_link(request, page.next_after)
+        return response
+
     try:
-        usergroups = [usergroup.serialize() for usergroup in usergroups_retriever.get_all()]
+        usergroups = account_store_for(host).get_usergroups()
+        if host is None:
+            change_recorder.observe_usergroups(usergroups)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error retrieving user groups: {str(exc)}"},
@@ -132,24 +182,31 @@ def get_usergroups(request):
             content_type="application/json"
         )
 
-    return JsonResponse(usergroups, safe=False, content_type="application/json")
+    if request.query_params.get('shape') == DEDUP_SHAPE:
+        return Response(deduplicate_usergroups(usergroups))
+    return Response([usergroup.serialize() for usergroup in usergroups])
 
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['GET'])
-def get_usergroup_users(request, usergroup_name):
+@renderer_classes(LISTING_RENDERERS)
+@fan_out_hosts
+def get_usergroup_users(request, usergroup_name, host=None):
     """
     API endpoint to retrieve all users in a specific user group.
 
+    The encoding is negotiated with the Accept header: JSON, NDJSON or MessagePack.
+
     Args:
         request (HttpRequest): The request object.
         usergroup_name (str): The name of the user group whose users are to be retrieved.
+        host (str): The remote host or None for this machine.
 
     Returns:
-        JsonResponse: A JSON response containing the list of users in the user group.
+        Response: A response containing the list of users in the user group.
     """
     try:
-        users = [user.serialize() for user in usergroups_retriever.get_users(usergroup_name)]
+        users = [user.serialize() for user in account_store_for(host).get_usergroup_users(usergroup_name)]
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error retrieving users for group {usergroup_name}: {str(exc)}"},
@@ -157,12 +214,13 @@ def get_usergroup_users(request, usergroup_name):
             content_type="application/json"
         )
 
-    return JsonResponse(users, safe=False, content_type="application/json")
+    return Response(users)
 
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['GET'])
-def get_included_users(request, usergroup_name):
+@fan_out_hosts
+def get_included_users(request, usergroup_name, host=None):
     """
     API endpoint to retrieve users from the given list who are included in a specific user group.
 
@@ -171,6 +229,7 @@ def get_included_users(request, usergroup_name):
     Args:
         request (HttpRequest): The request object containing the JSON body.
         usergroup_name (str): The name of the user group.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A JSON response containing the list of included users or an error message.
@@ -192,7 +251,10 @@ def get_included_users(request, usergroup_name):
         )
 
     try:
-        included_users = usergroups_retriever.get_included_users(usergroup_name, request_body['users'])
+        included_users = account_store_for(host).get_included_users(
+            usergroup_name,
+            [user.username for user in deserialize_users(request_body['users'])]
+        )
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error retrieving included users: {str(exc)}"},
@@ -212,7 +274,8 @@ def get_included_users(request, usergroup_name):
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['PATCH'])
-def rename_usergroup(request, usergroup_name):
+@fan_out_hosts
+def rename_usergroup(request, usergroup_name, host=None):
     """
     API endpoint to rename a specific user group.
 
@@ -221,6 +284,7 @@ def rename_usergroup(request, usergroup_name):
     Args:
         request (HttpRequest): The request object containing the JSON body.
         usergroup_name (str): The current name of the user group to be renamed.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A response with a success message or an error message.
@@ -243,7 +307,7 @@ def rename_usergroup(request, usergroup_name):
 
     new_name = request_body['name']
     try:
-        usergroups_editor.rename(usergroup_name, new_name)
+        changed = account_store_for(host).rename_usergroup(usergroup_name, new_name)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error renaming user group: {str(exc)}"},
@@ -251,9 +315,21 @@ def rename_usergroup(request, usergroup_name):
             content_type="application/json"
         )
 
+    if not changed:
+        return JsonResponse(
+            {
+                'message': f'User group {usergroup_name} was already renamed to {new_name}',
+                'changed': False
+            },
+            content_type="application/json"
+        )
+
+    if host is None:
+        change_recorder.record(ChangeLogEntry.USERGROUP, 'renamed', usergroup_name, new_name=new_name)
     return JsonResponse(
         {
-            'message': f'User group {usergroup_name} was successfully renamed to {new_name}'
+            'message': f'User group {usergroup_name} was successfully renamed to {new_name}',
+            'changed': True
         },
         content_type="application/json"
     )
@@ -261,7 +337,8 @@ def rename_usergroup(request, usergroup_name):
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['PATCH'])
-def add_user_to_usergroup(request, usergroup_name, username):
+@fan_out_hosts
+def add_user_to_usergroup(request, usergroup_name, username, host=None):
     """
     API endpoint to add a user to a specific user group.
 
@@ -269,12 +346,13 @@ def add_user_to_usergroup(request, usergroup_name, username):
         request (HttpRequest): The request object.
         usergroup_name (str): The name of the user group.
         username (str): The username of the user to be added.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A response with a success message or an error message.
     """
     try:
-        usergroups_editor.add_users(usergroup_name, [username])
+        changed = account_store_for(host).add_usergroup_users(usergroup_name, [username])
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error adding user to group: {str(exc)}"},
@@ -282,9 +360,21 @@ def add_user_to_usergroup(request, usergroup_name, username):
             content_type="application/json"
         )
 
+    if not changed:
+        return JsonResponse(
+            {
+                'message': f'{username} user is already a member of group {usergroup_name}',
+                'changed': False
+            },
+            content_type="application/json"
+        )
+
+    if host is None:
+        change_recorder.record(ChangeLogEntry.USERGROUP, 'member_added', usergroup_name, member=username)
     return JsonResponse(
         {
-            'message': f'{username} user was added successfully to group {usergroup_name}'
+            'message': f'{username} user was added successfully to group {usergroup_name}',
+            'changed': True
         },
         content_type="application/json"
     )
@@ -292,19 +382,21 @@ def add_user_to_usergroup(request, usergroup_name, username):
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['DELETE'])
-def delete_usergroup(request, usergroup_name):
+@fan_out_hosts
+def delete_usergroup(request, usergroup_name, host=None):
     """
     API endpoint to delete a specific user group.
 
     Args:
         request (HttpRequest): The request object.
         usergroup_name (str): The name of the user group to be deleted.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A response with a success message or an error message.
     """
     try:
-        usergroups_editor.delete(usergroup_name)
+        account_store_for(host).delete_usergroup(usergroup_name)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error deleting user group: {str(exc)}"},
@@ -312,6 +404,8 @@ def delete_usergroup(request, usergroup_name):
             content_type="application/json"
         )
 
+    if host is None:
+        change_recorder.record(ChangeLogEntry.USERGROUP, 'deleted', usergroup_name)
     return JsonResponse(
         {
             'message': f'User group {usergroup_name} was successfully deleted'
@@ -320,9 +414,65 @@ def delete_usergroup(request, usergroup_name):
     )
 
 
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['POST'])
+@fan_out_hosts
+def bulk_delete_usergroups(request, host=None):
+    """
+    API endpoint to delete many user groups at once.
+
+    Expects a JSON body with 'names'. A failure for one user group doesn't stop the others.
+
+    Args:
+        request (HttpRequest): The request object containing the JSON body.
+        host (str): The remote host or None for this machine.
+
+    Returns:
+        JsonResponse: A response with the status of every user group, 207 if some of them failed.
+    """
+    try:
+        request_body = json.loads(request.body.decode('utf-8'))
+    except json.JSONDecodeError:
+        return JsonResponse(
+            {"error": "Invalid JSON body"},
+            status=400,
+            content_type="application/json"
+        )
+
+    names = request_body.get('names') if isinstance(request_body, dict) else None
+    if not isinstance(names, list) or not all(isinstance(name, str) and name for name in names):
+        return JsonResponse(
+            {"error": "Missing names parameter"},
+            status=400,
+            content_type="application/json"
+        )
+    if len(names) > BULK_MAX_NAMES:
+        return JsonResponse(
+            {"error": f"At most {BULK_MAX_NAMES} names are allowed"},
+            status=400,
+            content_type="application/json"
+        )
+
+    try:
+        results = account_store_for(host).delete_usergroups(names)
+    except Exception as exc:
+        return JsonResponse(
+            {"error": f"Error deleting user groups: {str(exc)}"},
+            status=400,
+            content_type="application/json"
+        )
+
+    if host is None:
+        for result in results:
+            if result.ok and result.changed:
+                change_recorder.record(ChangeLogEntry.USERGROUP, 'deleted', result.name)
+    return bulk_response(results)
+
+
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['DELETE'])
-def remove_user_from_usergroup(request, usergroup_name, username):
+@fan_out_hosts
+def remove_user_from_usergroup(request, usergroup_name, username, host=None):
     """
     API endpoint to remove a user from a specific user group.
 
@@ -330,12 +480,13 @@ def remove_user_from_usergroup(request, usergroup_name, username):
         request (HttpRequest): The request object.
         usergroup_name (str): The name of the user group.
         username (str): The username of the user to be removed.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A response with a success message or an error message.
     """
     try:
-        usergroups_editor.remove_user(usergroup_name, username)
+        account_store_for(host).remove_usergroup_user(usergroup_name, username)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error removing user from group: {str(exc)}"},
@@ -343,6 +494,8 @@ def remove_user_from_usergroup(request, usergroup_name, username):
             content_type="application/json"
         )
 
+    if host is None:
+        change_recorder.record(ChangeLogEntry.USERGROUP, 'member_removed', usergroup_name, member=username)
     return JsonResponse(
         {
             'message': f'User was successfully deleted from group {usergroup_name}'
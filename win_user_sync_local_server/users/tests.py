@@ -1 +1,70 @@
-# Create your tests here.
+import json
+from unittest import mock
+
+from django.test import RequestFactory, TestCase
+
+from config.settings.base import PRINCIPAL_ROLE_NAME
+from . import views
+from ..change_log.models import ChangeLogEntry
+from ..simulator.backend import SimulatedAccountStore
+from ..simulator.config import SimulatorConfig
+
+
+class SimulatedUserViewsTests(TestCase):
+    """
+    Drives the user views against a machine of the in-process simulator.
+    """
+    def use_simulator(self, **config):
+        self.store = SimulatedAccountStore(SimulatorConfig(users=3, usergroups=1, **config))
+        patcher = mock.patch.object(views, 'account_store_for', lambda host: self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def call(self, view, method, path, body=None, **kwargs):
+        factory = getattr(RequestFactory(), method)
+        if body is None:
+            request = factory(path)
+        else:
+            request = factory(path, json.dumps(body), content_type='application/json')
+        request.roles = [PRINCIPAL_ROLE_NAME]
+        response = view(request, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def test_lists_simulated_users(self):
+        self.use_simulator()
+
+        response = self.call(views.get_users, 'get', '/users/')
+
+        self.assertEqual(response.status_code, 200)
+        usernames = [user['username'] for user in json.loads(response.content)]
+        self.assertIn('user00001', usernames)
+        self.assertIn('Administrator', usernames)
+
+    def test_created_user_is_retrievable_and_recorded(self):
+        self.use_simulator()
+
+        response = self.call(views.create_user, 'post', '/users/create/', {'username': 'alice', 'password': 'P@ss1'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.call(views.get_user, 'get', '/users/alice/', username='alice').status_code, 200)
+        self.assertTrue(ChangeLogEntry.objects.filter(entity_name='alice', action='created').exists())
+
+    def test_failed_command_is_reported_and_not_recorded(self):
+        self.use_simulator(error_rate=1.0)
+
+        response = self.call(views.create_user, 'post', '/users/create/', {'username': 'alice'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Simulated failure', json.loads(response.content)['error'])
+        self.assertFalse(ChangeLogEntry.objects.filter(entity_name='alice').exists())
+
+    def test_hanging_command_times_out(self):
+        self.use_simulator(hang_rate=1.0)
+        self.store.shell.command_timeout = 0.05
+
+        response = self.call(views.get_users, 'get', '/users/')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertIn('timed out', json.loads(response.content)['error'])
@@ -6,6 +6,7 @@ from .views import (
     enable_user,
     disable_user,
     delete_user,
+    bulk_update_users,
     get_users,
     get_user,
 )
@@ -25,4 +26,7 @@ urlpatterns = [
 
     # Delete
     path('delete/<str:username>/', delete_user, name='delete_user'),
+
+    # Bulk
+    path('bulk/<str:action>/', bulk_update_users, name='bulk_update_users'),
 ]
@@ -1,25 +1,121 @@
+import csv
 import subprocess
+import time
 
-from config.settings.base import BASE_DIR
+from config.settings.base import BASE_DIR, POWERSHELL_COMMAND_TIMEOUT
+from ..admission.load import powershell_load
+from ..diagnostics.fingerprint import fingerprint_command
+from ..diagnostics.slow_commands import slow_command_log
+from ..diagnostics.tracing import tracer
 
 
 def deserialize_users(serialized_users):
     return [User(user['username']) for user in serialized_users]
 
-def run_powershell_command(command):
+
+class PowerShellError(Exception):
+    """
+    Raised when a PowerShell command exits with a non-zero exit code.
+
+    Attributes:
+        exit_code (int): The exit code of the command.
+        stderr (str): The standard error of the command.
+    """
+    def __init__(self, exit_code, stderr):
+        super().__init__(stderr.strip() or f'PowerShell exited with code {exit_code}')
+        self.exit_code = exit_code
+        self.stderr = stderr
+
+
+class PowerShellTimeout(PowerShellError):
+    """
+    Raised when a PowerShell command takes longer than the timeout. Its exit code is None.
+
+    Attributes:
+        timeout (float): The number of seconds the command was given.
+    """
+    def __init__(self, timeout):
+        super().__init__(None, f'PowerShell command timed out after {timeout} seconds')
+        self.timeout = timeout
+
+
+def run_powershell_command(command, timeout=POWERSHELL_COMMAND_TIMEOUT):
     """
     Executes a PowerShell command using subprocess.
 
     Args:
         command (list): The PowerShell command to execute.
+        timeout (float): The number of seconds after which the command is killed.
 
     Returns:
         str: The stdout output from the command.
+
+    Raises:
+        PowerShellError: If the command failed.
+        PowerShellTimeout: If the command took longer than the timeout.
     """
-    result = subprocess.run(command, capture_output=True, text=True)
+    with tracer.span('powershell', command=fingerprint_command(command)) as span:
+        started_at = time.perf_counter()
+        with powershell_load.track():
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                error = PowerShellTimeout(timeout)
+                slow_command_log.record(command, time.perf_counter() - started_at, None, str(error))
+                raise error from None
+        slow_command_log.record(command, time.perf_counter() - started_at, result.returncode, result.stderr)
+        if span is not None:
+            span.set_attribute('exit_code', result.returncode)
+    if result.returncode != 0:
+        raise PowerShellError(result.returncode, result.stderr)
     return result.stdout.strip()
 
 
+class LocalShell:
+    """
+    Runs PowerShell commands on this machine, each in a new process.
+
+    Attributes:
+        powershell_path (str): The path to the PowerShell executable.
+    """
+    def __init__(self, powershell_path):
+        self.powershell_path = powershell_path
+
+    def run(self, command):
+        """
+        Runs a PowerShell command.
+
+        Args:
+            command (str): The PowerShell command.
+
+        Returns:
+            str: The stdout output from the command.
+
+        Raises:
+            PowerShellError: If the command failed or timed out.
+        """
+        return run_powershell_command(
+            [self.powershell_path, '-NoProfile', '-ExecutionPolicy', 'Bypass', '-Command', command]
+        )
+
+    def run_script(self, script, *args):
+        """
+        Runs a script of the scripts directory.
+
+        Args:
+            script (str): The file name of the script.
+            *args: The arguments of the script.
+
+        Returns:
+            str: The stdout output from the script.
+
+        Raises:
+            PowerShellError: If the script failed or timed out.
+        """
+        arguments = ' '.join(f'"{arg}"' for arg in args)
+        return self.run(f'{BASE_DIR}/scripts/{script} {arguments}')
+
+
 def skip_header(output, lines_to_skip=1):
     """
     Skips a specified number of lines at the beginning of the output.
@@ -37,22 +133,36 @@ def skip_header(output, lines_to_skip=1):
 
 class User:
     """
-    Represents a user with a name.
+    Represents a user with a name and, when listed from the machine, its account details.
 
     Attributes:
         username (str): The name of the user.
+        sid (str): The security identifier, which stays the same when the user is renamed.
+        enabled (bool): Whether the user is enabled.
+        description (str): The description of the user.
+        last_logon (str): The time of the last logon in ISO 8601 or None if the user never logged on.
+        password_last_set (str): The time the password was last set in ISO 8601 or None.
     """
-    def __init__(self, username):
+    def __init__(self, username, sid=None, enabled=None, description=None, last_logon=None, password_last_set=None):
         self.username = username
+        self.sid = sid
+        self.enabled = enabled
+        self.description = description
+        self.last_logon = last_logon
+        self.password_last_set = password_last_set
 
     def serialize(self):
         """
-        Serializes the user object to a dictionary.
+        Serializes the user object to a dictionary, leaving out unknown details.
 
         Returns:
             dict: A dictionary representation of the user.
         """
-        return {'username': self.username}
+        serialized = {'username': self.username}
+        for key in ('sid', 'enabled', 'description', 'last_logon', 'password_last_set'):
+            if getattr(self, key) is not None:
+                serialized[key] = getattr(self, key)
+        return serialized
 
     def __str__(self):
         """
@@ -61,7 +171,49 @@ class User:
         Returns:
             str: The string representation of the user.
         """
-        return f"User(username={self.username})"
+        return f"User(username={self.username}, sid={self.sid}, enabled={self.enabled})"
+
+
+def parse_users(output):
+    """
+    Parses users listed as CSV by the get-users.ps1 script.
+
+    Args:
+        output (str): The CSV output.
+
+    Returns:
+        list: A list of User objects.
+    """
+    return [
+        User(
+            row['Name'],
+            sid=row['SID'] or None,
+            enabled=row['Enabled'] == 'True',
+            description=row['Description'],
+            last_logon=row['LastLogon'] or None,
+            password_last_set=row['PasswordLastSet'] or None
+        )
+        for row in csv.DictReader(output.splitlines())
+    ]
+
+
+def run_bulk_script(shell, action, names):
+    """
+    Runs an operation on many accounts with a single bulk-accounts.ps1 invocation.
+
+    Args:
+        shell: Runs the script.
+        action (str): The operation: 'enable-users', 'disable-users', 'delete-users' or 'delete-usergroups'.
+        names (list): The names of the accounts. Names can't contain commas on Windows.
+
+    Returns:
+        dict: The error of every account or None if the operation succeeded, keyed by lowercase name.
+    """
+    output = shell.run_script('bulk-accounts.ps1', action, ','.join(names))
+    return {
+        row['Name'].lower(): None if row['Status'] == 'ok' else row['Error'] or 'Unknown error'
+        for row in csv.DictReader(output.splitlines())
+    }
 
 
 class UserEditor:
@@ -70,10 +222,13 @@ class UserEditor:
 
     Attributes:
         powershell_path (str): The path to the PowerShell executable.
+        shell: Runs the commands. Defaults to a LocalShell, see the remoting package for remote hosts.
     """
-    def __init__(self, powershell_path):
+    def __init__(self, powershell_path, shell=None):
         self.powershell_path = powershell_path
+        self.shell = shell or LocalShell(powershell_path)
 
+    @tracer.traced()
     def add(self, username, password):
         """
         Adds a new user.
@@ -85,15 +240,10 @@ class UserEditor:
         Returns:
             str: The output from the PowerShell command.
         """
-        command = [
-            self.powershell_path,
-            '-NoProfile',
-            '-ExecutionPolicy', 'Bypass',
-            '-Command', f'{BASE_DIR}/scripts/create-user.ps1 "{username}" "{password}"'
-        ]
-        output = run_powershell_command(command)
+        output = self.shell.run_script('create-user.ps1', username, password)
         return skip_header(output, lines_to_skip=2).replace("True", "").strip()
 
+    @tracer.traced()
     def edit_password(self, username, password):
         """
         Edits the password for an existing user.
@@ -102,14 +252,9 @@ class UserEditor:
             username (str): The username of the user.
             password (str): The new password for the user.
         """
-        command = [
-            self.powershell_path,
-            '-NoProfile',
-            '-ExecutionPolicy', 'Bypass',
-            '-Command', f'{BASE_DIR}/scripts/edit-user-password.ps1 "{username}" "{password}"'
-        ]
-        run_powershell_command(command)
+        self.shell.run_script('edit-user-password.ps1', username, password)
 
+    @tracer.traced()
     def disable(self, username):
         """
         Disables an existing user.
@@ -117,14 +262,9 @@ class UserEditor:
         Args:
             username (str): The username of the user to disable.
         """
-        command = [
-            self.powershell_path,
-            '-NoProfile',
-            '-ExecutionPolicy', 'Bypass',
-            '-Command', f'Disable-LocalUser -Name "{username}"'
-        ]
-        run_powershell_command(command)
+        self.shell.run(f'Disable-LocalUser -Name "{username}"')
 
+    @tracer.traced()
     def enable(self, username):
         """
         Enables an existing user.
@@ -132,14 +272,9 @@ class UserEditor:
         Args:
             username (str): The username of the user to enable.
         """
-        command = [
-            self.powershell_path,
-            '-NoProfile',
-            '-ExecutionPolicy', 'Bypass',
-            '-Command', f'Enable-LocalUser -Name "{username}"'
-        ]
-        run_powershell_command(command)
+        self.shell.run(f'Enable-LocalUser -Name "{username}"')
 
+    @tracer.traced()
     def delete(self, username):
         """
         Deletes an existing user.
@@ -147,13 +282,21 @@ class UserEditor:
         Args:
             username (str): The username of the user to delete.
         """
-        command = [
-            self.powershell_path,
-            '-NoProfile',
-            '-ExecutionPolicy', 'Bypass',
-            '-Command', f'Remove-LocalUser -Name "{username}"'
-        ]
-        run_powershell_command(command)
+        self.shell.run(f'Remove-LocalUser -Name "{username}"')
+
+    @tracer.traced()
+    def bulk(self, action, usernames):
+        """
+        Enables, disables or deletes many users in a single PowerShell invocation.
+
+        Args:
+            action (str): 'enable', 'disable' or 'delete'.
+            usernames (list): The usernames of the users.
+
+        Returns:
+            dict: The error of every user or None if the operation succeeded, keyed by lowercase username.
+        """
+        return run_bulk_script(self.shell, f'{action}-users', usernames)
 
 
 class UserRetriever:
@@ -162,27 +305,23 @@ class UserRetriever:
 
     Attributes:
         powershell_path (str): The path to the PowerShell executable.
+        shell: Runs the commands. Defaults to a LocalShell, see the remoting package for remote hosts.
     """
-    def __init__(self, powershell_path):
+    def __init__(self, powershell_path, shell=None):
         self.powershell_path = powershell_path
+        self.shell = shell or LocalShell(powershell_path)
 
+    @tracer.traced()
     def get_all(self):
         """
-        Retrieves all local users.
+        Retrieves all local users with their account details in a single query.
 
         Returns:
             list: A list of User objects representing all local users.
         """
-        command = [
-            self.powershell_path,
-            '-NoProfile',
-            '-ExecutionPolicy', 'Bypass',
-            '-Command', 'Get-LocalUser | Format-Table -Property Name'
-        ]
-        output = run_powershell_command(command)
-        usernames = self.extract_usernames(skip_header(output, lines_to_skip=2))
-        return [User(username) for username in usernames]
+        return parse_users(self.shell.run_script('get-users.ps1'))
 
+    @tracer.traced()
     def get(self, username):
         """
         Retrieves a specific user by username.
@@ -192,25 +331,11 @@ class UserRetriever:
 
         Returns:
             User: A User object representing the retrieved user.
-        """
-        command = [
-            self.powershell_path,
-            '-NoProfile',
-            '-ExecutionPolicy', 'Bypass',
-            '-Command', f'Get-LocalUser -Name "{username}" | Format-Table -Property Name'
-        ]
-        output = run_powershell_command(command)
-        username = self.extract_usernames(skip_header(output, lines_to_skip=2))[0].strip()
-        return User(username)
-
-    def extract_usernames(self, users_output):
-        """
-        Extracts usernames from the command output.
-
-        Args:
-            users_output (str): The output from the command containing user information.
 
-        Returns:
-            list: A list of usernames.
+        Raises:
+            ValueError: If the user wasn't found.
         """
-        return [line.split()[0] for line in users_output.splitlines()]
+        users = parse_users(self.shell.run_script('get-users.ps1', username))
+        if not users:
+            raise ValueError(f'User {username} was not found')
+        return users[0]
@@ -5,20 +5,45 @@ This module contains views for user management operations.
 import json
 from django.http import JsonResponse
 from django_keycloak_auth.decorators import keycloak_roles
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.response import Response
 
-from config.settings.base import get_powershell_path, PRINCIPAL_ROLE_NAME
-from .user_scripts import UserRetriever, UserEditor
+from config.settings.base import BULK_MAX_NAMES, PRINCIPAL_ROLE_NAME
+from ..accounts.base import BULK_USER_ACTIONS
+from ..accounts.store import account_store_for
+from ..change_log.models import ChangeLogEntry
+from ..change_log.recorder import change_recorder
+from ..listings.index import InvalidListingQuery, is_indexed_query, listing_indexes, next_page_link
+from ..listings.renderers import LISTING_RENDERERS
+from ..remoting.hosts import fan_out_hosts
 
 
-# Initialize UserEditor and UserRetriever with the PowerShell path
-user_editor = UserEditor(get_powershell_path())
-user_retriever = UserRetriever(get_powershell_path())
+def bulk_response(results):
+    """
+    Builds the response of a bulk endpoint.
+
+    Args:
+        results (list): BulkResult objects of every account.
+
+    Returns:
+        JsonResponse: The status of every account, 207 Multi-Status if some of them failed.
+    """
+    failed = sum(1 for result in results if not result.ok)
+    return JsonResponse(
+        {
+            'succeeded': len(results) - failed,
+            'failed': failed,
+            'results': [result.serialize() for result in results]
+        },
+        status=207 if failed else 200,
+        content_type='application/json'
+    )
 
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['POST'])
-def create_user(request):
+@fan_out_hosts
+def create_user(request, host=None):
     """
     API endpoint to create a new user.
 
@@ -26,6 +51,7 @@ def create_user(request):
 
     Args:
         request (HttpRequest): The request object containing the JSON body.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A response with a success message or an error message.
@@ -50,10 +76,7 @@ def create_user(request):
         )
 
     try:
-        if not password:
-            user_editor.add(username, None)
-        else:
-            user_editor.add(username, password)
+        account_store_for(host).add_user(username, password or None)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error creating user: {str(exc)}"},
@@ -61,6 +84,8 @@ def create_user(request):
             content_type='application/json'
         )
 
+    if host is None:
+        change_recorder.record(ChangeLogEntry.USER, 'created', username)
     return JsonResponse(
         {'message': f'User {username} was added successfully'},
         status=201,
@@ -70,19 +95,44 @@ def create_user(request):
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['GET'])
-def get_users(request):
+@renderer_classes(LISTING_RENDERERS)
+@fan_out_hosts
+def get_users(request, host=None):
     """
     API endpoint to retrieve all users.
 
+    The encoding is negotiated with the Accept header: JSON, NDJSON or MessagePack.
+    With the URL parameters 'prefix', 'contains', 'enabled', 'member_of', 'limit' or 'after'
+    the matching users are listed from the listing index, a page at a time with 'limit'.
+
     Args:
         request (HttpRequest): The request object.
+        host (str): The remote host or None for this machine.
 
     Returns:
-        JsonResponse: A JSON response containing a list of all users.
+        Response: A response containing a list of all users.
     """
+    if is_indexed_query(request.query_params):
+        try:
+            page = listing_indexes.get(host).users.query(request.query_params)
+        except InvalidListingQuery as exc:
+            return JsonResponse({"error": str(exc)}, status=400, content_type='application/json')
+        except Exception as exc:
+            return JsonResponse(
+                {"error": f"Error retrieving users: {str(exc)}"},
+                status=500,
+                content_type='application/json'
+            )
+
+        response = Response([user.serialize() for user in page.items])
+        if page.next_after is not None:
+            response['Link'] = next_page_link(request, page.next_after)
+        return response
+
     try:
-        users = user_retriever.get_all()
-        serialized_users = [user.serialize() for user in users]
+        users = account_store_for(host).get_users()
+        if host is None:
+            change_recorder.observe_users(users)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error retrieving users: {str(exc)}"},
@@ -90,24 +140,26 @@ def get_users(request):
             content_type='application/json'
         )
 
-    return JsonResponse(serialized_users, safe=False, content_type='application/json')
+    return Response([user.serialize() for user in users])
 
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['GET'])
-def get_user(request, username):
+@fan_out_hosts
+def get_user(request, username, host=None):
     """
     API endpoint to retrieve a specific user by username.
 
     Args:
         request (HttpRequest): The request object.
         username (str): The username of the user to retrieve.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A JSON response containing the user's details.
     """
     try:
-        user = user_retriever.get(username)
+        user = account_store_for(host).get_user(username)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error retrieving user: {str(exc)}"},
@@ -120,7 +172,8 @@ def get_user(request, username):
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['PATCH'])
-def update_user_password(request, username):
+@fan_out_hosts
+def update_user_password(request, username, host=None):
     """
     API endpoint to update the password of a specific user.
 
@@ -129,6 +182,7 @@ def update_user_password(request, username):
     Args:
         request (HttpRequest): The request object containing the JSON body.
         username (str): The username of the user whose password is to be updated.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A response with a success message or an error message.
@@ -151,7 +205,7 @@ def update_user_password(request, username):
         )
 
     try:
-        user_editor.edit_password(username, password)
+        account_store_for(host).edit_user_password(username, password)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error updating password: {str(exc)}"},
@@ -159,6 +213,8 @@ def update_user_password(request, username):
             content_type='application/json'
         )
 
+    if host is None:
+        change_recorder.record(ChangeLogEntry.USER, 'password_changed', username)
     return JsonResponse(
         {'message': f"User {username}'s password was updated successfully"},
         content_type='application/json'
@@ -167,19 +223,21 @@ def update_user_password(request, username):
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['PATCH'])
-def enable_user(request, username):
+@fan_out_hosts
+def enable_user(request, username, host=None):
     """
     API endpoint to enable a specific user.
 
     Args:
         request (HttpRequest): The request object.
         username (str): The username of the user to enable.
+        host (str): The remote host or None for this machine.
 
     Returns:
-        JsonResponse: A response with a success message.
+        JsonResponse: A response with a success message and whether the user was changed.
     """
     try:
-        user_editor.enable(username)
+        changed = account_store_for(host).enable_user(username)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error enabling user: {str(exc)}"},
@@ -187,27 +245,37 @@ def enable_user(request, username):
             content_type='application/json'
         )
 
+    if not changed:
+        return JsonResponse(
+            {'message': f'User {username} was already enabled', 'changed': False},
+            content_type='application/json'
+        )
+
+    if host is None:
+        change_recorder.record(ChangeLogEntry.USER, 'enabled', username)
     return JsonResponse(
-        {'message': f'User {username} was enabled successfully'},
+        {'message': f'User {username} was enabled successfully', 'changed': True},
         content_type='application/json'
     )
 
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['PATCH'])
-def disable_user(request, username):
+@fan_out_hosts
+def disable_user(request, username, host=None):
     """
     API endpoint to disable a specific user.
 
     Args:
         request (HttpRequest): The request object.
         username (str): The username of the user to disable.
+        host (str): The remote host or None for this machine.
 
     Returns:
-        JsonResponse: A response with a success message.
+        JsonResponse: A response with a success message and whether the user was changed.
     """
     try:
-        user_editor.disable(username)
+        changed = account_store_for(host).disable_user(username)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error disabling user: {str(exc)}"},
@@ -215,27 +283,37 @@ def disable_user(request, username):
             content_type='application/json'
         )
 
+    if not changed:
+        return JsonResponse(
+            {'message': f'User {username} was already disabled', 'changed': False},
+            content_type='application/json'
+        )
+
+    if host is None:
+        change_recorder.record(ChangeLogEntry.USER, 'disabled', username)
     return JsonResponse(
-        {'message': f'User {username} was disabled successfully'},
+        {'message': f'User {username} was disabled successfully', 'changed': True},
         content_type='application/json'
     )
 
 
 @keycloak_roles([PRINCIPAL_ROLE_NAME])
 @api_view(['DELETE'])
-def delete_user(request, username):
+@fan_out_hosts
+def delete_user(request, username, host=None):
     """
     API endpoint to delete a specific user.
 
     Args:
         request (HttpRequest): The request object.
         username (str): The username of the user to delete.
+        host (str): The remote host or None for this machine.
 
     Returns:
         JsonResponse: A response with a success message.
     """
     try:
-        user_editor.delete(username)
+        account_store_for(host).delete_user(username)
     except Exception as exc:
         return JsonResponse(
             {"error": f"Error deleting user: {str(exc)}"},
@@ -243,7 +321,73 @@ def delete_user(request, username):
             content_type='application/json'
         )
 
+    if host is None:
+        change_recorder.record(ChangeLogEntry.USER, 'deleted', username)
     return JsonResponse(
         {'message': f'User {username} was deleted successfully'},
         content_type='application/json'
     )
+
+
+
+@keycloak_roles([PRINCIPAL_ROLE_NAME])
+@api_view(['POST'])
+@fan_out_hosts
+def bulk_update_users(request, action, host=None):
+    """
+    API endpoint to enable, disable or delete many users at once.
+
+    Expects a JSON body with 'usernames'. A failure for one user doesn't stop the others.
+
+    Args:
+        request (HttpRequest): The request object containing the JSON body.
+        action (str): One of 'enable', 'disable' and 'delete'.
+        host (str): The remote host or None for this machine.
+
+    Returns:
+        JsonResponse: A response with the status of every user, 207 if some of them failed.
+    """
+    if action not in BULK_USER_ACTIONS:
+        return JsonResponse(
+            {"error": f"Unknown action {action}, expected one of: {', '.join(BULK_USER_ACTIONS)}"},
+            status=404,
+            content_type='application/json'
+        )
+
+    try:
+        request_body = json.loads(request.body.decode('utf-8'))
+    except json.JSONDecodeError:
+        return JsonResponse(
+            {"error": "Invalid JSON body"},
+            status=400,
+            content_type='application/json'
+        )
+
+    usernames = request_body.get('usernames') if isinstance(request_body, dict) else None
+    if not isinstance(usernames, list) or not all(isinstance(username, str) and username for username in usernames):
+        return JsonResponse(
+            {"error": "Missing usernames parameter"},
+            status=400,
+            content_type='application/json'
+        )
+    if len(usernames) > BULK_MAX_NAMES:
+        return JsonResponse(
+            {"error": f"At most {BULK_MAX_NAMES} usernames are allowed"},
+            status=400,
+            content_type='application/json'
+        )
+
+    try:
+        results = account_store_for(host).bulk_update_users(action, usernames)
+    except Exception as exc:
+        return JsonResponse(
+            {"error": f"Error updating users: {str(exc)}"},
+            status=400,
+            content_type='application/json'
+        )
+
+    if host is None:
+        for result in results:
+            if result.ok and result.changed:
+                change_recorder.record(ChangeLogEntry.USER, f'{action}d', result.name)
+    return bulk_response(results)